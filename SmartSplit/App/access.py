@@ -0,0 +1,94 @@
+from functools import wraps
+from flask import current_app, flash, g, jsonify, redirect, session, url_for, abort
+from sqlalchemy import event, exists
+from caching import TTLCache
+from models import db, User, Group, UserGroup
+
+# Wyniki sprawdzania członkostwa (user_id, group_id) -> bool. Krótki TTL ogranicza nieaktualność
+# w innych procesach; w tym procesie wpisy są usuwane od razu po zmianie składu grupy.
+_membership_cache = None
+
+
+def _get_membership_cache():
+    global _membership_cache
+
+    if _membership_cache is None:
+        _membership_cache = TTLCache(current_app.config.get('MEMBERSHIP_CACHE_SIZE', 10000),
+                                     current_app.config.get('MEMBERSHIP_CACHE_TTL', 30))
+    return _membership_cache
+
+
+def get_current_user():
+    """
+    Zwraca zalogowanego użytkownika, wczytując go z bazy najwyżej raz na żądanie (wynik jest trzymany w flask.g).
+    """
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        g.current_user = db.session.get(User, user_id) if user_id is not None else None
+    return g.current_user
+
+
+def is_group_member(user_id, group_id):
+    """
+    Sprawdza członkostwo zapytaniem EXISTS po kluczu głównym usergroups (bez wczytywania listy członków)
+    i zapamiętuje wynik na MEMBERSHIP_CACHE_TTL sekund.
+    """
+    cache = _get_membership_cache()
+    key = (user_id, group_id)
+
+    is_member = cache.get(key)
+    if is_member is None:
+        is_member = db.session.query(
+            exists().where(UserGroup.user_id == user_id, UserGroup.group_id == group_id)
+        ).scalar()
+        cache.set(key, is_member)
+
+    return is_member
+
+
+def invalidate_membership(group_id, user_ids):
+    """
+    Usuwa z cache wyniki sprawdzania członkostwa podanych użytkowników w grupie. Wywoływane po zatwierdzeniu
+    transakcji zmieniającej skład grupy, żeby równoległe żądanie nie zapamiętało stanu sprzed zmiany.
+    """
+    user_ids = list(user_ids)
+
+    def _invalidate(session):
+        cache = _get_membership_cache()
+        for user_id in user_ids:
+            cache.pop((user_id, group_id))
+
+    event.listen(db.session(), 'after_commit', _invalidate, once=True)
+
+
+def group_member_required(view=None, *, api=False):
+    """
+    Dekorator widoków z parametrem group_id: wymaga zalogowania i członkostwa w grupie.
+    Widoki HTML przekierowują (do logowania albo listy grup), a widoki API (api=True) zwracają 401/403 w JSON.
+    Nieistniejąca grupa daje 404.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            user_id = session.get('user_id')
+            if user_id is None:
+                if api:
+                    return jsonify({'error': 'Unauthorized'}), 401
+                return redirect(url_for('login'))
+
+            group_id = kwargs['group_id']
+            if not is_group_member(user_id, group_id):
+                if db.session.get(Group, group_id) is None:
+                    abort(404)
+                if api:
+                    return jsonify({'error': 'Permission denied'}), 403
+                flash('You are not a member of this group!', 'error')
+                return redirect(url_for('view_groups'))
+
+            return view(*args, **kwargs)
+
+        return wrapped
+
+    if view is not None:
+        return decorator(view)
+    return decorator
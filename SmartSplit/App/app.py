@@ -1,12 +1,31 @@
-from flask import Flask, render_template, redirect, url_for, request, session, flash, jsonify
+from flask import Flask, render_template, redirect, url_for, request, session, flash, jsonify, abort, Response, \
+    stream_with_context
 from models import db, User, Group, UserGroup, Expense, ExpenseShare, Settlement, Friends, FriendRequest
-from werkzeug.security import generate_password_hash, check_password_hash
-from calculate_balance import calculate_balance
-from decimal import Decimal, ROUND_HALF_UP
-from charts import get_user_charts_data, get_group_charts_data
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from passwords import PasswordHashingBusy, LoginThrottle, hash_password, verify_password, needs_rehash
+from money import Money
+from datetime import datetime
+from charts import get_charts_data_for_group_and_user, get_charts_etag
+from caching import LRUCache
+from exchange_rate import get_supported_currencies
+from group_snapshot import load_group_snapshot
+from dashboard_summary import get_dashboard_summary, get_dashboard_version
+from feeds import get_expense_feed, get_settlement_feed, FEED_PAGE_SIZE, FEED_MAX_PAGE_SIZE
+from ledger_export import stream_export, EXPORT_KINDS, EXPORT_FORMATS
+from balance_ledger import expense_shares, read_net_positions, read_debtors
+from group_changes import expense_changed, settlement_changed
+from settle_up import simplify_debts, net_positions
+from email_outbox import enqueue_email, find_recent_dedup_keys
+from friend_suggestions import SUGGESTION_LIMIT, get_friend_suggestions, get_mutual_friends, can_view_mutual_friends
+from splits import SplitError, split_expense, split_values_from_form, write_shares
+from expense_import import parse_import, validate_import, import_expenses
+from group_membership import MembershipError, create_group_with_members, add_members, remove_members
+from instrumentation import init_instrumentation
+from access import get_current_user, is_group_member, group_member_required
+from commands import rebuild_balances_command, refresh_rates_command, backfill_rollups_command, \
+    bench_charts_command, send_emails_command, outbox_status_command, migrate_db_command, check_query_plans_command, \
+    import_expenses_command, bench_splits_command, bench_suggestions_command, seed_bench_command, bench_command, \
+    bench_money_command, bench_settle_up_command, check_export_memory_command
+import hmac
 import os
 from dotenv import load_dotenv
 from sqlalchemy.exc import IntegrityError
@@ -15,6 +34,32 @@ from sqlalchemy.exc import IntegrityError
 app = Flask(__name__)
 app.config.from_object('config.Config')
 db.init_app(app)
+app.cli.add_command(rebuild_balances_command)
+app.cli.add_command(refresh_rates_command)
+app.cli.add_command(backfill_rollups_command)
+app.cli.add_command(bench_charts_command)
+app.cli.add_command(send_emails_command)
+app.cli.add_command(outbox_status_command)
+app.cli.add_command(migrate_db_command)
+app.cli.add_command(check_query_plans_command)
+app.cli.add_command(import_expenses_command)
+app.cli.add_command(bench_splits_command)
+app.cli.add_command(bench_suggestions_command)
+app.cli.add_command(seed_bench_command)
+app.cli.add_command(bench_command)
+app.cli.add_command(bench_money_command)
+app.cli.add_command(bench_settle_up_command)
+app.cli.add_command(check_export_memory_command)
+
+if app.config['METRICS_ENABLED']:
+    init_instrumentation(app)
+
+# Zserializowane odpowiedzi /charts_data, kluczowane ETagiem (zawiera wersję danych grupy)
+charts_cache = LRUCache(app.config['CHARTS_CACHE_SIZE'])
+# Podsumowania sald per użytkownik: {user_id: (wersja danych, podsumowanie)}
+dashboard_cache = LRUCache(app.config['DASHBOARD_CACHE_SIZE'])
+# Liczniki nieudanych logowań per konto i adres IP
+login_throttle = LoginThrottle(app.config['LOGIN_THROTTLE_CACHE_SIZE'])
 
 load_dotenv()
 
@@ -24,6 +69,9 @@ password = os.getenv('PASSWORD')
 if not sender_email or not password:
     raise ValueError("Email or password is not set in .env file")
 
+app.config['SMTP_USER'] = sender_email
+app.config['SMTP_PASSWORD'] = password
+
 
 # Endpoint rejestracji
 @app.route('/register', methods=['GET', 'POST'])
@@ -41,7 +89,12 @@ def register():
             flash('This username is already taken!', 'danger')
             return redirect(url_for('register'))
 
-        hashed_password = generate_password_hash(password, method='pbkdf2:sha256', salt_length=8)
+        try:
+            hashed_password = hash_password(password)
+        except (PasswordHashingBusy, TimeoutError):
+            flash('The server is busy. Please try again in a moment.', 'danger')
+            return render_template('register.html'), 503
+
         new_user = User(username=username, email=email, password=hashed_password)
 
         try:
@@ -64,12 +117,37 @@ def login():
         email = request.form.get('email')
         password = request.form.get('password')
 
+        # Limit prób sprawdzany przed zapytaniem do bazy i haszowaniem
+        retry_after = login_throttle.retry_after(email, request.remote_addr)
+        if retry_after:
+            flash(f'Too many failed login attempts. Try again in {retry_after} seconds.', 'danger')
+            return render_template('login.html'), 429, {'Retry-After': str(retry_after)}
+
         user = User.query.filter_by(email=email).first()
 
-        if user and check_password_hash(user.password, password):
-            session['user_id'] = user.id  # Zapisz użytkownika w sesji
+        try:
+            password_ok = bool(user and password and verify_password(user.password, password))
+        except (PasswordHashingBusy, TimeoutError):
+            flash('The server is busy. Please try again in a moment.', 'danger')
+            return render_template('login.html'), 503
+
+        if password_ok:
+            login_throttle.reset_account(email)
+
+            # Hasło zahaszowane według starszej polityki - zapisujemy hash zgodny z bieżącą
+            user_id = user.id
+            if needs_rehash(user.password):
+                try:
+                    user.password = hash_password(password)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.warning("Could not rehash password of user %s: %s", user_id, e)
+
+            session['user_id'] = user_id  # Zapisz użytkownika w sesji
             return redirect(url_for('user_dashboard'))  # Przekieruj na stronę użytkownika
         else:
+            login_throttle.record_failure(email, request.remote_addr)
             flash('Invalid email or password.', 'danger')
 
     return render_template('login.html')
@@ -81,9 +159,65 @@ def user_dashboard():
     if 'user_id' not in session:
         return redirect(url_for('login'))
 
-    user = User.query.get(session['user_id'])  # Pobranie danych użytkownika
+    user = get_current_user()  # Pobranie danych użytkownika
+
+    return render_template('dashboard.html', user=user, summary=get_cached_dashboard_summary(user.id))
 
-    return render_template('dashboard.html', user=user)
+
+def get_cached_dashboard_summary(user_id):
+    """
+    Zwraca podsumowanie sald użytkownika ze wszystkich grup z cache. Wpis jest ważny tylko dla wersji danych,
+    z której powstał (wersje wszystkich grup użytkownika), więc każdy zapis w którejkolwiek z tych grup -
+    także w innym procesie - powoduje ponowne wyliczenie przy następnym odczycie.
+    """
+    version = get_dashboard_version(user_id)
+    cached = dashboard_cache.get(user_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    summary = get_dashboard_summary(user_id)
+    dashboard_cache.set(user_id, (version, summary))
+    return summary
+
+
+def _format_amounts(amounts):
+    return {currency: str(amount) for currency, amount in amounts.items()}
+
+
+# Endpoint podsumowania sald użytkownika ze wszystkich grup
+@app.route('/dashboard/summary', methods=['GET'])
+def dashboard_summary():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    summary = get_cached_dashboard_summary(session['user_id'])
+
+    return jsonify({
+        'owe': _format_amounts(summary['owe']),
+        'owed': _format_amounts(summary['owed']),
+        'net': _format_amounts(summary['net']),
+        'groups': [
+            {
+                'groupId': group['id'],
+                'name': group['name'],
+                'net': _format_amounts(group['net']),
+                'counterparties': [
+                    {
+                        'userId': counterparty['user_id'],
+                        'username': counterparty['username'],
+                        'amount': str(counterparty['amount']),
+                        'currency': counterparty['currency'],
+                    }
+                    for counterparty in group['counterparties']
+                ],
+            }
+            for group in summary['groups']
+        ],
+        'people': [
+            {'userId': person['user_id'], 'username': person['username'], 'net': _format_amounts(person['net'])}
+            for person in summary['people']
+        ],
+    })
 
 
 # Endpoint dodawania znajomego z wysyłaniem maila
@@ -92,21 +226,27 @@ def add_friend():
     if 'user_id' not in session:
         return redirect(url_for('login'))
 
-    user = User.query.get(session['user_id'])
+    user = get_current_user()
 
     if request.method == 'POST':
-        friend_email = request.form.get('friend_email')
-        friend = User.query.filter_by(email=friend_email).first()
+        # Znajomego można wskazać e-mailem (formularz) albo identyfikatorem (sugestie na liście znajomych)
+        friend_id = request.form.get('friend_id', type=int)
+        if friend_id is not None:
+            friend = db.session.get(User, friend_id)
+            back_url = url_for('view_friends')
+        else:
+            friend = User.query.filter_by(email=request.form.get('friend_email')).first()
+            back_url = url_for('add_friend')
 
         # Sprawdzanie, czy użytkownik o podanym e-mailu istnieje
         if not friend:
             flash('User not found.', 'error')
-            return redirect(url_for('add_friend'))
+            return redirect(back_url)
 
         # Sprawdzanie, czy użytkownik nie próbuje dodać samego siebie
         if friend.id == user.id:
             flash('You cannot add yourself as a friend.', 'error')
-            return redirect(url_for('add_friend'))
+            return redirect(back_url)
 
         # Sprawdzenie istniejącej relacji w tabeli `friends`
         existing_friendship = db.session.query(Friends).filter(
@@ -116,21 +256,21 @@ def add_friend():
 
         if existing_friendship:
             flash('You are already friends with this user.', 'info')
-            return redirect(url_for('add_friend'))
+            return redirect(back_url)
 
         # Sprawdzenie, czy zaproszenie nie zostało już wysłane
         existing_request = FriendRequest.query.filter_by(sender_id=user.id, recipient_id=friend.id,
                                                          status='pending').first()
         if existing_request:
             flash('Friend request already sent.', 'error')
-            return redirect(url_for('add_friend'))
+            return redirect(back_url)
 
         # Tworzenie nowego zaproszenia w bazie danych
         friend_request = FriendRequest(sender_id=user.id, recipient_id=friend.id)
         db.session.add(friend_request)
 
         try:
-            db.session.commit()
+            db.session.flush()
 
             # Generowanie wiadomości e-mail
             subject = "Friend Request Confirmation"
@@ -144,31 +284,17 @@ def add_friend():
                 "Best regards,\nSmart Split"
             )
 
-            # Tworzenie wiadomości e-mail
-            msg = MIMEMultipart()
-            msg['From'] = sender_email
-            msg['To'] = friend.email
-            msg['Subject'] = subject
-            msg.attach(MIMEText(body, 'plain'))
-
-            # Wysyłanie wiadomości e-mail
-            try:
-                # Połączenie z serwerem SMTP WP.PL
-                with smtplib.SMTP_SSL("smtp.wp.pl", 465) as server:
-                    server.login(sender_email, password)
-                    server.sendmail(sender_email, friend.email, msg.as_string())
-                    print(f"Email sent to {friend.email} from {sender_email}")
-
-                flash('Friend request sent successfully!', 'success')
-            except Exception as e:
-                print(f"Error sending email: {e}")
-                flash('Failed to send friend request email.', 'error')
+            # Wiadomość trafia do kolejki w tej samej transakcji co zaproszenie i jest wysyłana w tle
+            enqueue_email(friend.email, subject, body)
+            db.session.commit()
+
+            flash('Friend request sent successfully!', 'success')
 
         except IntegrityError:
             db.session.rollback()
             flash('Error while adding friend request. Please try again later.', 'error')
 
-        return redirect(url_for('add_friend'))
+        return redirect(back_url)
 
     return render_template('add_friend.html')
 
@@ -226,10 +352,42 @@ def view_friends():
     if 'user_id' not in session:
         return redirect(url_for('login'))
 
-    user = User.query.get(session['user_id'])
-    friends = user.friends
+    user = get_current_user()
+    friends = user.friends.order_by(User.username).all()
 
-    return render_template('friends.html', user=user, friends=friends)
+    return render_template('friends.html', user=user, friends=friends, suggestions=get_friend_suggestions(user.id))
+
+
+# Endpoint sugestii znajomych (znajomi znajomych z liczbą wspólnych znajomych)
+@app.route('/friends/suggestions', methods=['GET'])
+def friend_suggestions():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    limit = min(request.args.get('limit', SUGGESTION_LIMIT, type=int), 100)
+    suggestions = get_friend_suggestions(session['user_id'], limit=max(limit, 1))
+    return jsonify([
+        {
+            'id': suggestion['id'],
+            'username': suggestion['username'],
+            'mutualCount': suggestion['mutual_count'],
+            'mutualNames': suggestion['mutual_names'],
+        }
+        for suggestion in suggestions
+    ])
+
+
+# Endpoint wspólnych znajomych z innym użytkownikiem
+@app.route('/friends/<int:other_user_id>/mutual', methods=['GET'])
+def mutual_friends(other_user_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    if not can_view_mutual_friends(session['user_id'], other_user_id):
+        return jsonify({'error': 'Permission denied'}), 403
+
+    friends = get_mutual_friends(session['user_id'], other_user_id)
+    return jsonify([{'id': friend.id, 'username': friend.username} for friend in friends])
 
 
 # Endpoint tworzenia grupy
@@ -238,7 +396,7 @@ def create_group():
     if 'user_id' not in session:
         return redirect(url_for('login'))
 
-    user = User.query.get(session['user_id'])
+    user = get_current_user()
 
     if request.method == 'POST':
         group_name = request.form.get('group_name')
@@ -249,31 +407,15 @@ def create_group():
             flash('Group name is required!', 'error')
             return redirect(url_for('create_group'))
 
-        # Utworzenie nowej grupy
-        new_group = Group(name=group_name, created_by=user.id)
-        db.session.add(new_group)
-
+        # Utworzenie grupy razem z członkami w jednej transakcji (członkami mogą być tylko znajomi)
         try:
+            create_group_with_members(group_name, user.id, selected_friends)
             db.session.commit()
-            print(f"New group created with ID {new_group.id}")
-
-            # Dodanie właściciela grupy
-            user_group_owner = UserGroup(user_id=user.id, group_id=new_group.id)
-            db.session.add(user_group_owner)
-
-            # Dodanie znajomych do grupy
-            for friend_id in selected_friends:
-                # Sprawdzanie, czy znajomy istnieje
-                friend = User.query.get(friend_id)
-                if friend:
-                    user_group = UserGroup(user_id=friend.id, group_id=new_group.id)
-                    db.session.add(user_group)
-                    print(f"Adding friend with ID {friend.id} to group with ID {new_group.id}")
-                else:
-                    print(f"Friend with ID {friend_id} not found. Skipping.")
-
-            db.session.commit()  # Zatwierdzenie wszystkich zmian
             return redirect(url_for('user_dashboard'))
+        except MembershipError as e:
+            db.session.rollback()
+            flash(str(e), 'error')
+            return redirect(url_for('create_group'))
         except Exception as e:
             db.session.rollback()  # Wycofanie zmian w przypadku błędu
             print(f"An error occurred: {e}")
@@ -290,7 +432,7 @@ def view_groups():
     if 'user_id' not in session:
         return redirect(url_for('login'))
 
-    user = User.query.get(session['user_id'])
+    user = get_current_user()
 
     groups = db.session.query(Group).join(UserGroup).filter(UserGroup.user_id == user.id).all()
 
@@ -303,48 +445,196 @@ def view_group(group_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
 
-    group = Group.query.get_or_404(group_id)
-    user = User.query.get(session['user_id'])
+    snapshot = load_group_snapshot(group_id)
+    if not snapshot:
+        abort(404)
+
+    group = snapshot['group']
+    members = snapshot['members']
 
     # Sprawdzamy, czy użytkownik jest członkiem grupy
-    if user not in group.members:
+    if session['user_id'] not in members:
         flash('You are not a member of this group!', 'error')
         return redirect(url_for('view_groups'))
 
-    members = {member.id: member for member in group.members}
-
     print("Members in group:", members)
 
-    expenses = []
-    balance_sheet = {}
+    # Znajomi, których można jeszcze dodać do grupy
+    addable_friends = sorted((friend for friend in get_current_user().friends if friend.id not in members),
+                             key=lambda friend: friend.username)
+
+    return render_template('group_detail.html', group=group, members=members, addable_friends=addable_friends,
+                           expenses=snapshot['expenses'],
+                           expenses_cursor=snapshot['expenses_cursor'], settlements=snapshot['settlements'],
+                           settlements_cursor=snapshot['settlements_cursor'], balance_sheet=snapshot['balance_sheet'],
+                           suggested_settlements=simplify_debts(net_positions(snapshot['balance_sheet'])))
+
+
+def _feed_arguments():
+    """
+    Odczytuje wspólne parametry feedów (limit, cursor, payer_id, date_from, date_to) z adresu żądania.
+    Zgłasza ValueError dla niepoprawnych wartości.
+    """
+    limit = min(int(request.args.get('limit', FEED_PAGE_SIZE)), FEED_MAX_PAGE_SIZE)
+    if limit <= 0:
+        raise ValueError("limit must be positive")
+
+    date_from = request.args.get('date_from')
+    date_to = request.args.get('date_to')
+
+    return {
+        'limit': limit,
+        'cursor': request.args.get('cursor') or None,
+        'payer_id': request.args.get('payer_id', type=int),
+        'date_from': datetime.strptime(date_from, '%Y-%m-%d') if date_from else None,
+        'date_to': datetime.strptime(date_to, '%Y-%m-%d') if date_to else None,
+    }
+
+
+# Endpoint kolejnych stron wydatków grupy (paginacja po (created_at, id))
+@app.route('/group/<int:group_id>/expenses_feed', methods=['GET'])
+@group_member_required(api=True)
+def expenses_feed(group_id):
+    try:
+        arguments = _feed_arguments()
+        items, next_cursor = get_expense_feed(group_id, category=request.args.get('category') or None, **arguments)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({'items': items, 'nextCursor': next_cursor})
+
+
+# Endpoint kolejnych stron spłat grupy (paginacja po (date, id))
+@app.route('/group/<int:group_id>/settlements_feed', methods=['GET'])
+@group_member_required(api=True)
+def settlements_feed(group_id):
+    try:
+        items, next_cursor = get_settlement_feed(group_id, **_feed_arguments())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({'items': items, 'nextCursor': next_cursor})
+
+
+# Endpoint eksportu historii grupy (CSV albo NDJSON), wysyłanego strumieniowo
+@app.route('/group/<int:group_id>/export/<kind>.<export_format>', methods=['GET'])
+@group_member_required(api=True)
+def export_group(group_id, kind, export_format):
+    if kind not in EXPORT_KINDS or export_format not in EXPORT_FORMATS:
+        abort(404)
+
+    base_currency = request.args.get('base')
+    if base_currency:
+        base_currency = base_currency.upper()
+        if base_currency not in get_supported_currencies():
+            return jsonify({"error": "Unknown base currency"}), 400
+
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response = Response(stream_with_context(stream_export(kind, group_id, export_format, base_currency)),
+                        mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=group-{group_id}-{kind}.{export_format}'
+    return response
 
-    for expense in group.expenses:
-        payer_shares = ExpenseShare.query.filter_by(expense_id=expense.id).all()
 
-        paid_by_users = set()
-        for payer_share in payer_shares:
-            payer_user = User.query.get(payer_share.paid_by)
-            if payer_user:
-                paid_by_users.add(payer_user.username)
+# Endpoint importu wydatków z pliku CSV albo JSON (wszystkie wiersze albo żaden)
+@app.route('/group/<int:group_id>/import', methods=['POST'])
+@group_member_required(api=True)
+def import_group_expenses(group_id):
+    group = Group.query.get_or_404(group_id)
+
+    upload = request.files.get('file')
+    if upload is not None:
+        data = upload.read()
+        default_format = os.path.splitext(upload.filename or '')[1].lstrip('.').lower()
+    else:
+        data = request.get_data()
+        default_format = 'json' if request.is_json else 'csv'
+
+    import_format = request.args.get('format', default_format)
+    try:
+        rows = parse_import(data, import_format)
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'error': f'Cannot read import file: {e}'}), 400
+
+    expenses, errors = validate_import(group, rows, session['user_id'])
+    if errors:
+        max_errors = app.config['IMPORT_MAX_ERRORS']
+        return jsonify({
+            'error': 'Import rejected, nothing was saved.',
+            'errorCount': len(errors),
+            'errors': [{'row': number, 'message': message} for number, message in errors[:max_errors]],
+        }), 400
+
+    try:
+        stats = import_expenses(group, expenses)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Error while importing expenses: {e}'}), 500
 
-        if not paid_by_users:
-            paid_by_users.add("Unknown")
+    return jsonify({
+        'imported': stats['expenses'],
+        'shares': stats['shares'],
+        'seconds': stats['seconds'],
+        'expensesPerSecond': stats['expenses_per_second'],
+    }), 201
 
-        expenses.append({
-            'id': expense.id,
-            'description': expense.description,
-            'amount': expense.amount,
-            'currency': expense.currency,
-            'category': expense.category,
-            'date': expense.created_at.strftime('%Y-%m-%d'),
-            'paid_by': ', '.join(paid_by_users)
-        })
 
-        if group.expenses:
-            balance_sheet = calculate_balance(group)
+# Endpoint dodawania członków do grupy (tylko znajomi dodającego; jeden INSERT dla wszystkich)
+@app.route('/group/<int:group_id>/members', methods=['POST'])
+@group_member_required(api=True)
+def add_group_members(group_id):
+    group = Group.query.get_or_404(group_id)
+    user_ids = (request.get_json(silent=True) or {}).get('userIds') or request.form.getlist('user_ids')
 
-    return render_template('group_detail.html', group=group, members=members, expenses=expenses,
-                           balance_sheet=balance_sheet)
+    try:
+        added = add_members(group, session['user_id'], user_ids)
+        db.session.commit()
+    except MembershipError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), **e.details}), 400
+
+    return jsonify({'added': added})
+
+
+# Endpoint usuwania członków z grupy (twórca usuwa innych, członek może opuścić grupę)
+@app.route('/group/<int:group_id>/members/remove', methods=['POST'])
+@group_member_required(api=True)
+def remove_group_members(group_id):
+    group = Group.query.get_or_404(group_id)
+    user_ids = (request.get_json(silent=True) or {}).get('userIds') or request.form.getlist('user_ids')
+
+    try:
+        removed = remove_members(group, session['user_id'], user_ids)
+        db.session.commit()
+    except MembershipError as e:
+        db.session.rollback()
+        # Niezerowe saldo i historia wydatków to konflikt ze stanem grupy, pozostałe błędy to niepoprawne żądanie
+        conflict = 'openBalances' in e.details or 'withHistory' in e.details
+        return jsonify({'error': str(e), **e.details}), 409 if conflict else 400
+
+    return jsonify({'removed': removed})
+
+
+# Endpoint sugerowanych spłat (minimalna lista przelewów wyrównująca salda)
+@app.route('/group/<int:group_id>/suggested_settlements', methods=['GET'])
+@group_member_required(api=True)
+def get_suggested_settlements(group_id):
+    group = Group.query.get_or_404(group_id)
+    members = {member.id: member for member in group.members}
+    transfers = simplify_debts(read_net_positions(group.id))
+
+    return jsonify([
+        {
+            'payerId': transfer['payer_id'],
+            'payerName': members[transfer['payer_id']].username if transfer['payer_id'] in members else None,
+            'receiverId': transfer['receiver_id'],
+            'receiverName': members[transfer['receiver_id']].username if transfer['receiver_id'] in members else None,
+            'amount': str(transfer['amount']),
+            'currency': transfer['currency'],
+        }
+        for transfer in transfers
+    ])
 
 
 # Endpoint wysyłania powiadomienia
@@ -354,7 +644,7 @@ def send_reminder(receiver_id):
         return jsonify({'error': 'Unauthorized'}), 401
 
     # Użytkownik zalogowany (odbiorca płatności)
-    receiver = User.query.get(session['user_id'])
+    receiver = get_current_user()
     # Płatnik (osoba, której przypominamy o płatności)
     payer = User.query.get(receiver_id)
 
@@ -377,81 +667,107 @@ def send_reminder(receiver_id):
         "Best regards,\nYour Group Manager"
     )
 
-    msg = MIMEMultipart()
-    msg['From'] = sender_email
-    msg['To'] = payer.email
-    msg['Subject'] = subject
-    msg.attach(MIMEText(body, 'plain'))
+    # Wiadomość trafia do kolejki i jest wysyłana w tle
+    enqueue_email(payer.email, subject, body)
+    db.session.commit()
 
-    try:
-        # Połączenie z serwerem SMTP WP.PL
-        with smtplib.SMTP_SSL("smtp.wp.pl", 465) as server:
-            server.login(sender_email, password)
-            server.sendmail(sender_email, payer.email, msg.as_string())
-            print(f"Email sent to {payer.email} from {sender_email}")
+    return jsonify({'message': 'E-mail queued for sending.'}), 202
 
-        return jsonify({'message': 'E-mail sent successfully!'}), 200
-    except Exception as e:
-        print(f"Error sending email: {e}")
-        return jsonify({'error': 'Failed to send e-mail'}), 500
+
+# Endpoint wysyłania przypomnień do wszystkich dłużników zalogowanego użytkownika w grupie
+@app.route('/group/<int:group_id>/remind_debtors', methods=['POST'])
+@group_member_required(api=True)
+def remind_debtors(group_id):
+    group = Group.query.get_or_404(group_id)
+    members = {member.id: member for member in group.members}
+    # Członkostwo z cache mogło się już zmienić (TTL) - skład grupy z bazy jest rozstrzygający
+    creditor = members.get(session['user_id'])
+    if creditor is None:
+        return jsonify({'error': 'Permission denied'}), 403
+
+    # Salda osób, które nie są już członkami grupy, są pomijane
+    debtors = {
+        debtor_id: debts
+        for debtor_id, debts in read_debtors(group.id, creditor.id).items()
+        if debtor_id in members
+    }
+
+    # Pomijamy dłużników, którym przypomnienie w tej grupie wysłano w ciągu ostatnich REMINDER_DEDUP_WINDOW sekund
+    dedup_keys = {debtor_id: f"reminder:{group.id}:{creditor.id}:{debtor_id}" for debtor_id in debtors}
+    recent = find_recent_dedup_keys(dedup_keys.values(), app.config['REMINDER_DEDUP_WINDOW'])
+
+    queued, skipped = [], []
+    for debtor_id, debts in debtors.items():
+        debtor = members[debtor_id]
+        if dedup_keys[debtor_id] in recent:
+            skipped.append(debtor.username)
+            continue
+
+        body = render_template('emails/payment_reminder.txt', debtor=debtor, creditor=creditor,
+                               group=group, debts=debts)
+        enqueue_email(debtor.email, "Payment Reminder", body, dedup_key=dedup_keys[debtor_id])
+        queued.append(debtor.username)
+
+    # Wszystkie przypomnienia trafiają do kolejki w jednej transakcji i są wysyłane jedną sesją SMTP
+    db.session.commit()
+
+    return jsonify({'queued': queued, 'skipped': skipped}), 202
 
 
 # Endpoint wyswietlania wykresow
 @app.route('/charts/<int:group_id>')
+@group_member_required
 def view_charts(group_id):
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
+    base_currency = request.args.get('base', 'PLN').upper()
+    if base_currency not in get_supported_currencies():
+        return "Unknown base currency", 400
 
     group = Group.query.get_or_404(group_id)
-    user = User.query.get(session['user_id'])
-
-    if user not in group.members:
-        flash('You are not a member of this group!', 'error')
-        return redirect(url_for('view_groups'))
-
-    if not group:
-        return "Group not found", 404
+    currencies = ['PLN', 'EUR', 'USD']
+    if base_currency not in currencies:
+        currencies.append(base_currency)
 
-    return render_template('charts.html', group=group)
+    return render_template('charts.html', group=group, base_currency=base_currency, currencies=currencies)
 
 
 # Endpoint generowania wykresow
 @app.route('/charts_data/<int:group_id>', methods=['GET'])
+@group_member_required
 def get_charts_data(group_id):
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
+    base_currency = request.args.get('base', 'PLN').upper()
+    if base_currency not in get_supported_currencies():
+        return jsonify({"error": "Unknown base currency"}), 400
 
-    group = Group.query.get_or_404(group_id)
-    user = User.query.get(session['user_id'])
-
-    if user not in group.members:
-        flash('You are not a member of this group!', 'error')
-        return redirect(url_for('view_groups'))
-
-    if not group:
-        return jsonify({"error": "Group not found"}), 404
-
-    group_data = get_group_charts_data(group)
-    user_data = get_user_charts_data(group, user.id)
+    user_id = session['user_id']
+    etag = get_charts_etag(group_id, user_id, base_currency)
+    if etag is None:
+        abort(404)
 
-    return jsonify({
-        'groupData': group_data,
-        'userData': user_data,
-    })
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        payload = charts_cache.get(etag)
+        if payload is None:
+            group = Group.query.get_or_404(group_id)
+            group_data, user_data = get_charts_data_for_group_and_user(group, user_id, base_currency)
+            payload = app.json.dumps({
+                'currency': base_currency,
+                'groupData': group_data,
+                'userData': user_data,
+            })
+            charts_cache.set(etag, payload)
+        response = Response(payload, mimetype='application/json')
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 # Endpoint dodawania wydatku
 @app.route('/group/<int:group_id>/add_expense', methods=['GET', 'POST'])
+@group_member_required
 def add_expense(group_id):
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-
     group = Group.query.get_or_404(group_id)
-    user = User.query.get(session['user_id'])
-
-    if user not in group.members:
-        flash('You are not a member of this group!', 'error')
-        return redirect(url_for('view_groups'))
 
     if request.method == 'POST':
         description = request.form.get('description')
@@ -459,50 +775,35 @@ def add_expense(group_id):
         currency = request.form.get('currency')  # Pobierz walutę
         category = request.form.get('category')
         split_type = request.form.get('split_type')
-        selected_members = request.form.getlist('members')
         created_by = session['user_id']
-        paid_by = request.form.get('paid_by')
+        paid_by = request.form.get('paid_by', type=int)
 
         if not description or not amount:
             flash('Description and amount are needed!', 'error')
             return redirect(url_for('add_expense', group_id=group_id))
 
         try:
-            amount = Decimal(amount).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            if amount <= 0:
+            amount = Money.parse(amount, currency)
+            if amount.cents <= 0:
                 raise ValueError
         except ValueError:
             flash('Amount must be positive!', 'error')
             return redirect(url_for('add_expense', group_id=group_id))
 
         # Walidacja i podział wydatku
-        shares = {}
-        if split_type == 'equal':
-            share_amount = round(amount / len(selected_members), 2)
-            shares = {member_id: share_amount for member_id in selected_members}
-            custom_split = False
-        elif split_type == 'custom':
-            total_custom_share = 0
-            for member_id in selected_members:
-                try:
-                    member_share = Decimal(request.form.get(f'custom_share_{member_id}', 0)).\
-                        quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-                    shares[member_id] = member_share
-                    total_custom_share += member_share
-                except ValueError:
-                    flash('Custom shares must be numbers.', 'error')
-                    return redirect(url_for('add_expense', group_id=group_id))
-
-            if round(total_custom_share, 2) != round(amount, 2):
-                flash('Custom shares do not add up to the total amount.', 'error')
-                return redirect(url_for('add_expense', group_id=group_id))
-            custom_split = True
+        try:
+            shares = split_expense(split_type, amount, split_values_from_form(request.form, split_type))
+            if not set(shares) <= {member.id for member in group.members}:
+                raise SplitError('Shares can only be assigned to group members.')
+        except (SplitError, ValueError) as e:
+            flash(str(e) if isinstance(e, SplitError) else 'Invalid split data.', 'error')
+            return redirect(url_for('add_expense', group_id=group_id))
+        custom_split = split_type != 'equal'
 
         # Tworzenie nowego wydatku
         new_expense = Expense(
             description=description,
-            amount=amount,  # Bez konwersji waluty
-            currency=currency,  # Zapisywanie podanej waluty
+            money=amount,  # Kwota i waluta, bez konwersji waluty
             category=category,
             created_by=created_by,
             group_id=group.id,
@@ -513,15 +814,8 @@ def add_expense(group_id):
             db.session.add(new_expense)
             db.session.flush()
 
-            # Dodawanie udziałów
-            for member_id, member_share in shares.items():
-                expense_share = ExpenseShare(
-                    expense_id=new_expense.id,
-                    user_id=member_id,
-                    share=member_share,
-                    paid_by=paid_by
-                )
-                db.session.add(expense_share)
+            # Dodawanie udziałów (jednym poleceniem) i aktualizacja sald i zestawień grupy w tej samej transakcji
+            expense_changed(group, new_expense, write_shares(new_expense.id, shares, paid_by))
 
             db.session.commit()
 
@@ -546,8 +840,8 @@ def edit_expense(expense_id):
         return redirect(url_for('view_group', group_id=expense.group_id))
 
     group = expense.group
-    user = User.query.get(session['user_id'])
-    if user not in group.members:
+    user = get_current_user()
+    if not is_group_member(user.id, group.id):
         flash("You are not a member of this group!", 'error')
         return redirect(url_for('view_groups'))
 
@@ -564,10 +858,7 @@ def edit_expense(expense_id):
         currency = request.form.get('currency')  # Pobranie waluty z formularza
         category = request.form.get('category')
         split_type = request.form.get('split_type')
-        paid_by = request.form.get('paid_by')
-
-        selected_members = request.form.getlist('members')
-        shares = {}
+        paid_by = request.form.get('paid_by', type=int)
 
         # Walidacja danych wejściowych
         if not description or not amount:
@@ -575,47 +866,34 @@ def edit_expense(expense_id):
             return redirect(url_for('edit_expense', expense_id=expense.id))
 
         try:
-            amount = Decimal(amount).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            if amount <= 0:
+            amount = Money.parse(amount, currency)
+            if amount.cents <= 0:
                 raise ValueError
         except ValueError:
             flash('Amount must be a positive number!', 'error')
             return redirect(url_for('edit_expense', expense_id=expense.id))
 
         # Obsługa podziału
-        if split_type == 'equal':
-            share_amount = round(amount / len(selected_members), 2)
-            shares = {int(member_id): share_amount for member_id in selected_members}
-            expense.custom_split = False
-        elif split_type == 'custom':
-            total_custom_share = 0
-            for member_id in selected_members:
-                try:
-                    member_share = Decimal(request.form.get(f'custom_share_{member_id}', 0)).\
-                        quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-                    shares[int(member_id)] = member_share
-                    total_custom_share += member_share
-                except ValueError:
-                    flash('Custom shares must be numbers.', 'error')
-                    return redirect(url_for('edit_expense', expense_id=expense.id))
-
-            if round(total_custom_share, 2) != round(amount, 2):
-                flash('Custom shares do not add up to the total amount.', 'error')
-                return redirect(url_for('edit_expense', expense_id=expense.id))
+        try:
+            shares = split_expense(split_type, amount, split_values_from_form(request.form, split_type))
+            if not set(shares) <= set(members_dict):
+                raise SplitError('Shares can only be assigned to group members.')
+        except (SplitError, ValueError) as e:
+            flash(str(e) if isinstance(e, SplitError) else 'Invalid split data.', 'error')
+            return redirect(url_for('edit_expense', expense_id=expense.id))
+        expense.custom_split = split_type != 'equal'
 
-            expense.custom_split = True
+        # Wycofanie starego wydatku z sald i zestawień grupy
+        expense_changed(group, expense, expense_shares(expense), sign=-1)
 
         # Aktualizacja wydatku
         expense.description = description
-        expense.amount = amount
-        expense.currency = currency
+        expense.money = amount
         expense.category = category
 
         # Aktualizacja ExpenseShare
         ExpenseShare.query.filter_by(expense_id=expense.id).delete()
-        for member_id, share in shares.items():
-            new_share = ExpenseShare(expense_id=expense.id, user_id=member_id, share=share, paid_by=paid_by)
-            db.session.add(new_share)
+        expense_changed(group, expense, write_shares(expense.id, shares, paid_by))
 
         db.session.commit()
         flash("Expense updated successfully.", "success")
@@ -637,8 +915,8 @@ def delete_expense(expense_id):
         return redirect(url_for('view_group', group_id=expense.group_id))
 
     group = expense.group
-    user = User.query.get(session['user_id'])
-    if user not in group.members:
+    user = get_current_user()
+    if not is_group_member(user.id, group.id):
         flash("You are not a member of this group!", 'error')
         return redirect(url_for('view_groups'))
 
@@ -648,6 +926,7 @@ def delete_expense(expense_id):
 
     group_id = expense.group_id
 
+    expense_changed(group, expense, expense_shares(expense), sign=-1)
     db.session.delete(expense)
     db.session.commit()
 
@@ -657,37 +936,40 @@ def delete_expense(expense_id):
 
 # Endpoint dodawania spłaty
 @app.route('/group/<int:group_id>/settle', methods=['GET', 'POST'])
+@group_member_required
 def settle_expense(group_id):
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-
     group = Group.query.get_or_404(group_id)
-    user = User.query.get(session['user_id'])
-
-    if user not in group.members:
-        flash('You are not a member of this group!', 'error')
-        return redirect(url_for('view_groups'))
+    user = get_current_user()
 
     if request.method == 'POST':
-        payer_id = request.form.get('payer_id')
+        payer_id = request.form.get('payer_id', type=int)
         receiver_id = user.id
-        amount = Decimal(request.form.get('amount'))
         currency = request.form.get('currency')  # Waluta wybrana przez użytkownika
+        try:
+            amount = Money.parse(request.form.get('amount'), currency)
+        except ValueError:
+            flash('Amount must be a number.', 'error')
+            return redirect(url_for('settle_expense', group_id=group.id))
 
-        payer = User.query.get(payer_id)
-        receiver = user.id
+        if payer_id is None:
+            return "Invalid payer or receiver", 400
 
         if payer_id == receiver_id:
             flash('Payer and receiver must be different users.', 'error')
             return redirect(url_for('view_group', group_id=group.id))
 
-        if not payer or not receiver:
+        # Obie strony spłaty muszą być członkami grupy - spłaty osób spoza grupy zmieniałyby salda członków
+        member_ids = {
+            row.user_id for row in db.session.query(UserGroup.user_id)
+            .filter(UserGroup.group_id == group.id, UserGroup.user_id.in_([payer_id, receiver_id]))
+        }
+        if member_ids != {payer_id, receiver_id}:
             return "Invalid payer or receiver", 400
 
         # Tworzymy nową spłatę
-        settlement = Settlement(group_id=group.id, payer_id=payer.id, receiver_id=receiver, amount=amount,
-                                currency=currency)
+        settlement = Settlement(group_id=group.id, payer_id=payer_id, receiver_id=receiver_id, money=amount)
         db.session.add(settlement)
+        settlement_changed(settlement)
 
         db.session.commit()
 
@@ -706,38 +988,49 @@ def edit_settlement(group_id, settlement_id):
 
     group = Group.query.get_or_404(group_id)
     settlement = Settlement.query.get_or_404(settlement_id)
-    user = User.query.get(session['user_id'])
+    if settlement.group_id != group.id:
+        abort(404)
+    user = get_current_user()
 
     if settlement.payer_id != session['user_id'] and settlement.receiver_id != session['user_id']:
         flash('You are not authorized to edit this settlement.', 'error')
         return redirect(url_for('view_group', group_id=group.id))
 
     if request.method == 'POST':
-        payer_id = request.form.get('payer_id')
+        payer_id = request.form.get('payer_id', type=int)
         receiver_id = user.id
-        amount = Decimal(request.form.get('amount'))
         currency = request.form.get('currency')
+        try:
+            amount = Money.parse(request.form.get('amount'), currency)
+        except ValueError:
+            flash('Amount must be a number.', 'error')
+            return redirect(url_for('edit_settlement', group_id=group_id, settlement_id=settlement_id))
 
-        payer = User.query.get(payer_id)
-        receiver = user.id
+        if payer_id is None:
+            return "Invalid payer or receiver", 400
 
         if payer_id == receiver_id:
             flash('Payer and receiver must be different users.', 'error')
             return redirect(url_for('edit_settlement', group_id=group_id, settlement_id=settlement_id))
 
-        if not payer or not receiver:
-            flash('Invalid payer or receiver.', 'error')
-            return redirect(url_for('edit_settlement', group_id=group_id, settlement_id=settlement_id))
+        # Jak w settle_expense - obie strony spłaty muszą być członkami grupy
+        member_ids = {
+            row.user_id for row in db.session.query(UserGroup.user_id)
+            .filter(UserGroup.group_id == group.id, UserGroup.user_id.in_([payer_id, receiver_id]))
+        }
+        if member_ids != {payer_id, receiver_id}:
+            return "Invalid payer or receiver", 400
 
-        if amount <= 0:
+        if amount.cents <= 0:
             flash('Amount must be greater than zero.', 'error')
             return redirect(url_for('edit_settlement', group_id=group_id, settlement_id=settlement_id))
 
         # Aktualizacja spłaty
-        settlement.payer_id = payer.id
+        settlement_changed(settlement, sign=-1)
+        settlement.payer_id = payer_id
         settlement.receiver_id = user.id
-        settlement.amount = amount
-        settlement.currency = currency  # Zaktualizowana waluta
+        settlement.money = amount  # Zaktualizowana kwota i waluta
+        settlement_changed(settlement)
 
         db.session.commit()
 
@@ -763,6 +1056,7 @@ def delete_settlement(group_id, settlement_id):
         return redirect(url_for('view_group', group_id=group.id))
 
     try:
+        settlement_changed(settlement, sign=-1)
         db.session.delete(settlement)
         db.session.commit()
         flash('Settlement deleted successfully!', 'success')
@@ -780,6 +1074,20 @@ def logout():
     return redirect(url_for('login'))
 
 
+# Endpoint metryk w formacie Prometheus (czas odpowiedzi, zapytania SQL i wykryte N+1 per endpoint)
+@app.route('/metrics')
+def metrics():
+    token = app.config.get('METRICS_TOKEN')
+    if 'request_metrics' not in app.extensions or not token:
+        abort(404)
+
+    # Metryki zdradzają ruch i zapytania aplikacji - tylko dla scrapera znającego token
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return Response('Unauthorized', status=401, headers={'WWW-Authenticate': 'Bearer'})
+
+    return Response(app.extensions['request_metrics'].render(), mimetype='text/plain; version=0.0.4')
+
+
 # Bazowy endpoint
 @app.route('/')
 def index():
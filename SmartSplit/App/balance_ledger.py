@@ -0,0 +1,198 @@
+from collections import defaultdict
+from decimal import Decimal
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from models import db, GroupBalance, ExpenseShare
+from calculate_balance import compute_balance
+from money import from_cents, to_cents
+
+
+def expense_shares(expense):
+    """
+    Zwraca zapisane udziały wydatku jako listę krotek (user_id, share, paid_by) w formacie oczekiwanym
+    przez record_expense. Udziały są pobierane kolumnowo, więc nie ładują kolekcji expense.shares.
+    """
+    return (
+        db.session.query(ExpenseShare.user_id, ExpenseShare.share, ExpenseShare.paid_by)
+        .filter(ExpenseShare.expense_id == expense.id)
+        .all()
+    )
+
+
+def _apply_deltas(group_id, deltas):
+    """
+    Dopisuje zmiany sald (w groszach) do tabeli groupbalances jednym poleceniem INSERT ... ON CONFLICT DO UPDATE.
+    Zmiana trafia do bieżącej transakcji sesji i jest zatwierdzana razem z operacją, która ją wywołała.
+    """
+    rows = [
+        {
+            'group_id': group_id,
+            'debtor_id': debtor_id,
+            'creditor_id': creditor_id,
+            'currency': currency,
+            'amount': from_cents(cents),
+        }
+        for (debtor_id, creditor_id, currency), cents in sorted(deltas.items())
+        if cents
+    ]
+
+    if not rows:
+        return
+
+    stmt = insert(GroupBalance).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[GroupBalance.group_id, GroupBalance.debtor_id, GroupBalance.creditor_id,
+                        GroupBalance.currency],
+        set_={'amount': GroupBalance.amount + stmt.excluded.amount}
+    )
+    db.session.execute(stmt)
+
+
+def _add_expense_deltas(deltas, members, currency, shares, sign):
+    shares = [(int(user_id), share, int(paid_by) if paid_by else None) for user_id, share, paid_by in shares]
+
+    payer_user_id = next((user_id for user_id, _, paid_by in shares if paid_by == user_id), None)
+    if payer_user_id is None or payer_user_id not in members:
+        return
+
+    for member_user_id, share, _ in shares:
+        if member_user_id not in members or member_user_id == payer_user_id:
+            continue
+
+        member_share_cents = to_cents(share) * sign
+        deltas[(member_user_id, payer_user_id, currency)] += member_share_cents
+        deltas[(payer_user_id, member_user_id, currency)] -= member_share_cents
+
+
+def record_expense(group, currency, shares, sign=1):
+    """
+    Aktualizuje salda grupy o wydatek (sign=1) lub wycofuje go (sign=-1).
+    Reguły są takie same jak w calculate_balance: płatnikiem jest udział, w którym paid_by == user_id,
+    a udziały osób spoza grupy są pomijane.
+    """
+    members = {member.id for member in group.members}
+    deltas = defaultdict(int)
+    _add_expense_deltas(deltas, members, currency, shares, sign)
+    _apply_deltas(group.id, deltas)
+
+
+def record_expenses(group, expenses):
+    """
+    Wersja record_expense dla wielu wydatków naraz (np. przy imporcie): expenses to lista par
+    (currency, shares). Zmiany są sumowane w pamięci i zapisywane jednym poleceniem.
+    """
+    members = {member.id for member in group.members}
+    deltas = defaultdict(int)
+    for currency, shares in expenses:
+        _add_expense_deltas(deltas, members, currency, shares, 1)
+    _apply_deltas(group.id, deltas)
+
+
+def record_settlement(settlement, sign=1):
+    """
+    Aktualizuje salda grupy o spłatę (sign=1) lub wycofuje ją (sign=-1).
+    """
+    payer_id = int(settlement.payer_id)
+    receiver_id = int(settlement.receiver_id)
+    settlement_cents = to_cents(settlement.amount) * sign
+
+    deltas = defaultdict(int)
+    deltas[(payer_id, receiver_id, settlement.currency)] -= settlement_cents
+    deltas[(receiver_id, payer_id, settlement.currency)] += settlement_cents
+
+    _apply_deltas(settlement.group_id, deltas)
+
+
+def read_balance(group_id):
+    """
+    Odczytuje saldo grupy z tabeli groupbalances w tym samym formacie, co calculate_balance.
+    Koszt zależy od liczby par członków, a nie od długości historii wydatków.
+    """
+    balance_sheet = defaultdict(lambda: defaultdict(lambda: defaultdict(Decimal)))
+
+    for row in GroupBalance.query.filter_by(group_id=group_id).all():
+        balance_sheet[row.debtor_id][row.creditor_id][row.currency] = row.amount
+
+    return balance_sheet
+
+
+def read_net_positions(group_id):
+    """
+    Zwraca pozycje netto członków grupy w groszach ({currency: {user_id: cents}}), sumowane w bazie danych.
+    Dodatnia wartość oznacza, że członkowi należą się pieniądze, ujemna, że jest winny.
+    """
+    rows = (
+        db.session.query(GroupBalance.currency, GroupBalance.debtor_id, func.sum(GroupBalance.amount))
+        .filter(GroupBalance.group_id == group_id)
+        .group_by(GroupBalance.currency, GroupBalance.debtor_id)
+        .all()
+    )
+
+    positions = defaultdict(dict)
+    for currency, user_id, amount in rows:
+        positions[currency][user_id] = -to_cents(amount)
+
+    return positions
+
+
+def read_debtors(group_id, creditor_id):
+    """
+    Zwraca długi wobec użytkownika creditor_id w grupie jako słownik {debtor_id: [(currency, amount), ...]}.
+    Uwzględniane są tylko dodatnie salda (dłużnik faktycznie jest winny pieniądze).
+    """
+    rows = (
+        db.session.query(GroupBalance.debtor_id, GroupBalance.currency, GroupBalance.amount)
+        .filter(GroupBalance.group_id == group_id,
+                GroupBalance.creditor_id == creditor_id,
+                GroupBalance.amount > 0)
+        .order_by(GroupBalance.debtor_id, GroupBalance.currency)
+        .all()
+    )
+
+    debtors = defaultdict(list)
+    for debtor_id, currency, amount in rows:
+        debtors[debtor_id].append((currency, amount))
+
+    return debtors
+
+
+def find_balance_drift(group):
+    """
+    Porównuje saldo przechowywane w groupbalances z saldem przeliczonym od zera (compute_balance).
+    Zwraca listę krotek (debtor_id, creditor_id, currency, expected, actual) dla wszystkich rozbieżności.
+    """
+    expected = compute_balance(group)
+    actual = read_balance(group.id)
+
+    keys = set()
+    for sheet in (expected, actual):
+        for debtor_id, balances in sheet.items():
+            for creditor_id, currencies in balances.items():
+                for currency in currencies:
+                    keys.add((debtor_id, creditor_id, currency))
+
+    drift = []
+    for debtor_id, creditor_id, currency in sorted(keys):
+        expected_amount = expected.get(debtor_id, {}).get(creditor_id, {}).get(currency, Decimal('0.00'))
+        actual_amount = actual.get(debtor_id, {}).get(creditor_id, {}).get(currency, Decimal('0.00'))
+        if expected_amount != actual_amount:
+            drift.append((debtor_id, creditor_id, currency, expected_amount, actual_amount))
+
+    return drift
+
+
+def rebuild_balance(group):
+    """
+    Przelicza saldo grupy od zera i zastępuje nim zawartość groupbalances dla tej grupy.
+    """
+    balance_sheet = compute_balance(group)
+
+    GroupBalance.query.filter_by(group_id=group.id).delete()
+
+    deltas = {
+        (debtor_id, creditor_id, currency): to_cents(amount)
+        for debtor_id, balances in balance_sheet.items()
+        for creditor_id, currencies in balances.items()
+        for currency, amount in currencies.items()
+    }
+    _apply_deltas(group.id, deltas)
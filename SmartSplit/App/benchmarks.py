@@ -0,0 +1,255 @@
+import json
+import os
+import statistics
+import time
+import tracemalloc
+import uuid
+from flask import current_app
+from sqlalchemy import func, select, text
+from models import db, Group, Expense, ExpenseShare, Settlement, Currency
+from balance_ledger import record_expenses, read_net_positions
+from calculate_balance import calculate_balance
+from chart_rollup import backfill_expense_rollups
+from charts import get_group_charts_data, get_user_charts_data
+from exchange_rate import convert_to_pln
+from group_changes import bump_group_version, settlement_changed
+from group_snapshot import load_group
+from ledger_export import stream_export
+from settle_up import simplify_debts
+
+# Typowe rozmiary grup do pomiarów (liczba wydatków)
+BENCH_SIZES = (10, 1000, 100000, 1000000)
+# Wydatki są generowane paczkami, żeby RETURNING i liczenie sald nie trzymały w pamięci całej grupy
+_SEED_CHUNK = 100000
+# Ilu członków dzieli każdy wydatek (płatnik i kolejni członkowie)
+_SEED_SPLIT = 4
+# Kursy walut obcych zapisywane, gdy baza ich jeszcze nie ma
+_SEED_RATES = {'EUR': '4.300000', 'USD': '4.000000'}
+# Mierzone ścieżki, w kolejności pomiaru
+BENCH_PATHS = ('calculate_balance', 'group_charts', 'user_charts', 'convert_to_pln', 'view_group')
+# Ile kwot przeliczać w pomiarze convert_to_pln
+_CONVERT_SAMPLE = 10000
+
+
+def seed_bench_group(expenses, members=8, progress=None):
+    """
+    Tworzy w bazie grupę testową z podaną liczbą wydatków (do milionów) i zatwierdza ją. Wydatki i udziały są
+    generowane w bazie (INSERT ... SELECT generate_series), a salda i zestawienie wykresów są liczone
+    tymi samymi funkcjami, co w aplikacji, więc grupa jest spójna (bez rozbieżności sald).
+    Przeznaczone dla jednorazowej bazy testowej. Zwraca (group_id, user_id twórcy grupy).
+    """
+    tag = uuid.uuid4().hex[:8]
+    user_ids = sorted(db.session.execute(text(
+        "INSERT INTO users (username, email, password) "
+        "SELECT 'bench-' || :tag || '-' || i, 'bench-' || :tag || '-' || i || '@example.invalid', '-' "
+        "FROM generate_series(1, :members) i RETURNING id"
+    ), {'tag': tag, 'members': members}).scalars())
+
+    group = Group(name=f'bench-{expenses}-{tag}', created_by=user_ids[0])
+    db.session.add(group)
+    db.session.flush()
+    db.session.execute(text(
+        "INSERT INTO usergroups (user_id, group_id) SELECT unnest(CAST(:user_ids AS integer[])), :group_id"
+    ), {'user_ids': user_ids, 'group_id': group.id})
+
+    for currency_code, rate in _SEED_RATES.items():
+        if db.session.get(Currency, currency_code) is None:
+            db.session.add(Currency(currency_code=currency_code, exchange_rate=rate))
+    db.session.flush()
+
+    # Kwoty są wielokrotnością liczby uczestników, więc równe udziały sumują się dokładnie do kwoty
+    split = min(_SEED_SPLIT, members)
+    recorded_id = 0
+    for start in range(1, expenses + 1, _SEED_CHUNK):
+        end = min(start + _SEED_CHUNK - 1, expenses)
+        db.session.execute(text(
+            "WITH members AS (SELECT CAST(:user_ids AS integer[]) AS ids), "
+            "inserted AS ("
+            "  INSERT INTO expenses (group_id, description, amount, currency, created_by, created_at, category, "
+            "                        custom_split) "
+            "  SELECT :group_id, 'Bench expense ' || i, (:split * (25 + i * 37 % 2500)) / 100.0, "
+            "         (ARRAY['PLN', 'PLN', 'EUR', 'USD'])[1 + i % 4], ids[1 + i % :members], "
+            "         timestamp '2024-01-01' + (i % 730) * interval '1 day' + (i % 86400) * interval '1 second', "
+            "         (ARRAY['Food', 'Travel', 'Rent', 'Fun', 'Other'])[1 + i % 5], false "
+            "  FROM generate_series(:start, :end) i, members "
+            "  RETURNING id, amount, created_by"
+            ") "
+            "INSERT INTO expenseshares (expense_id, user_id, share, paid_by) "
+            "SELECT inserted.id, ids[1 + (array_position(ids, created_by) - 1 + j) % :members], "
+            "       amount / :split, created_by "
+            "FROM inserted, members, generate_series(0, :split - 1) j"
+        ), {'group_id': group.id, 'user_ids': user_ids, 'members': members, 'split': split,
+            'start': start, 'end': end})
+
+        recorded_id = _record_seeded_expenses(group, recorded_id)
+        if progress:
+            progress(end)
+
+    for index in range(min(expenses // 100, 100)):
+        settlement = Settlement(group_id=group.id, payer_id=user_ids[(index + 1) % members],
+                                receiver_id=user_ids[index % members], amount='10.00', currency='PLN')
+        db.session.add(settlement)
+        db.session.flush()
+        settlement_changed(settlement)
+
+    backfill_expense_rollups(group.id)
+    bump_group_version(group.id)
+    db.session.commit()
+
+    db.session.execute(text("ANALYZE"))
+    db.session.commit()
+    return group.id, user_ids[0]
+
+
+def _record_seeded_expenses(group, after_id):
+    """
+    Dopisuje do sald wydatki grupy o id większym niż after_id (record_expenses, jak przy imporcie),
+    czytając udziały kolumnowo, bez ładowania obiektów ORM. Zwraca największe id dopisanego wydatku.
+    """
+    rows = db.session.execute(
+        select(Expense.id, Expense.currency, ExpenseShare.user_id, ExpenseShare.share, ExpenseShare.paid_by)
+        .join(ExpenseShare, ExpenseShare.expense_id == Expense.id)
+        .where(Expense.group_id == group.id, Expense.id > after_id)
+        .order_by(Expense.id)
+    ).all()
+
+    expenses = {}
+    for expense_id, currency, user_id, share, paid_by in rows:
+        expenses.setdefault(expense_id, (currency, []))[1].append((user_id, share, paid_by))
+
+    record_expenses(group, list(expenses.values()))
+    return max(expenses, default=after_id)
+
+
+def _measure(fn, repeat):
+    """
+    Wykonuje fn repeat razy i zwraca czasy w sekundach (min, mediana, max). Przed każdym pomiarem sesja
+    jest czyszczona, żeby obiekty wczytane w poprzednim przebiegu nie skracały kolejnego.
+    """
+    timings = []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return {'min': min(timings), 'median': statistics.median(timings), 'max': max(timings)}
+
+
+def run_benchmarks(group_id, user_id, repeat=5, paths=BENCH_PATHS):
+    """
+    Mierzy najważniejsze ścieżki aplikacji dla grupy: saldo liczone od zera (calculate_balance razem
+    z wczytaniem grupy), dane wykresów grupy i użytkownika, przeliczanie kwot na PLN i całe żądanie strony grupy
+    (GET /group/<id> przez klienta testowego Flask). paths ogranicza pomiar do wybranych ścieżek z BENCH_PATHS.
+    Zwraca {nazwa: {min, median, max}}.
+    """
+    amounts = db.session.execute(
+        select(Expense.amount, Expense.currency)
+        .where(Expense.group_id == group_id)
+        .order_by(Expense.id)
+        .limit(_CONVERT_SAMPLE)
+    ).all()
+
+    client = current_app.test_client()
+    with client.session_transaction() as client_session:
+        client_session['user_id'] = user_id
+
+    def view_group():
+        # Własny kontekst aplikacji, jak przy prawdziwym żądaniu - inaczej flask.g i sesja bazy
+        # byłyby współdzielone z kontekstem komendy
+        with current_app.app_context():
+            response = client.get(f'/group/{group_id}')
+        if response.status_code != 200:
+            raise RuntimeError(f"GET /group/{group_id} returned {response.status_code}")
+
+    functions = {
+        'calculate_balance': lambda: calculate_balance(load_group(group_id)),
+        'group_charts': lambda: get_group_charts_data(db.session.get(Group, group_id)),
+        'user_charts': lambda: get_user_charts_data(db.session.get(Group, group_id), user_id),
+        'convert_to_pln': lambda: [convert_to_pln(amount, currency) for amount, currency in amounts],
+        'view_group': view_group,
+    }
+    return {name: _measure(functions[name], repeat) for name in BENCH_PATHS if name in paths}
+
+
+def run_settle_up_benchmark(group_id, repeat=5):
+    """
+    Mierzy plan spłat grupy tak, jak liczy go endpoint JSON: pozycje netto z tabeli groupbalances
+    (read_net_positions), wyznaczenie przelewów (simplify_debts) i obie części razem.
+    Zwraca {nazwa: {min, median, max}}.
+    """
+    positions = read_net_positions(group_id)
+    return {
+        'read_net_positions': _measure(lambda: read_net_positions(group_id), repeat),
+        'simplify_debts': _measure(lambda: simplify_debts(positions), repeat),
+        'settle_up': _measure(lambda: simplify_debts(read_net_positions(group_id)), repeat),
+    }
+
+
+def measure_export_memory(kind, group_id, export_format='csv', base_currency=None):
+    """
+    Przechodzi cały eksport (stream_export) bez zapisywania fragmentów i mierzy tracemalloc szczytowe
+    zużycie pamięci przez obiekty Pythona w czasie jego trwania. Zwraca (liczba linii, bajty, szczyt w bajtach,
+    czas w sekundach).
+    """
+    lines = 0
+    size = 0
+    tracemalloc.start()
+    try:
+        started = time.perf_counter()
+        for chunk in stream_export(kind, group_id, export_format, base_currency):
+            lines += chunk.count('\n')
+            size += len(chunk)
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return lines, size, peak, elapsed
+
+
+def count_group_shares(group_id):
+    return db.session.execute(
+        select(func.count()).select_from(ExpenseShare).join(Expense, Expense.id == ExpenseShare.expense_id)
+        .where(Expense.group_id == group_id)
+    ).scalar()
+
+
+def count_group_expenses(group_id):
+    return db.session.execute(select(func.count(Expense.id)).where(Expense.group_id == group_id)).scalar()
+
+
+def load_baselines(path):
+    """
+    Wczytuje plik z wynikami bazowymi: {liczba wydatków: {ścieżka: {min, median, max}}}. Brak pliku daje {}.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as baseline_file:
+        return json.load(baseline_file)
+
+
+def save_baseline(path, expenses, results):
+    """
+    Zapisuje wyniki jako wynik bazowy dla grupy o podanej liczbie wydatków, zachowując wyniki innych rozmiarów.
+    """
+    baselines = load_baselines(path)
+    baselines[str(expenses)] = results
+    with open(path, 'w', encoding='utf-8') as baseline_file:
+        json.dump(baselines, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write('\n')
+
+
+def find_regressions(results, baseline, threshold, noise_floor):
+    """
+    Porównuje mediany z wynikiem bazowym. Regresją jest mediana dłuższa od bazowej o więcej niż threshold
+    (ułamek, np. 0.25) i jednocześnie o więcej niż noise_floor sekund - różnice rzędu szumu pomiaru
+    na bardzo szybkich ścieżkach są pomijane. Zwraca listę (ścieżka, mediana bazowa, mediana).
+    """
+    regressions = []
+    for name, timings in results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]['median']
+        actual = timings['median']
+        if actual > expected * (1 + threshold) and actual - expected > noise_floor:
+            regressions.append((name, expected, actual))
+    return regressions
@@ -1,11 +1,14 @@
-from models import Settlement
-from decimal import Decimal, ROUND_HALF_UP
+from flask import current_app
+from decimal import Decimal
 from collections import defaultdict
+from money import from_cents, to_cents
+from vectorized_balance import calculate_balance_vectorized
 
 
 def calculate_balance(group):
     members = {member.id: member for member in group.members}
-    balance_sheet = defaultdict(lambda: defaultdict(lambda: defaultdict(Decimal)))
+    # Salda liczone w groszach (int) - bez zaokrągleń po drodze; na Decimal zamieniane dopiero na końcu
+    cents_sheet = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
 
     # Przetwarzanie wydatków
     for expense in group.expenses:
@@ -22,33 +25,41 @@ def calculate_balance(group):
 
         for share in expense.shares:
             member_user_id = int(share.user_id)
-            member_share_amount = Decimal(share.share).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            member_share_cents = to_cents(share.share)
 
             if member_user_id not in members:
                 print(f"Użytkownik o id {member_user_id} nie istnieje w grupie")
                 continue
 
             if member_user_id != payer_user_id:
-                balance_sheet[member_user_id][payer_user_id][currency] += member_share_amount
-                balance_sheet[payer_user_id][member_user_id][currency] -= member_share_amount
+                cents_sheet[member_user_id][payer_user_id][currency] += member_share_cents
+                cents_sheet[payer_user_id][member_user_id][currency] -= member_share_cents
 
     # Przetwarzanie rozliczeń
-    for settlement in Settlement.query.filter_by(group_id=group.id).all():
+    for settlement in group.settlements:
         payer_id = settlement.payer_id
         receiver_id = settlement.receiver_id
-        settlement_amount = Decimal(settlement.amount).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        settlement_cents = to_cents(settlement.amount)
         currency = settlement.currency
 
-        balance_sheet[payer_id][receiver_id][currency] -= settlement_amount
-        balance_sheet[receiver_id][payer_id][currency] += settlement_amount
+        cents_sheet[payer_id][receiver_id][currency] -= settlement_cents
+        cents_sheet[receiver_id][payer_id][currency] += settlement_cents
 
-    # Zaokrąglanie końcowych wyników
-    for user_id, balances in balance_sheet.items():
+    balance_sheet = defaultdict(lambda: defaultdict(lambda: defaultdict(Decimal)))
+    for user_id, balances in cents_sheet.items():
         for other_user_id, currencies in balances.items():
-            for currency, amount in currencies.items():
-                balance_sheet[user_id][other_user_id][currency] = amount.quantize(Decimal('0.01'),
-                                                                                  rounding=ROUND_HALF_UP)
+            for currency, cents in currencies.items():
+                balance_sheet[user_id][other_user_id][currency] = from_cents(cents)
 
     return balance_sheet
 
 
+def compute_balance(group):
+    """
+    Wylicza saldo grupy silnikiem wybranym w konfiguracji: BALANCE_ENGINE = 'decimal' (calculate_balance)
+    albo 'numpy' (calculate_balance_vectorized). Oba zwracają saldo w tym samym formacie.
+    """
+    if current_app.config.get('BALANCE_ENGINE', 'decimal') == 'numpy':
+        return calculate_balance_vectorized(group)
+
+    return calculate_balance(group)
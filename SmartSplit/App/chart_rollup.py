@@ -0,0 +1,126 @@
+from collections import defaultdict
+from sqlalchemy import Date, cast, func, literal, select, union_all
+from sqlalchemy.dialects.postgresql import insert
+from models import db, Expense, ExpenseShare, ExpenseRollup
+from money import from_cents, to_cents
+
+
+def _month_of(created_at):
+    return created_at.date().replace(day=1)
+
+
+def _add_rollup_deltas(deltas, expense, shares, sign):
+    key = (_month_of(expense.created_at), expense.category or '', expense.currency)
+
+    if expense.created_by:
+        deltas[(int(expense.created_by),) + key][0] += to_cents(expense.amount) * sign
+    for user_id, share, _ in shares:
+        deltas[(int(user_id),) + key][1] += to_cents(share) * sign
+
+
+def _apply_rollup_deltas(group_id, deltas):
+    rows = [
+        {
+            'group_id': group_id,
+            'user_id': user_id,
+            'month': month,
+            'category': category,
+            'currency': currency,
+            'spent': from_cents(spent),
+            'share': from_cents(share),
+        }
+        for (user_id, month, category, currency), (spent, share) in sorted(deltas.items())
+        if spent or share
+    ]
+
+    if not rows:
+        return
+
+    stmt = insert(ExpenseRollup).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ExpenseRollup.group_id, ExpenseRollup.user_id, ExpenseRollup.month,
+                        ExpenseRollup.category, ExpenseRollup.currency],
+        set_={
+            'spent': ExpenseRollup.spent + stmt.excluded.spent,
+            'share': ExpenseRollup.share + stmt.excluded.share,
+        }
+    )
+    db.session.execute(stmt)
+
+
+def record_expense_rollup(expense, shares, sign=1):
+    """
+    Aktualizuje miesięczne zestawienie wydatków (expenserollups) o wydatek (sign=1) lub wycofuje go (sign=-1).
+    Kwota całego wydatku trafia do wiersza jego autora (kolumna spent), a udziały do wierszy członków (kolumna share).
+    shares to lista krotek (user_id, share, paid_by), jak w balance_ledger.record_expense.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    _add_rollup_deltas(deltas, expense, shares, sign)
+    _apply_rollup_deltas(expense.group_id, deltas)
+
+    if sign < 0:
+        # Wiersze wyzerowane przez wycofanie wydatku usuwamy, żeby wykresy nie pokazywały pustych miesięcy.
+        ExpenseRollup.query.filter(
+            ExpenseRollup.group_id == expense.group_id,
+            ExpenseRollup.month == _month_of(expense.created_at),
+            ExpenseRollup.category == (expense.category or ''),
+            ExpenseRollup.currency == expense.currency,
+            ExpenseRollup.spent == 0,
+            ExpenseRollup.share == 0,
+        ).delete(synchronize_session=False)
+
+
+def record_expense_rollups(group_id, expenses):
+    """
+    Wersja record_expense_rollup dla wielu wydatków jednej grupy naraz: expenses to lista par (expense, shares),
+    gdzie expense to dowolny obiekt z polami created_at, category, currency, amount i created_by.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for expense, shares in expenses:
+        _add_rollup_deltas(deltas, expense, shares, 1)
+    _apply_rollup_deltas(group_id, deltas)
+
+
+def backfill_expense_rollups(group_id=None):
+    """
+    Odbudowuje zestawienie expenserollups od zera (dla jednej grupy lub wszystkich) jednym poleceniem
+    INSERT ... SELECT agregującym wydatki i udziały w bazie danych.
+    """
+    month = cast(func.date_trunc('month', Expense.created_at), Date)
+    category = func.coalesce(Expense.category, '')
+
+    spent = (
+        select(Expense.group_id, Expense.created_by.label('user_id'), month.label('month'),
+               category.label('category'), Expense.currency,
+               Expense.amount.label('spent'), literal(0).label('share'))
+        .where(Expense.created_by.isnot(None))
+    )
+    shares = (
+        select(Expense.group_id, ExpenseShare.user_id, month.label('month'),
+               category.label('category'), Expense.currency,
+               literal(0).label('spent'), ExpenseShare.share.label('share'))
+        .join(ExpenseShare, ExpenseShare.expense_id == Expense.id)
+    )
+
+    delete = ExpenseRollup.query
+    if group_id is not None:
+        spent = spent.where(Expense.group_id == group_id)
+        shares = shares.where(Expense.group_id == group_id)
+        delete = delete.filter(ExpenseRollup.group_id == group_id)
+
+    delete.delete(synchronize_session=False)
+
+    history = union_all(spent, shares).subquery()
+    aggregated = (
+        select(history.c.group_id, history.c.user_id, history.c.month, history.c.category, history.c.currency,
+               func.sum(history.c.spent), func.sum(history.c.share))
+        .group_by(history.c.group_id, history.c.user_id, history.c.month, history.c.category, history.c.currency)
+    )
+
+    result = db.session.execute(
+        insert(ExpenseRollup).from_select(
+            ['group_id', 'user_id', 'month', 'category', 'currency', 'spent', 'share'],
+            aggregated
+        )
+    )
+    return result.rowcount
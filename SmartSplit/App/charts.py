@@ -1,101 +1,214 @@
-from datetime import datetime
-from models import Expense, ExpenseShare, db
-from sqlalchemy import func
+import calendar
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+from flask import current_app
+from models import Expense, ExpenseShare, ExpenseRollup, Currency, CurrencyRate, Group, db
+from sqlalchemy import Date, and_, case, cast, func, literal, select
+from exchange_rate import get_exchange_rates_as_of
 
 
-def get_group_charts_data(group):
-    monthly_expenses_group = (
-        db.session.query(
-            func.to_char(Expense.created_at, 'YYYY-MM').label('month'),
-            func.sum(Expense.amount).label('total')
-        )
-        .filter(
-            Expense.group_id == group.id,
-            Expense.currency == 'PLN'
-        )
-        .group_by(func.to_char(Expense.created_at, 'YYYY-MM'))
-        .order_by(func.to_char(Expense.created_at, 'YYYY-MM'))
-        .all()
+def _rate_to_pln(currency_code, day):
+    """
+    Wyrażenie SQL zwracające kurs waluty względem PLN obowiązujący w danym dniu: ostatni kurs z historii
+    nie późniejszy niż ten dzień, a gdy historia nie sięga tak daleko - bieżący kurs z tabeli currencies.
+    """
+    historical_rate = (
+        select(CurrencyRate.exchange_rate)
+        .where(CurrencyRate.currency_code == currency_code, CurrencyRate.rate_date <= day)
+        .order_by(CurrencyRate.rate_date.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    current_rate = (
+        select(Currency.exchange_rate)
+        .where(Currency.currency_code == currency_code)
+        .scalar_subquery()
     )
+    return case((currency_code == 'PLN', literal(1)), else_=func.coalesce(historical_rate, current_rate))
+
 
-    monthly_data_group = {
-        "labels": [row[0] for row in monthly_expenses_group],
-        "values": [row[1] for row in monthly_expenses_group],
+def _quantize(value):
+    return Decimal(value).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def _build_charts_data(monthly_group, monthly_user, categories_group, categories_user):
+    monthly_group.sort()
+    monthly_user.sort()
+    categories_group.sort(key=lambda item: item[1], reverse=True)
+    categories_user.sort(key=lambda item: item[1], reverse=True)
+
+    def series(items):
+        return {
+            "labels": [label for label, _ in items],
+            "values": [value for _, value in items],
+        }
+
+    group_data = {
+        "monthly": series(monthly_group),
+        "categories": series(categories_group),
+    }
+    user_data = {
+        "monthly": series(monthly_user),
+        "categories": series(categories_user),
     }
 
-    start_of_this_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return group_data, user_data
 
-    category_expenses_group = (
+
+def get_charts_data_from_expenses(group, user_id, base_currency='PLN'):
+    """
+    Zwraca dane wykresów grupy i użytkownika (miesięczne sumy oraz podział na kategorie w bieżącym miesiącu)
+    jednym zapytaniem z GROUPING SETS po surowych wydatkach. Kwoty we wszystkich walutach są przeliczane
+    w bazie danych na walutę base_currency po kursach z dnia dodania wydatku.
+    """
+    day = cast(Expense.created_at, Date)
+    factor = _rate_to_pln(Expense.currency, day) / _rate_to_pln(literal(base_currency), day)
+
+    month = func.to_char(Expense.created_at, 'YYYY-MM')
+    is_this_month = func.date_trunc('month', Expense.created_at) == func.date_trunc('month', func.now())
+
+    group_amount = Expense.amount * factor
+    user_amount = ExpenseShare.share * factor
+
+    rows = (
         db.session.query(
+            func.grouping(month).label('by_category'),
+            month.label('month'),
             Expense.category,
-            func.sum(Expense.amount).label('total')
-        )
-        .filter(
-            Expense.group_id == group.id,
-            Expense.currency == 'PLN',
-            Expense.created_at >= start_of_this_month,
+            func.sum(group_amount).label('group_total'),
+            func.sum(user_amount).label('user_total'),
+            func.sum(group_amount).filter(is_this_month).label('group_this_month'),
+            func.sum(user_amount).filter(is_this_month).label('user_this_month'),
         )
-        .group_by(Expense.category)
-        .order_by(func.sum(Expense.amount).desc())
+        .outerjoin(ExpenseShare, and_(ExpenseShare.expense_id == Expense.id, ExpenseShare.user_id == user_id))
+        .filter(Expense.group_id == group.id)
+        .group_by(func.grouping_sets(month, Expense.category))
         .all()
     )
 
-    category_data_group = {
-        "labels": [row[0] for row in category_expenses_group],
-        "values": [row[1] for row in category_expenses_group],
-    }
+    monthly_group, monthly_user, categories_group, categories_user = [], [], [], []
+    for row in rows:
+        if not row.by_category:
+            if row.group_total is not None:
+                monthly_group.append((row.month, _quantize(row.group_total)))
+            if row.user_total is not None:
+                monthly_user.append((row.month, _quantize(row.user_total)))
+        else:
+            if row.group_this_month is not None:
+                categories_group.append((row.category, _quantize(row.group_this_month)))
+            if row.user_this_month is not None:
+                categories_user.append((row.category, _quantize(row.user_this_month)))
 
-    return {
-        "monthly": monthly_data_group,
-        "categories": category_data_group,
-    }
+    return _build_charts_data(monthly_group, monthly_user, categories_group, categories_user)
+
+
+def _rate_day(month, today):
+    """
+    Dzień, z którego kursu przeliczane są kwoty całego miesiąca: ostatni dzień miesiąca, a dla bieżącego - dziś.
+    """
+    last_day = month.replace(day=calendar.monthrange(month.year, month.month)[1])
+    return min(last_day, today)
 
 
-def get_user_charts_data(group, user_id):
-    monthly_expenses = (
+def get_charts_data_from_rollup(group, user_id, base_currency='PLN'):
+    """
+    Zwraca te same dane wykresów co get_charts_data_from_expenses, ale czyta je z zestawienia expenserollups,
+    więc koszt zależy od liczby miesięcy i kategorii, a nie od liczby wydatków.
+    Kwoty są przeliczane na base_currency po kursie z końca miesiąca (dla bieżącego miesiąca - z dzisiaj).
+    """
+    rows = (
         db.session.query(
-            func.to_char(Expense.created_at, 'YYYY-MM').label('month'),
-            func.sum(ExpenseShare.share).label('total')
+            ExpenseRollup.month,
+            ExpenseRollup.category,
+            ExpenseRollup.currency,
+            func.sum(ExpenseRollup.spent),
+            func.sum(ExpenseRollup.share).filter(ExpenseRollup.user_id == user_id),
         )
-        .join(Expense, Expense.id == ExpenseShare.expense_id)
-        .filter(
-            Expense.group_id == group.id,
-            Expense.currency == 'PLN',
-            ExpenseShare.user_id == user_id
-        )
-        .group_by(func.to_char(Expense.created_at, 'YYYY-MM'))
-        .order_by(func.to_char(Expense.created_at, 'YYYY-MM'))
+        .filter(ExpenseRollup.group_id == group.id)
+        .group_by(ExpenseRollup.month, ExpenseRollup.category, ExpenseRollup.currency)
         .all()
     )
 
-    monthly_data = {
-        "labels": [row[0] for row in monthly_expenses],
-        "values": [row[1] for row in monthly_expenses],
-    }
+    today = date.today()
+    this_month = today.replace(day=1)
 
-    category_expenses = (
-        db.session.query(
-            Expense.category,
-            func.sum(ExpenseShare.share).label('total')
-        )
-        .join(Expense, Expense.id == ExpenseShare.expense_id)
-        .filter(
-            Expense.group_id == group.id,
-            Expense.currency == 'PLN',
-            ExpenseShare.user_id == user_id,
-            func.date_trunc('month', Expense.created_at) == func.date_trunc('month', func.now())
-        )
-        .group_by(Expense.category)
-        .order_by(func.sum(ExpenseShare.share).desc())
-        .all()
+    rate_pairs = set()
+    for month, _, currency, _, _ in rows:
+        rate_pairs.add((currency, _rate_day(month, today)))
+        rate_pairs.add((base_currency, _rate_day(month, today)))
+    # Jak w get_charts_data_from_expenses: kwoty w walutach bez kursu w bazie są pomijane
+    rates = get_exchange_rates_as_of(rate_pairs, fetch_missing=False)
+    rates.update({('PLN', _rate_day(month, today)): 1 for month, _, _, _, _ in rows})
+
+    def convert(amount, currency, month):
+        day = _rate_day(month, today)
+        return amount * rates[(currency, day)] / rates[(base_currency, day)]
+
+    monthly_group, monthly_user = defaultdict(Decimal), {}
+    categories_group, categories_user = defaultdict(Decimal), {}
+    for month, category, currency, spent, share in rows:
+        day = _rate_day(month, today)
+        if (currency, day) not in rates or (base_currency, day) not in rates:
+            continue
+        label = month.strftime('%Y-%m')
+        category = category or None
+
+        monthly_group[label] += convert(spent, currency, month)
+        if month == this_month:
+            categories_group[category] += convert(spent, currency, month)
+
+        if share is not None:
+            monthly_user[label] = monthly_user.get(label, Decimal(0)) + convert(share, currency, month)
+            if month == this_month:
+                categories_user[category] = categories_user.get(category, Decimal(0)) + convert(share, currency, month)
+
+    def items(totals):
+        return [(label, _quantize(total)) for label, total in totals.items()]
+
+    return _build_charts_data(items(monthly_group), items(monthly_user),
+                              items(categories_group), items(categories_user))
+
+
+def get_charts_data_for_group_and_user(group, user_id, base_currency='PLN'):
+    """
+    Zwraca dane wykresów grupy i użytkownika ze źródła wskazanego w konfiguracji:
+    CHARTS_SOURCE = 'rollup' (zestawienie expenserollups) albo 'expenses' (surowe wydatki).
+    """
+    if current_app.config.get('CHARTS_SOURCE', 'rollup') == 'expenses':
+        return get_charts_data_from_expenses(group, user_id, base_currency)
+
+    return get_charts_data_from_rollup(group, user_id, base_currency)
+
+
+def get_charts_etag(group_id, user_id, base_currency='PLN'):
+    """
+    Zwraca ETag danych wykresów. Zmienia się po każdej zmianie wydatków lub spłat grupy (groups.data_version),
+    po odświeżeniu kursów walut i o północy (wykresy bieżącego miesiąca i przeliczenia zależą od dzisiejszej daty).
+    Zwraca None, gdy grupa nie istnieje.
+    """
+    rates_updated = select(func.max(Currency.last_updated)).scalar_subquery()
+    row = (
+        db.session.query(Group.data_version, rates_updated)
+        .filter(Group.id == group_id)
+        .one_or_none()
     )
+    if row is None:
+        return None
 
-    category_data = {
-        "labels": [row[0] for row in category_expenses],
-        "values": [row[1] for row in category_expenses],
-    }
+    data_version, rates_updated = row
+    rates_stamp = rates_updated.strftime('%Y%m%d%H%M%S') if rates_updated else '0'
+    source = current_app.config.get('CHARTS_SOURCE', 'rollup')
 
-    return {
-        "monthly": monthly_data,
-        "categories": category_data,
-    }
+    return (f"{group_id}-{data_version}-{user_id}-{base_currency}-{source}-"
+            f"{rates_stamp}-{date.today().strftime('%Y%m%d')}")
+
+
+def get_group_charts_data(group, base_currency='PLN'):
+    group_data, _ = get_charts_data_for_group_and_user(group, None, base_currency)
+    return group_data
+
+
+def get_user_charts_data(group, user_id, base_currency='PLN'):
+    _, user_data = get_charts_data_for_group_and_user(group, user_id, base_currency)
+    return user_data
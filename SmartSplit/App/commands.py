@@ -0,0 +1,541 @@
+import sys
+import time
+import os
+import click
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP
+from sqlalchemy import func, text
+from flask import current_app
+from flask.cli import with_appcontext
+from models import db, User, Group, Expense, ExpenseShare, UserGroup, Friends
+from charts import get_charts_data_from_expenses, get_charts_data_from_rollup
+from group_snapshot import load_group
+from balance_ledger import find_balance_drift, rebuild_balance
+from chart_rollup import backfill_expense_rollups
+from exchange_rate import update_currency_rates
+from rate_providers import FileRateProvider
+from email_outbox import SmtpConnection, send_pending_emails, get_email_outbox_stats
+from schema_migrations import apply_migrations
+from query_plans import check_query_plans
+from money import Money, to_cents, from_cents
+from ledger_export import EXPORT_KINDS, EXPORT_FORMATS
+from splits import split_expense, write_shares
+from friend_suggestions import get_friend_suggestions
+from expense_import import IMPORT_FORMATS, parse_import, validate_import, import_expenses
+from benchmarks import BENCH_SIZES, BENCH_PATHS, seed_bench_group, run_benchmarks, count_group_expenses, load_baselines, \
+    save_baseline, find_regressions, run_settle_up_benchmark, count_group_shares, measure_export_memory
+
+
+@click.command('rebuild-balances')
+@click.option('--group-id', type=int, default=None, help='Przelicz tylko wskazaną grupę.')
+@click.option('--verify-only', is_flag=True, help='Tylko raportuj rozbieżności, bez zapisywania zmian.')
+@with_appcontext
+def rebuild_balances_command(group_id, verify_only):
+    """
+    Przelicza salda grup od zera (silnikiem BALANCE_ENGINE), raportuje rozbieżności względem tabeli groupbalances i (domyślnie) je naprawia.
+    """
+    if group_id is not None:
+        group_ids = [group_id]
+    else:
+        group_ids = [row.id for row in db.session.query(Group.id).order_by(Group.id).all()]
+
+    drift_found = False
+    for current_group_id in group_ids:
+        group = load_group(current_group_id)
+        if not group:
+            click.echo(f"Group {current_group_id} not found.")
+            continue
+
+        drift = find_balance_drift(group)
+        for debtor_id, creditor_id, currency, expected, actual in drift:
+            click.echo(f"Group {group.id}: {debtor_id} -> {creditor_id} {currency} "
+                       f"expected {expected}, ledger has {actual}")
+
+        if drift:
+            drift_found = True
+            if not verify_only:
+                rebuild_balance(group)
+                db.session.commit()
+                click.echo(f"Group {group.id}: ledger rebuilt.")
+
+        db.session.expunge_all()
+
+    if not drift_found:
+        click.echo("No drift found.")
+    elif verify_only:
+        sys.exit(1)
+
+
+@click.command('refresh-rates')
+@click.option('--file', 'rates_file', type=click.Path(exists=True, dir_okay=False), default=None,
+              help='Wczytaj kursy z pliku JSON (format Fixer) zamiast z dostawcy z konfiguracji.')
+@click.option('--repeat', type=int, default=1, help='Ile razy powtórzyć odświeżenie (pomiar czasu).')
+@with_appcontext
+def refresh_rates_command(rates_file, repeat):
+    """
+    Odświeża kursy walut i wypisuje czas każdego odświeżenia.
+    """
+    provider = FileRateProvider(rates_file) if rates_file else None
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        if not update_currency_rates(provider):
+            sys.exit(1)
+        timings.append(time.perf_counter() - started)
+
+    click.echo(f"Refreshed rates {repeat} time(s): "
+               f"min {min(timings) * 1000:.1f} ms, avg {sum(timings) / len(timings) * 1000:.1f} ms, "
+               f"max {max(timings) * 1000:.1f} ms")
+
+
+@click.command('backfill-rollups')
+@click.option('--group-id', type=int, default=None, help='Odbuduj zestawienie tylko dla wskazanej grupy.')
+@with_appcontext
+def backfill_rollups_command(group_id):
+    """
+    Odbudowuje od zera miesięczne zestawienie wydatków używane przez wykresy (expenserollups).
+    """
+    started = time.perf_counter()
+    rows = backfill_expense_rollups(group_id)
+    db.session.commit()
+    click.echo(f"Rebuilt {rows} rollup rows in {(time.perf_counter() - started) * 1000:.1f} ms.")
+
+
+def _report_timings(name, timings):
+    click.echo(f"{name}: min {min(timings) * 1000:.1f} ms, avg {sum(timings) / len(timings) * 1000:.1f} ms, "
+               f"max {max(timings) * 1000:.1f} ms")
+
+
+@click.command('bench-charts')
+@click.option('--group-id', type=int, required=True, help='Grupa, dla której liczone są wykresy.')
+@click.option('--user-id', type=int, default=None, help='Użytkownik, dla którego liczone są wykresy osobiste.')
+@click.option('--repeat', type=int, default=5, help='Ile razy powtórzyć pomiar każdego źródła.')
+@with_appcontext
+def bench_charts_command(group_id, user_id, repeat):
+    """
+    Porównuje czas wyliczania danych wykresów z surowych wydatków i z zestawienia expenserollups.
+    """
+    group = db.session.get(Group, group_id)
+    if not group:
+        click.echo(f"Group {group_id} not found.")
+        sys.exit(1)
+
+    for name, charts_data in (('expenses', get_charts_data_from_expenses), ('rollup', get_charts_data_from_rollup)):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            charts_data(group, user_id)
+            timings.append(time.perf_counter() - started)
+
+        _report_timings(name, timings)
+
+
+@click.command('bench-splits')
+@click.option('--members', type=int, default=500, help='Między ilu członków dzielić każdy wydatek.')
+@click.option('--repeat', type=int, default=20, help='Ile wydatków podzielić i zapisać w każdym pomiarze.')
+@with_appcontext
+def bench_splits_command(members, repeat):
+    """
+    Mierzy czas podziału wydatku między wielu członków każdą strategią oraz zapisu udziałów: osobnymi obiektami
+    ExpenseShare i jednym poleceniem INSERT (splits.write_shares). Dane testowe są tworzone w transakcji,
+    która na końcu jest wycofywana.
+    """
+    try:
+        users = [User(username=f'bench-{index}', email=f'bench-{index}@example.invalid', password='-')
+                 for index in range(members)]
+        db.session.add_all(users)
+        db.session.flush()
+        group = Group(name='bench-splits', created_by=users[0].id)
+        db.session.add(group)
+        db.session.flush()
+        db.session.add_all(UserGroup(user_id=user.id, group_id=group.id) for user in users)
+        db.session.flush()
+
+        user_ids = [user.id for user in users]
+        amount = Money.parse('1234.57')
+        # Procenty z dwoma miejscami po przecinku, sumujące się do 100
+        percentages = [percentage.amount for percentage in Money(100 * 100).allocate([1] * members)]
+        strategies = (
+            ('equal', user_ids),
+            ('percentage', dict(zip(user_ids, percentages))),
+            ('weights', {user_id: index % 4 + 1 for index, user_id in enumerate(user_ids)}),
+            ('itemized', [(Money.parse('100.00').amount, user_ids[index::7]) for index in range(7)]),
+        )
+        for split_type, values in strategies:
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                split_expense(split_type, amount, values)
+                timings.append(time.perf_counter() - started)
+            _report_timings(f"split {split_type} ({members} members)", timings)
+
+        shares = split_expense('equal', amount, user_ids)
+
+        def new_expense():
+            expense = Expense(group_id=group.id, description='bench', money=amount, created_by=users[0].id)
+            db.session.add(expense)
+            db.session.flush()
+            return expense
+
+        def write_per_row(expense):
+            for user_id, share in shares.items():
+                db.session.add(ExpenseShare(expense_id=expense.id, user_id=user_id, share=share.amount,
+                                            paid_by=users[0].id))
+            db.session.flush()
+
+        for name, write in (('write per row', write_per_row),
+                            ('write bulk', lambda expense: write_shares(expense.id, shares, users[0].id))):
+            timings = []
+            for _ in range(repeat):
+                expense = new_expense()
+                started = time.perf_counter()
+                write(expense)
+                timings.append(time.perf_counter() - started)
+            _report_timings(f"{name} ({members} shares)", timings)
+    finally:
+        db.session.rollback()
+
+
+@click.command('bench-money')
+@click.option('--amounts', type=int, default=100000, help='Ile kwot przetworzyć w każdym pomiarze.')
+@click.option('--members', type=int, default=7, help='Na ile części dzielić każdą kwotę.')
+@click.option('--repeat', type=int, default=5, help='Ile razy powtórzyć pomiar każdej ścieżki.')
+def bench_money_command(amounts, members, repeat):
+    """
+    Porównuje ścieżki kwot na Decimal (zaokrąglanie quantize przy każdej operacji) z liczeniem w całkowitych
+    groszach (money.to_cents, Money): parsowanie kwot z formularza, odczyt kwot z bazy (Decimal), sumowanie
+    udziałów, podział kwoty między członków i przeliczanie po kursie. Nie korzysta z bazy.
+    """
+    cent = Decimal('0.01')
+    rate = Decimal('4.312500')
+    values = [f"{index * 7919 % 1000000 / 100:.2f}" for index in range(amounts)]
+    decimals = [Decimal(value) for value in values]
+    moneys = [Money.parse(value) for value in values]
+
+    def split_decimal(amount):
+        share = (amount / members).quantize(cent, rounding=ROUND_DOWN)
+        # Resztę po zaokrągleniu dostaje pierwszy członek
+        return [amount - share * (members - 1)] + [share] * (members - 1)
+
+    paths = (
+        ('parse decimal', lambda: [Decimal(value).quantize(cent, rounding=ROUND_HALF_UP) for value in values]),
+        ('parse cents', lambda: [to_cents(value) for value in values]),
+        ('read decimal', lambda: [amount.quantize(cent, rounding=ROUND_HALF_UP) for amount in decimals]),
+        ('read cents', lambda: [to_cents(amount) for amount in decimals]),
+        ('sum decimal', lambda: sum(decimals, Decimal('0.00'))),
+        ('sum cents', lambda: from_cents(sum(money.cents for money in moneys))),
+        ('split decimal', lambda: [split_decimal(amount) for amount in decimals]),
+        ('split cents', lambda: [money.allocate([1] * members) for money in moneys]),
+        ('convert decimal', lambda: [(amount * rate).quantize(cent, rounding=ROUND_HALF_UP) for amount in decimals]),
+        ('convert cents', lambda: [money.convert(rate, 'EUR') for money in moneys]),
+    )
+    for name, path in paths:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            path()
+            timings.append(time.perf_counter() - started)
+        _report_timings(f"{name} ({amounts} amounts)", timings)
+
+
+@click.command('bench-suggestions')
+@click.option('--users', type=int, default=50000, help='Liczba użytkowników w syntetycznym grafie znajomości.')
+@click.option('--degree', type=int, default=10, help='Ile znajomości zakłada każdy użytkownik (krawędzie są zapisywane w obie strony).')
+@click.option('--repeat', type=int, default=50, help='Dla ilu losowych użytkowników policzyć sugestie.')
+@with_appcontext
+def bench_suggestions_command(users, degree, repeat):
+    """
+    Mierzy czas wyliczania sugestii znajomych na syntetycznym grafie (domyślnie 50 000 użytkowników
+    i ok. 1 mln krawędzi). Znajomi są losowani z sąsiedztwa użytkownika, żeby graf miał wspólnych znajomych.
+    Graf jest tworzony w transakcji, która na końcu jest wycofywana.
+    """
+    try:
+        # Identyfikatory z jednego polecenia INSERT tworzą ciągły zakres (first_id, first_id + users - 1)
+        first_id = db.session.execute(text(
+            "WITH inserted AS ("
+            "  INSERT INTO users (username, email, password) "
+            "  SELECT 'bench-friend-' || i, 'bench-friend-' || i || '@example.invalid', '-' "
+            "  FROM generate_series(1, :users) i RETURNING id"
+            ") SELECT min(id) FROM inserted"
+        ), {'users': users}).scalar()
+
+        db.session.execute(text(
+            "INSERT INTO friends (user_id, friend_id) "
+            "SELECT x, y FROM ("
+            "  SELECT :first + i AS a, :first + (i + 1 + floor(random() * 500)::int) % :users AS b "
+            "  FROM generate_series(0, :users - 1) i, generate_series(1, :degree)"
+            ") edges, LATERAL (VALUES (a, b), (b, a)) v(x, y) "
+            "ON CONFLICT ON CONSTRAINT unique_friendship DO NOTHING"
+        ), {'first': first_id, 'users': users, 'degree': degree})
+        db.session.execute(text("ANALYZE friends"))
+
+        edges = db.session.query(func.count(Friends.id)).filter(Friends.user_id >= first_id).scalar()
+        click.echo(f"Synthetic graph: {users} users, {edges} edges.")
+
+        timings = []
+        suggestions = 0
+        for index in range(repeat):
+            user_id = first_id + index * 7919 % users
+            started = time.perf_counter()
+            suggestions += len(get_friend_suggestions(user_id))
+            timings.append(time.perf_counter() - started)
+
+        _report_timings(f"suggestions ({suggestions / repeat:.1f} per user)", timings)
+    finally:
+        db.session.rollback()
+
+
+@click.command('seed-bench')
+@click.option('--expenses', type=int, default=1000, help=f"Liczba wydatków w grupie (typowe rozmiary: {', '.join(map(str, BENCH_SIZES))}).")
+@click.option('--members', type=int, default=8, help='Liczba członków grupy.')
+@with_appcontext
+def seed_bench_command(expenses, members):
+    """
+    Tworzy grupę testową o podanej liczbie wydatków do pomiarów komendą bench. Tylko dla jednorazowej bazy testowej.
+    """
+    started = time.perf_counter()
+    group_id, user_id = seed_bench_group(
+        expenses, members, progress=lambda done: click.echo(f"{done}/{expenses} expenses...")
+    )
+    click.echo(f"Created group {group_id} (user {user_id}) with {expenses} expenses "
+               f"in {time.perf_counter() - started:.1f} s.")
+
+
+@click.command('bench')
+@click.option('--group-id', type=int, required=True, help='Grupa testowa (np. utworzona komendą seed-bench).')
+@click.option('--user-id', type=int, default=None, help='Użytkownik, w imieniu którego są wykonywane pomiary (domyślnie twórca grupy).')
+@click.option('--repeat', type=int, default=5, help='Ile razy zmierzyć każdą ścieżkę.')
+@click.option('--baseline', 'baseline_file', default=None, help='Plik z wynikami bazowymi (domyślnie BENCH_BASELINE_FILE).')
+@click.option('--save-baseline', 'save', is_flag=True, help='Zapisz wyniki jako bazowe zamiast porównywać.')
+@click.option('--threshold', type=float, default=None, help='Dopuszczalny wzrost mediany (domyślnie BENCH_REGRESSION_THRESHOLD).')
+@click.option('--path', 'paths', type=click.Choice(BENCH_PATHS), multiple=True, help='Mierz tylko wybrane ścieżki (można podać kilka razy).')
+@with_appcontext
+def bench_command(group_id, user_id, repeat, baseline_file, save, threshold, paths):
+    """
+    Mierzy saldo, wykresy, przeliczanie walut i stronę grupy, porównując mediany z wynikami bazowymi
+    dla grupy o tej samej liczbie wydatków. Kończy się kodem 1, jeśli któraś ścieżka zwolniła
+    o więcej niż próg.
+    """
+    group = db.session.get(Group, group_id)
+    if not group:
+        click.echo(f"Group {group_id} not found.")
+        sys.exit(1)
+
+    user_id = user_id or group.created_by
+    baseline_file = baseline_file or current_app.config['BENCH_BASELINE_FILE']
+    if threshold is None:
+        threshold = current_app.config['BENCH_REGRESSION_THRESHOLD']
+
+    expenses = count_group_expenses(group_id)
+    results = run_benchmarks(group_id, user_id, repeat, paths or BENCH_PATHS)
+    baseline = load_baselines(baseline_file).get(str(expenses), {})
+
+    click.echo(f"Group {group_id}, {expenses} expenses, {repeat} runs:")
+    for name, timings in results.items():
+        line = (f"  {name}: min {timings['min'] * 1000:.1f} ms, median {timings['median'] * 1000:.1f} ms, "
+                f"max {timings['max'] * 1000:.1f} ms")
+        if name in baseline:
+            line += f" (baseline {baseline[name]['median'] * 1000:.1f} ms)"
+        click.echo(line)
+
+    if save:
+        save_baseline(baseline_file, expenses, {**baseline, **results})
+        click.echo(f"Saved baseline for {expenses} expenses to {baseline_file}.")
+        return
+
+    if not baseline:
+        click.echo(f"No baseline for {expenses} expenses in {baseline_file}; run with --save-baseline first.")
+        return
+
+    regressions = find_regressions(results, baseline, threshold, current_app.config['BENCH_NOISE_FLOOR'])
+    for name, expected, actual in regressions:
+        click.echo(f"Regression in {name}: median {actual * 1000:.1f} ms vs baseline {expected * 1000:.1f} ms "
+                   f"(+{(actual / expected - 1) * 100:.0f}%, threshold {threshold * 100:.0f}%).")
+    if regressions:
+        sys.exit(1)
+    click.echo("No regressions.")
+
+
+@click.command('bench-settle-up')
+@click.option('--group-id', type=int, required=True, help='Grupa testowa (np. seed-bench --expenses 250000 --members 1000, czyli 1 mln udziałów).')
+@click.option('--repeat', type=int, default=5, help='Ile razy zmierzyć każdą ścieżkę.')
+@click.option('--limit', type=float, default=None, help='Dopuszczalna mediana planu spłat w sekundach (domyślnie SETTLE_UP_TIME_LIMIT).')
+@with_appcontext
+def bench_settle_up_command(group_id, repeat, limit):
+    """
+    Mierzy wyznaczanie sugerowanych spłat grupy (pozycje netto z groupbalances i simplify_debts).
+    Kończy się kodem 1, jeśli mediana całego planu przekracza limit.
+    """
+    group = db.session.get(Group, group_id)
+    if not group:
+        click.echo(f"Group {group_id} not found.")
+        sys.exit(1)
+
+    if limit is None:
+        limit = current_app.config['SETTLE_UP_TIME_LIMIT']
+
+    members = db.session.query(func.count(UserGroup.user_id)).filter(UserGroup.group_id == group_id).scalar()
+    results = run_settle_up_benchmark(group_id, repeat)
+
+    click.echo(f"Group {group_id}, {members} members, {count_group_shares(group_id)} shares, {repeat} runs:")
+    for name, timings in results.items():
+        click.echo(f"  {name}: min {timings['min'] * 1000:.1f} ms, median {timings['median'] * 1000:.1f} ms, "
+                   f"max {timings['max'] * 1000:.1f} ms")
+
+    median = results['settle_up']['median']
+    if median > limit:
+        click.echo(f"Settle-up plan took {median * 1000:.1f} ms, over the limit of {limit * 1000:.0f} ms.")
+        sys.exit(1)
+    click.echo(f"Within the limit of {limit * 1000:.0f} ms.")
+
+
+@click.command('check-export-memory')
+@click.option('--group-id', type=int, required=True, help='Grupa testowa (np. seed-bench --expenses 250000, czyli 1 mln udziałów).')
+@click.option('--kind', type=click.Choice(EXPORT_KINDS), default='shares', help='Rodzaj eksportu.')
+@click.option('--format', 'export_format', type=click.Choice(EXPORT_FORMATS), default='csv', help='Format eksportu.')
+@click.option('--base-currency', default=None, help='Dołącz kwoty przeliczone na tę walutę.')
+@click.option('--limit', type=float, default=None, help='Dopuszczalny szczyt pamięci w MB (domyślnie EXPORT_MEMORY_LIMIT_MB).')
+@with_appcontext
+def check_export_memory_command(group_id, kind, export_format, base_currency, limit):
+    """
+    Eksportuje grupę tak, jak endpoint eksportu, i sprawdza, czy szczytowe zużycie pamięci (tracemalloc)
+    mieści się w limicie. Kończy się kodem 1, jeśli limit został przekroczony.
+    """
+    group = db.session.get(Group, group_id)
+    if not group:
+        click.echo(f"Group {group_id} not found.")
+        sys.exit(1)
+
+    if limit is None:
+        limit = current_app.config['EXPORT_MEMORY_LIMIT_MB']
+
+    lines, size, peak, elapsed = measure_export_memory(kind, group_id, export_format, base_currency)
+    peak_mb = peak / 1024 / 1024
+    click.echo(f"Exported {kind} of group {group_id} as {export_format}: {lines} lines, "
+               f"{size / 1024 / 1024:.1f} MB in {elapsed:.1f} s, peak memory {peak_mb:.1f} MB.")
+
+    if peak_mb > limit:
+        click.echo(f"Peak memory is over the limit of {limit:g} MB.")
+        sys.exit(1)
+    click.echo(f"Within the limit of {limit:g} MB.")
+
+
+@click.command('send-emails')
+@click.option('--loop', is_flag=True, help='Nie kończ po opróżnieniu kolejki, tylko sprawdzaj ją co EMAIL_POLL_INTERVAL sekund.')
+@with_appcontext
+def send_emails_command(loop):
+    """
+    Wysyła oczekujące wiadomości z kolejki emailoutbox jednym połączeniem SMTP (np. gdy EMAIL_WORKER = False).
+    """
+    connection = SmtpConnection.from_config(current_app.config)
+    total = 0
+    try:
+        while True:
+            processed = send_pending_emails(connection)
+            total += processed
+            if not processed:
+                if not loop:
+                    break
+                time.sleep(current_app.config.get('EMAIL_POLL_INTERVAL', 5))
+    finally:
+        connection.close()
+
+    click.echo(f"Processed {total} e-mail(s).")
+
+
+@click.command('outbox-status')
+@with_appcontext
+def outbox_status_command():
+    """
+    Wypisuje liczbę oczekujących wiadomości i statystyki wysyłki.
+    """
+    for name, value in get_email_outbox_stats().items():
+        click.echo(f"{name}: {value}")
+
+
+@click.command('migrate-db')
+@with_appcontext
+def migrate_db_command():
+    """
+    Stosuje oczekujące migracje schematu z katalogu Migrations.
+    """
+    applied = apply_migrations()
+    for name in applied:
+        click.echo(f"Applied {name}.")
+    if not applied:
+        click.echo("Database schema is up to date.")
+
+
+@click.command('check-query-plans')
+@click.option('--group-id', type=int, default=None, help='Grupa użyta w zapytaniach (domyślnie grupa z największą liczbą wydatków).')
+@click.option('--user-id', type=int, default=None, help='Użytkownik użyty w zapytaniach (domyślnie członek grupy).')
+@with_appcontext
+def check_query_plans_command(group_id, user_id):
+    """
+    Sprawdza planem EXPLAIN, czy najczęstsze zapytania aplikacji korzystają z indeksów. Kończy się kodem 1,
+    jeśli któreś z nich wymaga pełnego skanu dużej tabeli.
+    """
+    if group_id is None:
+        group_id = (
+            db.session.query(Expense.group_id)
+            .group_by(Expense.group_id)
+            .order_by(func.count().desc())
+            .limit(1)
+            .scalar()
+        )
+    if user_id is None and group_id is not None:
+        user_id = db.session.query(UserGroup.user_id).filter(UserGroup.group_id == group_id).limit(1).scalar()
+
+    if group_id is None or user_id is None:
+        click.echo("No group with members to check.")
+        sys.exit(1)
+
+    regressions = check_query_plans(group_id, user_id)
+    for name, statement, tables in regressions:
+        click.echo(f"{name}: sequential scan on {', '.join(tables)}\n{statement}\n")
+
+    if regressions:
+        sys.exit(1)
+    click.echo(f"All query plans use indexes (group {group_id}, user {user_id}).")
+
+
+@click.command('import-expenses')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--group-id', type=int, required=True, help='Grupa, do której trafią wydatki.')
+@click.option('--user-id', type=int, default=None, help='Autor importowanych wydatków (domyślnie twórca grupy).')
+@click.option('--format', 'import_format', type=click.Choice(IMPORT_FORMATS), default=None,
+              help='Format pliku (domyślnie według rozszerzenia).')
+@with_appcontext
+def import_expenses_command(path, group_id, user_id, import_format):
+    """
+    Importuje wydatki z pliku CSV albo JSON w jednej transakcji. Najpierw sprawdzane są wszystkie wiersze -
+    jeśli którykolwiek jest błędny, nic nie jest zapisywane, a polecenie wypisuje błędy i kończy się kodem 1.
+    """
+    group = db.session.get(Group, group_id)
+    if group is None:
+        click.echo(f"Group {group_id} not found.")
+        sys.exit(1)
+
+    import_format = import_format or os.path.splitext(path)[1].lstrip('.').lower()
+    with open(path, 'rb') as f:
+        try:
+            rows = parse_import(f.read(), import_format)
+        except ValueError as e:
+            click.echo(f"Cannot read {path}: {e}")
+            sys.exit(1)
+
+    started = time.perf_counter()
+    expenses, errors = validate_import(group, rows, user_id or group.created_by)
+    validated = time.perf_counter() - started
+    if errors:
+        for number, message in errors:
+            click.echo(f"Row {number}: {message}")
+        click.echo(f"{len(errors)} error(s) in {len(rows)} row(s), nothing imported.")
+        sys.exit(1)
+
+    stats = import_expenses(group, expenses)
+    db.session.commit()
+    elapsed = time.perf_counter() - started
+    click.echo(f"Imported {stats['expenses']} expense(s) with {stats['shares']} share(s) into group {group_id}: "
+               f"validation {validated:.2f}s, load {stats['seconds']:.2f}s, "
+               f"{stats['expenses'] / elapsed:.0f} expenses/s overall.")
@@ -0,0 +1,80 @@
+from collections import defaultdict
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import aliased
+from models import db, User, Group, UserGroup, GroupBalance
+from money import from_cents, to_cents
+
+
+def get_dashboard_version(user_id):
+    """
+    Zwraca wersję danych, z których powstaje podsumowanie użytkownika: posortowane pary (group_id, data_version)
+    wszystkich jego grup. Wersja grupy rośnie przy każdym wydatku, spłacie i zmianie składu, a dołączenie do grupy
+    lub jej opuszczenie zmienia listę par, więc podsumowanie zapisane pod starą wersją nie zostanie użyte.
+    """
+    return tuple(db.session.execute(
+        select(Group.id, Group.data_version)
+        .join(UserGroup, UserGroup.group_id == Group.id)
+        .where(UserGroup.user_id == user_id)
+        .order_by(Group.id)
+    ).all())
+
+
+def _amounts(cents_by_currency):
+    return {currency: from_cents(cents) for currency, cents in sorted(cents_by_currency.items()) if cents}
+
+
+def get_dashboard_summary(user_id):
+    """
+    Podsumowanie "jesteś winny / należy ci się" ze wszystkich grup użytkownika, odczytane jednym zapytaniem
+    z tabeli groupbalances (salda są zapisane w obu kierunkach, więc wystarczą wiersze, w których użytkownik
+    jest dłużnikiem: kwota dodatnia - jest winny, ujemna - należy mu się).
+    Zwraca słownik z sumami per waluta (owe, owed, net), listą grup z niezerowymi saldami i listą osób,
+    z którymi użytkownik ma niezerowe saldo (sumowane po wszystkich wspólnych grupach). W net i amount
+    wartość dodatnia oznacza, że użytkownikowi należą się pieniądze, ujemna, że jest winny.
+    """
+    other = aliased(User)
+    rows = db.session.execute(
+        select(Group.id, Group.name, GroupBalance.creditor_id, other.username, GroupBalance.currency,
+               GroupBalance.amount)
+        .select_from(UserGroup)
+        .join(Group, Group.id == UserGroup.group_id)
+        .join(GroupBalance, and_(GroupBalance.group_id == UserGroup.group_id,
+                                 GroupBalance.debtor_id == UserGroup.user_id,
+                                 GroupBalance.amount != 0))
+        .join(other, other.id == GroupBalance.creditor_id)
+        .where(UserGroup.user_id == user_id)
+        .order_by(func.lower(Group.name), Group.id, other.username, GroupBalance.currency)
+    ).all()
+
+    owe = defaultdict(int)
+    owed = defaultdict(int)
+    groups = {}
+    people = {}
+    for group_id, group_name, other_id, other_username, currency, amount in rows:
+        cents = to_cents(amount)
+        if cents > 0:
+            owe[currency] += cents
+        else:
+            owed[currency] -= cents
+
+        group = groups.setdefault(group_id, {'id': group_id, 'name': group_name, 'net': defaultdict(int),
+                                             'counterparties': []})
+        group['net'][currency] -= cents
+        group['counterparties'].append({'user_id': other_id, 'username': other_username, 'currency': currency,
+                                        'amount': from_cents(-cents)})
+
+        person = people.setdefault(other_id, {'user_id': other_id, 'username': other_username,
+                                              'net': defaultdict(int)})
+        person['net'][currency] -= cents
+
+    for entry in list(groups.values()) + list(people.values()):
+        entry['net'] = _amounts(entry['net'])
+
+    return {
+        'owe': _amounts(owe),
+        'owed': _amounts(owed),
+        'net': _amounts({currency: owed[currency] - owe[currency] for currency in set(owe) | set(owed)}),
+        'groups': list(groups.values()),
+        'people': sorted((person for person in people.values() if person['net']),
+                         key=lambda person: person['username'].lower()),
+    }
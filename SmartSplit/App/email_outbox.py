@@ -0,0 +1,295 @@
+import smtplib
+import threading
+import time
+from datetime import timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from flask import current_app
+from sqlalchemy import event, func
+from models import db, OutgoingEmail
+
+_worker = None
+_worker_lock = threading.Lock()
+_wake_worker = threading.Event()
+
+_outbox_stats = {
+    'sent': 0,
+    'retried': 0,
+    'failed': 0,
+    'throttled': 0,
+    'batches': 0,
+    'connections': 0,
+    'send_seconds_total': 0.0,
+    'last_send_seconds': None,
+}
+_outbox_stats_lock = threading.Lock()
+
+
+def enqueue_email(recipient, subject, body, dedup_key=None):
+    """
+    Dodaje wiadomość do kolejki wysyłki (emailoutbox) w bieżącej transakcji. Wiadomość zostanie wysłana przez
+    wątek wysyłający dopiero po zatwierdzeniu transakcji, więc nie blokuje obsługi żądania.
+    dedup_key pozwala później sprawdzić (find_recent_dedup_keys), czy taka wiadomość nie była już niedawno wysłana.
+    """
+    email = OutgoingEmail(recipient=recipient, subject=subject, body=body, dedup_key=dedup_key)
+    db.session.add(email)
+
+    app = current_app._get_current_object()
+    if app.config.get('EMAIL_WORKER', True):
+        # Jeden listener na sesję, niezależnie od liczby wiadomości; flaga w session.info mówi,
+        # że bieżąca transakcja dodała coś do kolejki
+        session = db.session()
+        session.info['email_worker_app'] = app
+        if not event.contains(session, 'after_commit', _notify_after_commit):
+            event.listen(session, 'after_commit', _notify_after_commit)
+            event.listen(session, 'after_rollback', _forget_notification)
+
+    return email
+
+
+def _notify_after_commit(session):
+    app = session.info.pop('email_worker_app', None)
+    if app is not None:
+        _notify_worker(app)
+
+
+def _forget_notification(session):
+    session.info.pop('email_worker_app', None)
+
+
+def _notify_worker(app):
+    global _worker
+
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = EmailWorker(app)
+            _worker.start()
+
+    _wake_worker.set()
+
+
+def find_recent_dedup_keys(dedup_keys, window_seconds):
+    """
+    Zwraca podzbiór dedup_keys, dla których w ciągu ostatnich window_seconds sekund trafiła do kolejki
+    wiadomość (niezależnie od tego, czy została już wysłana). Jedno zapytanie dla całej listy kluczy.
+    """
+    if not dedup_keys:
+        return set()
+
+    rows = (
+        db.session.query(OutgoingEmail.dedup_key)
+        .filter(OutgoingEmail.dedup_key.in_(list(dedup_keys)),
+                OutgoingEmail.created_at > func.now() - timedelta(seconds=window_seconds),
+                OutgoingEmail.status != 'failed')
+        .distinct()
+        .all()
+    )
+    return {row.dedup_key for row in rows}
+
+
+def _count_recent_sends(recipients, window_seconds):
+    rows = (
+        db.session.query(OutgoingEmail.recipient, func.count(OutgoingEmail.id))
+        .filter(OutgoingEmail.recipient.in_(list(recipients)),
+                OutgoingEmail.status == 'sent',
+                OutgoingEmail.sent_at > func.now() - timedelta(seconds=window_seconds))
+        .group_by(OutgoingEmail.recipient)
+        .all()
+    )
+    return dict(rows)
+
+
+def build_message(sender, email):
+    msg = MIMEMultipart()
+    msg['From'] = sender
+    msg['To'] = email.recipient
+    msg['Subject'] = email.subject
+    msg.attach(MIMEText(email.body, 'plain'))
+    return msg
+
+
+class SmtpConnection:
+    """
+    Długo żyjące połączenie SMTP używane ponownie dla kolejnych wiadomości. Połączenie (wraz z logowaniem)
+    jest nawiązywane przy pierwszej wysyłce i odnawiane, gdy serwer je zamknie.
+    """
+
+    def __init__(self, host, port, use_ssl=True, username=None, password=None, timeout=30):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self._server = None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['SMTP_HOST'], config['SMTP_PORT'], config.get('SMTP_USE_SSL', True),
+                   config.get('SMTP_USER'), config.get('SMTP_PASSWORD'))
+
+    def _connect(self):
+        smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        server = smtp_class(self.host, self.port, timeout=self.timeout)
+        server.ehlo()
+        if self.username and self.password and server.has_extn('auth'):
+            server.login(self.username, self.password)
+
+        with _outbox_stats_lock:
+            _outbox_stats['connections'] += 1
+        return server
+
+    def send(self, msg):
+        if self._server is None:
+            self._server = self._connect()
+
+        try:
+            self._server.send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # Serwer zamknął bezczynne połączenie - łączymy się ponownie i próbujemy jeszcze raz
+            self._server = self._connect()
+            self._server.send_message(msg)
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except OSError:
+                pass
+            self._server = None
+
+
+def _claim_batch(batch_size):
+    """
+    Blokuje i zwraca paczkę wiadomości gotowych do wysłania. SKIP LOCKED pozwala kilku procesom
+    wysyłającym pracować równolegle bez wysyłania tej samej wiadomości dwa razy.
+    """
+    return (
+        OutgoingEmail.query
+        .filter(OutgoingEmail.status == 'pending', OutgoingEmail.next_attempt_at <= func.now())
+        .order_by(OutgoingEmail.next_attempt_at, OutgoingEmail.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+
+def send_pending_emails(connection, batch_size=None):
+    """
+    Wysyła jedną paczkę oczekujących wiadomości przez podane połączenie SMTP i zapisuje wynik każdej z nich.
+    Nieudane wysyłki są ponawiane z wykładniczo rosnącym opóźnieniem (EMAIL_RETRY_DELAY * 2^(próba - 1)),
+    a po EMAIL_MAX_ATTEMPTS próbach oznaczane jako 'failed'. Do jednego adresata wysyłanych jest co najwyżej
+    EMAIL_RECIPIENT_LIMIT wiadomości na EMAIL_RECIPIENT_WINDOW sekund - nadmiarowe są odkładane na później.
+    Zwraca liczbę przetworzonych wiadomości.
+    """
+    config = current_app.config
+    batch_size = batch_size or config.get('EMAIL_BATCH_SIZE', 20)
+    max_attempts = config.get('EMAIL_MAX_ATTEMPTS', 5)
+    retry_delay = config.get('EMAIL_RETRY_DELAY', 30)
+    sender = config.get('SMTP_USER')
+    recipient_limit = config.get('EMAIL_RECIPIENT_LIMIT')
+    recipient_window = config.get('EMAIL_RECIPIENT_WINDOW', 3600)
+
+    batch = _claim_batch(batch_size)
+    if not batch:
+        db.session.commit()
+        return 0
+
+    recent_sends = {}
+    if recipient_limit:
+        recent_sends = _count_recent_sends({email.recipient for email in batch}, recipient_window)
+
+    for email in batch:
+        if recipient_limit and recent_sends.get(email.recipient, 0) >= recipient_limit:
+            # Limit dla adresata wyczerpany - próba nie jest liczona, wiadomość czeka na zwolnienie miejsca
+            email.next_attempt_at = func.now() + timedelta(seconds=recipient_window / recipient_limit)
+            with _outbox_stats_lock:
+                _outbox_stats['throttled'] += 1
+            continue
+
+        email.attempts += 1
+        started = time.perf_counter()
+        try:
+            connection.send(build_message(sender, email))
+        except (smtplib.SMTPException, OSError) as e:
+            connection.close()
+            email.last_error = str(e)
+            if email.attempts >= max_attempts:
+                email.status = 'failed'
+                print(f"Error sending email {email.id} to {email.recipient}, giving up: {e}")
+            else:
+                email.next_attempt_at = func.now() + timedelta(seconds=retry_delay * 2 ** (email.attempts - 1))
+                print(f"Error sending email {email.id} to {email.recipient}, will retry: {e}")
+
+            with _outbox_stats_lock:
+                _outbox_stats['failed' if email.status == 'failed' else 'retried'] += 1
+            continue
+
+        elapsed = time.perf_counter() - started
+        email.status = 'sent'
+        email.sent_at = func.now()
+        email.last_error = None
+        recent_sends[email.recipient] = recent_sends.get(email.recipient, 0) + 1
+
+        with _outbox_stats_lock:
+            _outbox_stats['sent'] += 1
+            _outbox_stats['send_seconds_total'] += elapsed
+            _outbox_stats['last_send_seconds'] = elapsed
+
+    db.session.commit()
+
+    with _outbox_stats_lock:
+        _outbox_stats['batches'] += 1
+    return len(batch)
+
+
+class EmailWorker(threading.Thread):
+    """
+    Wątek w tle opróżniający kolejkę emailoutbox przez jedno, ponownie używane połączenie SMTP.
+    Budzi się po zatwierdzeniu transakcji z nową wiadomością, a w przeciwnym razie co EMAIL_POLL_INTERVAL sekund
+    (żeby podjąć ponowienia i wiadomości dodane przez inne procesy).
+    """
+
+    def __init__(self, app):
+        super().__init__(name='email-outbox-worker', daemon=True)
+        self.app = app
+
+    def run(self):
+        with self.app.app_context():
+            connection = SmtpConnection.from_config(self.app.config)
+            poll_interval = self.app.config.get('EMAIL_POLL_INTERVAL', 5)
+
+            while True:
+                _wake_worker.clear()
+                try:
+                    processed = send_pending_emails(connection)
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Error in email outbox worker: {e}")
+                    processed = 0
+                finally:
+                    db.session.remove()
+
+                if not processed:
+                    _wake_worker.wait(poll_interval)
+
+
+def get_email_outbox_stats():
+    """
+    Zwraca liczniki wysyłki (w obrębie procesu) oraz aktualny stan kolejki: liczbę oczekujących wiadomości
+    i wiek najstarszej z nich w sekundach.
+    """
+    depth, oldest_age = (
+        db.session.query(func.count(OutgoingEmail.id),
+                         func.extract('epoch', func.now() - func.min(OutgoingEmail.created_at)))
+        .filter(OutgoingEmail.status == 'pending')
+        .one()
+    )
+
+    with _outbox_stats_lock:
+        stats = dict(_outbox_stats)
+
+    stats['queue_depth'] = depth
+    stats['oldest_pending_seconds'] = float(oldest_age) if oldest_age is not None else None
+    stats['avg_send_seconds'] = stats['send_seconds_total'] / stats['sent'] if stats['sent'] else None
+    return stats
@@ -1,83 +1,282 @@
-import requests
+import threading
+import time
 from datetime import datetime, timedelta
-from decimal import Decimal, ROUND_HALF_UP
-from models import Currency, db
-import os
-from dotenv import load_dotenv
+from decimal import Decimal
+from flask import current_app
+from sqlalchemy import Date, String, column, func, select, values
+from sqlalchemy.dialects.postgresql import insert
+from models import Currency, CurrencyRate, db
+from money import Money
+from rate_providers import get_rate_provider
 
-load_dotenv()
+# Po jakim czasie kurs w bazie uznajemy za nieaktualny i odświeżamy go z API
+RATE_MAX_AGE = timedelta(hours=8)
+# Po jakim czasie lokalna kopia tabeli currencies jest ponownie wczytywana z bazy (np. po odświeżeniu w innym procesie)
+RATE_CACHE_TTL = timedelta(minutes=5)
+# Minimalny odstęp między kolejnymi próbami odświeżenia kursów (chroni API, gdy odświeżanie się nie udaje)
+RATE_REFRESH_RETRY = timedelta(minutes=1)
 
-FIXER_API_URL = "http://data.fixer.io/api/latest"
-FIXER_API_KEY = os.getenv('FIXER_API_KEY')
+# Lokalna (w obrębie procesu) kopia tabeli currencies: currency_code -> (exchange_rate, last_updated)
+_rate_cache = {}
+_rate_cache_loaded_at = None
+_last_refresh_attempt = None
+_rate_cache_lock = threading.Lock()
+# Gwarantuje, że naraz trwa tylko jedno odświeżanie kursów z API
+_refresh_lock = threading.Lock()
 
+_rate_cache_stats = {
+    'hits': 0,
+    'stale_hits': 0,
+    'misses': 0,
+    'refreshes': 0,
+    'refresh_failures': 0,
+    'refresh_seconds_total': 0.0,
+    'last_refresh_seconds': None,
+}
 
-def update_currency_rates():
+
+def update_currency_rates(provider=None):
     """
-    Pobiera najnowsze kursy walut z API Fixer.io względem EUR i aktualizuje je w bazie danych jako kursy względem PLN.
+    Pobiera najnowsze kursy walut od dostawcy (domyślnie wskazanego w konfiguracji, np. Fixer.io)
+    i zapisuje je w bazie danych jako kursy względem PLN jednym poleceniem INSERT ... ON CONFLICT DO UPDATE.
+    Kursy trafiają też do historii kursów (currencyrates) pod dzisiejszą datą.
     """
     try:
-        response = requests.get(FIXER_API_URL, params={"access_key": FIXER_API_KEY, "base": "EUR"})
-        data = response.json()
-
-        if not data.get("success", False):
-            print(f"Failed to fetch currency data: {data.get('error', 'Unknown error')}")
-            return
-
-        rates = data.get("rates", {})
+        provider = provider or get_rate_provider()
+        base, rates = provider.fetch_rates()
         now = datetime.utcnow()
 
-        eur_to_pln = rates.get('PLN')
+        base_to_pln = Decimal(1) if base == 'PLN' else rates.get('PLN')
 
-        if not eur_to_pln:
-            print("Error: EUR/PLN rate not found in the API response.")
-            return
+        if not base_to_pln:
+            print(f"Error: {base}/PLN rate not found in the provider response.")
+            return False
 
-        for currency_code, rate in rates.items():
+        rows = [
+            {
+                'currency_code': currency_code,
+                'exchange_rate': Decimal(base_to_pln) / Decimal(rate),
+                'last_updated': now,
+            }
+            for currency_code, rate in rates.items()
+            if rate
+        ]
 
-            rate_in_pln = Decimal(eur_to_pln) / Decimal(rate)
+        stmt = insert(Currency).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Currency.currency_code],
+            set_={'exchange_rate': stmt.excluded.exchange_rate, 'last_updated': stmt.excluded.last_updated}
+        )
+        db.session.execute(stmt)
 
-            currency = Currency.query.filter_by(currency_code=currency_code).first()
-            if currency:
-                currency.exchange_rate = rate_in_pln
-                currency.last_updated = now
-            else:
-                db.session.add(Currency(
-                    currency_code=currency_code,
-                    exchange_rate=rate_in_pln,
-                    last_updated=now
-                ))
+        history = insert(CurrencyRate).values([
+            {'currency_code': row['currency_code'], 'rate_date': now.date(), 'exchange_rate': row['exchange_rate']}
+            for row in rows
+        ])
+        history = history.on_conflict_do_update(
+            index_elements=[CurrencyRate.currency_code, CurrencyRate.rate_date],
+            set_={'exchange_rate': history.excluded.exchange_rate}
+        )
+        db.session.execute(history)
 
         db.session.commit()
         print("Currency rates updated successfully.")
+        return True
     except Exception as e:
+        db.session.rollback()
         print(f"Error while updating currency rates: {e}")
+        return False
+
+
+def _load_rates_from_db():
+    """
+    Wczytuje całą tabelę currencies jednym zapytaniem do lokalnej kopii kursów.
+    """
+    global _rate_cache, _rate_cache_loaded_at
+
+    rates = {
+        currency.currency_code: (currency.exchange_rate, currency.last_updated)
+        for currency in Currency.query.all()
+    }
+
+    with _rate_cache_lock:
+        _rate_cache = rates
+        _rate_cache_loaded_at = datetime.utcnow()
+
+
+def _refresh_rates():
+    """
+    Odświeża kursy z API i wczytuje je ponownie do lokalnej kopii. Wywołujący musi trzymać _refresh_lock.
+    """
+    global _last_refresh_attempt
+
+    _last_refresh_attempt = datetime.utcnow()
+    started = time.perf_counter()
+    updated = update_currency_rates()
+    elapsed = time.perf_counter() - started
+
+    with _rate_cache_lock:
+        _rate_cache_stats['refreshes'] += 1
+        _rate_cache_stats['refresh_seconds_total'] += elapsed
+        _rate_cache_stats['last_refresh_seconds'] = elapsed
+        if not updated:
+            _rate_cache_stats['refresh_failures'] += 1
+
+    _load_rates_from_db()
+
+
+def _refresh_recently_attempted():
+    return _last_refresh_attempt is not None and datetime.utcnow() - _last_refresh_attempt < RATE_REFRESH_RETRY
+
+
+def _refresh_rates_in_background(app):
+    """
+    Uruchamia odświeżanie kursów w osobnym wątku, o ile żadne odświeżanie już nie trwa.
+    Do czasu jego zakończenia zapytania dostają ostatni znany kurs.
+    """
+    if _refresh_recently_attempted() or not _refresh_lock.acquire(blocking=False):
+        return
+
+    def refresh():
+        try:
+            with app.app_context():
+                _refresh_rates()
+        finally:
+            _refresh_lock.release()
+
+    threading.Thread(target=refresh, name='currency-rate-refresh', daemon=True).start()
+
+
+def _count(stat):
+    with _rate_cache_lock:
+        _rate_cache_stats[stat] += 1
+
+
+def get_rate_cache_stats():
+    """
+    Zwraca liczniki lokalnej kopii kursów: trafienia, trafienia w nieaktualny kurs, chybienia
+    oraz liczbę i czas odświeżeń z API.
+    """
+    with _rate_cache_lock:
+        return dict(_rate_cache_stats, cached_currencies=len(_rate_cache))
 
 
 def get_exchange_rate(currency_code):
     """
-    Pobiera kurs wymiany dla danej waluty. Jeśli kurs jest starszy niż 8 godzin, aktualizuje kursy.
+    Pobiera kurs wymiany dla danej waluty z lokalnej kopii kursów, wczytywanej z bazy co RATE_CACHE_TTL.
+    Jeśli kurs jest starszy niż RATE_MAX_AGE, zwraca ostatni znany kurs i odświeża kursy w tle.
+    Tylko gdy kursu nie ma wcale, czeka na odświeżenie.
     """
-    currency = Currency.query.filter_by(currency_code=currency_code).first()
     now = datetime.utcnow()
 
-    if not currency or (now - currency.last_updated > timedelta(hours=8)):
-        update_currency_rates()
-        currency = Currency.query.filter_by(currency_code=currency_code).first()
+    with _rate_cache_lock:
+        loaded_at = _rate_cache_loaded_at
+
+    if loaded_at is None or now - loaded_at > RATE_CACHE_TTL or currency_code not in _rate_cache:
+        _count('misses')
+        _load_rates_from_db()
+    else:
+        _count('hits')
+
+    entry = _rate_cache.get(currency_code)
+
+    if not entry:
+        with _refresh_lock:
+            # Inny wątek mógł już odświeżyć kursy, gdy czekaliśmy na blokadę
+            _load_rates_from_db()
+            if currency_code not in _rate_cache and not _refresh_recently_attempted():
+                _refresh_rates()
+        entry = _rate_cache.get(currency_code)
+
+        if not entry:
+            raise ValueError(f"Currency {currency_code} not found in the database.")
+
+    exchange_rate, last_updated = entry
+
+    if now - last_updated > RATE_MAX_AGE:
+        _count('stale_hits')
+        _refresh_rates_in_background(current_app._get_current_object())
+
+    return exchange_rate
+
+
+def get_supported_currencies():
+    """
+    Zwraca zbiór kodów walut, na które można przeliczać kwoty: PLN i waluty z tabeli currencies.
+    Korzysta z lokalnej kopii kursów, więc zapytanie do bazy wykonuje najwyżej raz na RATE_CACHE_TTL.
+    """
+    with _rate_cache_lock:
+        loaded_at = _rate_cache_loaded_at
 
-    if not currency:
-        raise ValueError(f"Currency {currency_code} not found in the database.")
+    if loaded_at is None or datetime.utcnow() - loaded_at > RATE_CACHE_TTL:
+        _load_rates_from_db()
 
-    return currency.exchange_rate
+    return {'PLN'} | set(_rate_cache)
 
 
 def convert_to_pln(amount, currency_code):
     """
-    Przelicza podaną kwotę na PLN na podstawie kursu wymiany.
+    Przelicza podaną kwotę (Money albo kwotę w walucie currency_code) na PLN na podstawie kursu wymiany.
+    Zwraca Money w PLN, zaokrąglone do pełnych groszy.
     """
-    if currency_code == "PLN":
-        return amount
+    money = amount if isinstance(amount, Money) else Money.parse(amount, currency_code)
+    if money.currency == "PLN":
+        return money
+
+    return money.convert(get_exchange_rate(money.currency), 'PLN')
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def get_exchange_rates_as_of(currency_dates, fetch_missing=True):
+    """
+    Zwraca kursy względem PLN obowiązujące w podanych dniach: {(currency_code, date): exchange_rate}.
+    Wszystkie kursy są pobierane jednym zapytaniem (złączenie "as-of" z historią kursów: ostatni kurs
+    z dnia nie późniejszego niż podana data). Gdy historia nie sięga tak daleko, używany jest bieżący kurs.
+    Z fetch_missing=False waluty bez żadnego kursu w bazie są pomijane w wyniku (zamiast odświeżania kursów
+    i ValueError), tak jak w przeliczeniach wykonywanych w SQL.
+    """
+    wanted_pairs = sorted({(currency_code, _as_date(day)) for currency_code, day in currency_dates
+                           if currency_code != 'PLN'})
+    if not wanted_pairs:
+        return {}
+
+    wanted = values(
+        column('currency_code', String),
+        column('rate_date', Date),
+        name='wanted'
+    ).data(wanted_pairs)
+
+    historical_rate = (
+        select(CurrencyRate.exchange_rate)
+        .where(CurrencyRate.currency_code == wanted.c.currency_code,
+               CurrencyRate.rate_date <= wanted.c.rate_date)
+        .order_by(CurrencyRate.rate_date.desc())
+        .limit(1)
+        .correlate(wanted)
+        .scalar_subquery()
+    )
+    current_rate = (
+        select(Currency.exchange_rate)
+        .where(Currency.currency_code == wanted.c.currency_code)
+        .correlate(wanted)
+        .scalar_subquery()
+    )
+
+    rows = db.session.execute(
+        select(wanted.c.currency_code, wanted.c.rate_date, func.coalesce(historical_rate, current_rate))
+    ).all()
+
+    rates = {}
+    for currency_code, day, exchange_rate in rows:
+        if exchange_rate is None:
+            if not fetch_missing:
+                continue
+            # Waluta nieznana w bazie - get_exchange_rate spróbuje odświeżyć kursy albo zgłosi ValueError
+            exchange_rate = get_exchange_rate(currency_code)
+        rates[(currency_code, day)] = exchange_rate
 
-    exchange_rate = get_exchange_rate(currency_code)
+    return rates
 
-    amount_in_pln = Decimal(amount) * exchange_rate
-    return amount_in_pln.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
@@ -0,0 +1,264 @@
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import func, select, text
+from models import db, User, UserGroup, Expense, ExpenseShare, Currency
+from money import Money
+from splits import SplitError, split_expense
+from group_changes import expenses_imported
+
+IMPORT_FORMATS = ('csv', 'json')
+# Kolumny pliku CSV; members (podział equal) to lista "id;id;...", a shares (podziały custom, percentage i weights)
+# to lista "id:wartość;id:wartość;...". Podział itemized nie jest obsługiwany w imporcie.
+# Użytkownika można podać nazwą albo id; "#5" (albo liczba w JSON-ie) to zawsze id.
+IMPORT_COLUMNS = ('description', 'amount', 'currency', 'category', 'date', 'paid_by', 'split', 'members', 'shares')
+
+
+class ImportedExpense:
+    """
+    Zwalidowany wiersz importu: pola wydatku i jego udziały ({user_id: share}); kwoty jako Money.
+    """
+    __slots__ = ('id', 'group_id', 'description', 'amount', 'currency', 'category', 'created_at', 'created_by',
+                 'paid_by', 'custom_split', 'shares')
+
+    def __init__(self, **fields):
+        self.id = None
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    def share_tuples(self):
+        return [(user_id, share, self.paid_by) for user_id, share in self.shares.items()]
+
+
+def parse_import(data, import_format):
+    """
+    Zamienia zawartość pliku importu (CSV z nagłówkiem albo listę obiektów JSON) na listę słowników.
+    W JSON-ie members może być listą, a shares obiektem {user: kwota}.
+    """
+    if import_format not in IMPORT_FORMATS:
+        raise ValueError(f"Unknown import format: {import_format}")
+
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+
+    if import_format == 'json':
+        # Liczby z częścią ułamkową jako Decimal - kwoty nie przechodzą przez float
+        rows = json.loads(data, parse_float=Decimal)
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError("JSON import must be a list of objects")
+        return rows
+
+    return list(csv.DictReader(io.StringIO(data)))
+
+
+def _split_list(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(';') if item.strip()]
+    return list(value)
+
+
+def _split_shares(value):
+    if value is None:
+        return []
+    if isinstance(value, dict):
+        return list(value.items())
+    if isinstance(value, str):
+        return [tuple(item.rsplit(':', 1)) if ':' in item else (item, None) for item in _split_list(value)]
+    return [tuple(item) for item in value]
+
+
+class _GroupMembers:
+    """
+    Członkowie grupy wyszukiwani po id albo nazwie użytkownika. Id i nazwy są trzymane osobno, żeby nazwa
+    wyglądająca jak liczba (np. "5") nie przypisała udziału użytkownikowi o id 5.
+    """
+
+    def __init__(self, rows):
+        self.ids = {}
+        self.usernames = {}
+        for user_id, username in rows:
+            self.ids[user_id] = user_id
+            self.usernames[username] = user_id
+
+    def resolve(self, reference):
+        """
+        Zwraca (user_id, None) albo (None, komunikat błędu).
+        """
+        if isinstance(reference, int) and not isinstance(reference, bool):
+            by_id = self.ids.get(reference)
+            return (by_id, None) if by_id is not None else (None, f"not a member of the group: {reference!r}")
+
+        reference = str(reference if reference is not None else '').strip()
+        if reference.startswith('#') and reference[1:].isdigit():
+            by_id = self.ids.get(int(reference[1:]))
+            return (by_id, None) if by_id is not None else (None, f"not a member of the group: {reference!r}")
+
+        by_name = self.usernames.get(reference)
+        by_id = self.ids.get(int(reference)) if reference.isdigit() else None
+        if by_name is not None and by_id is not None and by_name != by_id:
+            return None, (f"ambiguous member {reference!r}: matches a user id and another user's name "
+                          f"(use #{reference} for the id)")
+        user_id = by_name if by_name is not None else by_id
+        return (user_id, None) if user_id is not None else (None, f"not a member of the group: {reference!r}")
+
+
+def validate_import(group, rows, created_by):
+    """
+    Sprawdza wszystkie wiersze importu naraz, zanim cokolwiek zostanie zapisane: poprawność kwot i dat,
+    członkostwo płatnika i uczestników w grupie, znane waluty oraz sam podział (splits.split_expense).
+    Członkowie i waluty są wczytywane jednym zapytaniem każde. Użytkowników można podawać po id albo nazwie.
+    Zwraca (lista ImportedExpense, lista błędów (numer wiersza, komunikat)) - wiersze numerowane od 1.
+    """
+    members = _GroupMembers(
+        db.session.query(User.id, User.username)
+        .join(UserGroup, UserGroup.user_id == User.id)
+        .filter(UserGroup.group_id == group.id)
+    )
+
+    currencies = {'PLN'} | {code for code, in db.session.query(Currency.currency_code)}
+    now = db.session.execute(select(func.now())).scalar().replace(tzinfo=None)
+
+    expenses = []
+    errors = []
+    for number, row in enumerate(rows, start=1):
+        row_errors = []
+
+        description = (row.get('description') or '').strip()
+        if not description:
+            row_errors.append("description is required")
+
+        currency = (row.get('currency') or 'PLN').strip().upper()
+        if currency not in currencies:
+            row_errors.append(f"unknown currency: {currency}")
+
+        try:
+            amount = Money.parse(row.get('amount'), currency)
+            if amount.cents <= 0:
+                row_errors.append("amount must be positive")
+        except (TypeError, ValueError):
+            amount = None
+            row_errors.append(f"invalid amount: {row.get('amount')!r}")
+
+        created_at = now
+        if row.get('date'):
+            try:
+                created_at = datetime.fromisoformat(str(row['date']).strip())
+            except ValueError:
+                row_errors.append(f"invalid date: {row['date']!r}")
+
+        paid_by, error = members.resolve(row.get('paid_by'))
+        if error:
+            row_errors.append(f"payer: {error}")
+
+        split = (row.get('split') or 'equal').strip().lower()
+        shares = {}
+        if split == 'equal':
+            values = []
+            for participant in _split_list(row.get('members')):
+                user_id, error = members.resolve(participant)
+                if error:
+                    row_errors.append(error)
+                elif user_id in values:
+                    row_errors.append(f"member listed twice: {participant!r}")
+                else:
+                    values.append(user_id)
+        elif split in ('custom', 'percentage', 'weights'):
+            values = {}
+            for participant, value in _split_shares(row.get('shares')):
+                user_id, error = members.resolve(participant)
+                if error:
+                    row_errors.append(error)
+                elif user_id in values:
+                    row_errors.append(f"member listed twice: {participant!r}")
+                else:
+                    values[user_id] = value
+        else:
+            values = None
+            row_errors.append(f"unsupported split type: {split!r}")
+
+        if amount is not None and values is not None:
+            try:
+                shares = split_expense(split, amount, values)
+            except SplitError as e:
+                row_errors.append(str(e))
+
+        if row_errors:
+            errors.extend((number, message) for message in row_errors)
+            continue
+
+        expenses.append(ImportedExpense(
+            group_id=group.id,
+            description=description[:255],
+            amount=amount,
+            currency=currency,
+            category=(row.get('category') or '').strip()[:50] or None,
+            created_at=created_at,
+            created_by=created_by,
+            paid_by=paid_by,
+            custom_split=split != 'equal',
+            shares=shares,
+        ))
+
+    return expenses, errors
+
+
+def _copy_rows(table, columns, rows):
+    """
+    Ładuje wiersze do tabeli poleceniem COPY w bieżącej transakcji sesji. Gdy sterownik bazy nie obsługuje COPY,
+    używa INSERT z wieloma wierszami (executemany z insertmanyvalues).
+    """
+    cursor = db.session.connection().connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'):
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+            return
+    finally:
+        cursor.close()
+
+    db.session.execute(text(f"INSERT INTO {table} ({', '.join(columns)}) "
+                            f"VALUES ({', '.join(':' + column for column in columns)})"),
+                       [dict(zip(columns, row)) for row in rows])
+
+
+def import_expenses(group, expenses):
+    """
+    Zapisuje zwalidowane wydatki w bieżącej transakcji: identyfikatory są rezerwowane z sekwencji jednym zapytaniem,
+    wydatki i udziały ładowane poleceniem COPY, a salda, zestawienie wykresów i wersja grupy aktualizowane raz
+    dla całej paczki. Zwraca statystyki (liczby wierszy, czas w sekundach i wydatki na sekundę).
+    """
+    started = time.perf_counter()
+
+    if expenses:
+        ids = db.session.execute(
+            text("SELECT nextval(pg_get_serial_sequence('expenses', 'id')) FROM generate_series(1, :count)"),
+            {'count': len(expenses)}
+        ).scalars().all()
+        for expense, expense_id in zip(expenses, ids):
+            expense.id = expense_id
+
+    _copy_rows(Expense.__tablename__,
+               ('id', 'group_id', 'description', 'amount', 'currency', 'created_by', 'created_at', 'category',
+                'custom_split'),
+               ((e.id, e.group_id, e.description, e.amount, e.currency, e.created_by, e.created_at.isoformat(),
+                 e.category, e.custom_split) for e in expenses))
+
+    share_rows = [(e.id, user_id, share, e.paid_by) for e in expenses for user_id, share in e.shares.items()]
+    _copy_rows(ExpenseShare.__tablename__, ('expense_id', 'user_id', 'share', 'paid_by'), share_rows)
+
+    expenses_imported(group, [(e, e.share_tuples()) for e in expenses])
+
+    elapsed = time.perf_counter() - started
+    return {
+        'expenses': len(expenses),
+        'shares': len(share_rows),
+        'seconds': round(elapsed, 3),
+        'expenses_per_second': round(len(expenses) / elapsed) if elapsed else None,
+    }
@@ -0,0 +1,162 @@
+import base64
+from datetime import datetime, timedelta
+from sqlalchemy import and_, exists, func, or_, select
+from sqlalchemy.orm import aliased
+from models import db, User, Expense, ExpenseShare, Settlement
+from money import from_cents, to_cents
+
+FEED_PAGE_SIZE = 25
+FEED_MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(created_at, row_id):
+    """
+    Koduje pozycję w liście (data, id) jako nieprzezroczysty kursor do użycia w adresie URL.
+    """
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Odwrotność encode_cursor. Zgłasza ValueError dla uszkodzonego kursora.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _keyset_page(query, date_column, id_column, limit, cursor):
+    """
+    Zwraca (wiersze, następny kursor) dla zapytania sortowanego malejąco po (date_column, id_column).
+    Kolejna strona zaczyna się bezpośrednio za ostatnim wierszem poprzedniej, więc koszt pobrania strony
+    nie zależy od tego, jak daleko w historii się znajduje (w przeciwieństwie do OFFSET).
+    """
+    if cursor:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        query = query.filter(or_(date_column < cursor_date,
+                                 and_(date_column == cursor_date, id_column < cursor_id)))
+
+    rows = query.order_by(date_column.desc(), id_column.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return rows, next_cursor
+
+
+def _day_range(query, date_column, date_from, date_to):
+    if date_from:
+        query = query.filter(date_column >= date_from)
+    if date_to:
+        query = query.filter(date_column < date_to + timedelta(days=1))
+    return query
+
+
+def _format_amount(amount):
+    return str(from_cents(to_cents(amount)))
+
+
+def get_expense_feed(group_id, limit=FEED_PAGE_SIZE, cursor=None, category=None, payer_id=None,
+                     date_from=None, date_to=None):
+    """
+    Zwraca stronę wydatków grupy (od najnowszych) i kursor następnej strony (None, gdy to ostatnia strona).
+    Opcjonalne filtry: kategoria, płatnik i zakres dni (date_from, date_to włącznie).
+    """
+    payer = aliased(User)
+    paid_by = (
+        select(func.string_agg(func.distinct(payer.username), ', '))
+        .select_from(ExpenseShare)
+        .join(payer, payer.id == ExpenseShare.paid_by)
+        .where(ExpenseShare.expense_id == Expense.id)
+        .scalar_subquery()
+    )
+
+    query = (
+        db.session.query(
+            Expense.id,
+            Expense.description,
+            Expense.amount,
+            Expense.currency,
+            Expense.category,
+            Expense.created_at,
+            Expense.created_by,
+            paid_by.label('paid_by'),
+        )
+        .filter(Expense.group_id == group_id)
+    )
+
+    if category:
+        query = query.filter(Expense.category == category)
+    if payer_id:
+        query = query.filter(exists().where(ExpenseShare.expense_id == Expense.id,
+                                            ExpenseShare.paid_by == payer_id))
+    query = _day_range(query, Expense.created_at, date_from, date_to)
+
+    rows, next_cursor = _keyset_page(query, Expense.created_at, Expense.id, limit, cursor)
+
+    items = [
+        {
+            'id': row.id,
+            'description': row.description,
+            'amount': _format_amount(row.amount),
+            'currency': row.currency,
+            'category': row.category,
+            'date': row.created_at.strftime('%Y-%m-%d'),
+            'paidBy': row.paid_by or "Unknown",
+            'createdBy': row.created_by,
+        }
+        for row in rows
+    ]
+    return items, next_cursor
+
+
+def get_settlement_feed(group_id, limit=FEED_PAGE_SIZE, cursor=None, payer_id=None, date_from=None, date_to=None):
+    """
+    Zwraca stronę spłat grupy (od najnowszych) i kursor następnej strony (None, gdy to ostatnia strona).
+    Opcjonalne filtry: płatnik i zakres dni (date_from, date_to włącznie).
+    """
+    payer = aliased(User)
+    receiver = aliased(User)
+
+    query = (
+        db.session.query(
+            Settlement.id,
+            Settlement.date.label('created_at'),
+            Settlement.payer_id,
+            payer.username.label('payer_name'),
+            Settlement.receiver_id,
+            receiver.username.label('receiver_name'),
+            Settlement.amount,
+            Settlement.currency,
+        )
+        .join(payer, payer.id == Settlement.payer_id)
+        .join(receiver, receiver.id == Settlement.receiver_id)
+        .filter(Settlement.group_id == group_id)
+    )
+
+    if payer_id:
+        query = query.filter(Settlement.payer_id == payer_id)
+    query = _day_range(query, Settlement.date, date_from, date_to)
+
+    rows, next_cursor = _keyset_page(query, Settlement.date, Settlement.id, limit, cursor)
+
+    items = [
+        {
+            'id': row.id,
+            'date': row.created_at.strftime('%Y-%m-%d'),
+            'payerId': row.payer_id,
+            'payerName': row.payer_name,
+            'receiverId': row.receiver_id,
+            'receiverName': row.receiver_name,
+            'amount': _format_amount(row.amount),
+            'currency': row.currency,
+        }
+        for row in rows
+    ]
+    return items, next_cursor
@@ -0,0 +1,108 @@
+from sqlalchemy import and_, exists, func, or_, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.orm import aliased
+from models import db, User, Friends, FriendRequest
+
+SUGGESTION_LIMIT = 10
+# Ile nazw wspólnych znajomych pokazywać przy każdej sugestii
+MUTUAL_NAMES_LIMIT = 3
+
+
+def _pending_request_between(user_id, other_user_id):
+    """
+    Warunek EXISTS: między użytkownikami czeka zaproszenie do znajomych, wysłane w którąkolwiek stronę.
+    """
+    return exists().where(
+        FriendRequest.status == 'pending',
+        or_(and_(FriendRequest.sender_id == user_id, FriendRequest.recipient_id == other_user_id),
+            and_(FriendRequest.sender_id == other_user_id, FriendRequest.recipient_id == user_id)),
+    )
+
+
+def get_friend_suggestions(user_id, limit=SUGGESTION_LIMIT):
+    """
+    Zwraca "osoby, które możesz znać": znajomych znajomych użytkownika, którzy nie są jeszcze jego znajomymi
+    (ani nie czeka między nimi zaproszenie - wysłane lub otrzymane), posortowanych malejąco po liczbie wspólnych znajomych.
+    Całość to jedno zapytanie agregujące w bazie (dwa przejścia po indeksie unique_friendship (user_id, friend_id)),
+    więc koszt zależy od liczby krawędzi w otoczeniu użytkownika, a nie od liczby wszystkich użytkowników.
+    Zwraca listę słowników {id, username, mutual_count, mutual_names}.
+    """
+    mine = aliased(Friends)
+    theirs = aliased(Friends)
+    already = aliased(Friends)
+    mutual = aliased(User)
+    candidate_id = theirs.friend_id
+
+    candidates = (
+        select(
+            candidate_id.label('user_id'),
+            func.count().label('mutual_count'),
+            func.array_agg(aggregate_order_by(mutual.username, mutual.username)).label('mutual_names'),
+        )
+        .select_from(mine)
+        .join(theirs, theirs.user_id == mine.friend_id)
+        .join(mutual, mutual.id == mine.friend_id)
+        .where(
+            mine.user_id == user_id,
+            candidate_id != user_id,
+            ~exists().where(and_(already.user_id == user_id, already.friend_id == candidate_id)),
+            ~_pending_request_between(user_id, candidate_id),
+        )
+        .group_by(candidate_id)
+        .order_by(func.count().desc(), candidate_id)
+        .limit(limit)
+        .subquery()
+    )
+
+    rows = db.session.execute(
+        select(candidates.c.user_id, User.username, candidates.c.mutual_count, candidates.c.mutual_names)
+        .join(User, User.id == candidates.c.user_id)
+        .order_by(candidates.c.mutual_count.desc(), candidates.c.user_id)
+    ).all()
+
+    return [
+        {
+            'id': row.user_id,
+            'username': row.username,
+            'mutual_count': row.mutual_count,
+            'mutual_names': list(row.mutual_names[:MUTUAL_NAMES_LIMIT]),
+        }
+        for row in rows
+    ]
+
+
+def can_view_mutual_friends(user_id, other_user_id):
+    """
+    Sprawdza jednym zapytaniem, czy użytkownik może zobaczyć wspólnych znajomych z other_user_id: tylko dla
+    swoich znajomych i osób, które mogą pojawić się w jego sugestiach (znajomi znajomych bez oczekującego
+    zaproszenia). Dla pozostałych lista wspólnych znajomych ujawniałaby cudze znajomości.
+    """
+    if user_id == other_user_id:
+        return False
+
+    mine = aliased(Friends)
+    theirs = aliased(Friends)
+    is_friend = exists().where(Friends.user_id == user_id, Friends.friend_id == other_user_id)
+    is_friend_of_friend = exists().where(mine.user_id == user_id, theirs.user_id == mine.friend_id,
+                                         theirs.friend_id == other_user_id)
+
+    return db.session.execute(select(or_(
+        is_friend,
+        and_(is_friend_of_friend, ~_pending_request_between(user_id, other_user_id)),
+    ))).scalar()
+
+
+def get_mutual_friends(user_id, other_user_id):
+    """
+    Zwraca wspólnych znajomych dwóch użytkowników (lista użytkowników posortowana po nazwie).
+    """
+    mine = aliased(Friends)
+    theirs = aliased(Friends)
+
+    return (
+        User.query
+        .join(mine, and_(mine.friend_id == User.id, mine.user_id == user_id))
+        .join(theirs, and_(theirs.friend_id == User.id, theirs.user_id == other_user_id))
+        .order_by(User.username)
+        .all()
+    )
@@ -0,0 +1,55 @@
+from sqlalchemy import update
+from models import db, Group
+from balance_ledger import record_expense, record_expenses, record_settlement
+from chart_rollup import record_expense_rollup, record_expense_rollups
+from access import invalidate_membership
+
+
+def bump_group_version(group_id):
+    """
+    Zwiększa wersję danych grupy (groups.data_version). Wersja rośnie przy każdej zmianie wydatków i spłat,
+    więc wyniki wyliczone z danych grupy można cache'ować pod kluczem zawierającym wersję.
+    """
+    db.session.execute(
+        update(Group)
+        .where(Group.id == group_id)
+        .values(data_version=Group.data_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def expense_changed(group, expense, shares, sign=1):
+    """
+    Aktualizuje dane pochodne grupy (salda i zestawienie wykresów) po dodaniu wydatku (sign=1)
+    lub przed jego zmianą albo usunięciem (sign=-1). shares to lista krotek (user_id, share, paid_by).
+    Zmiany trafiają do bieżącej transakcji i są zatwierdzane razem z samym wydatkiem.
+    """
+    record_expense(group, expense.currency, shares, sign)
+    record_expense_rollup(expense, shares, sign)
+    bump_group_version(group.id)
+
+
+def expenses_imported(group, expenses):
+    """
+    Odpowiednik expense_changed dla wielu nowych wydatków naraz (import): expenses to lista par (expense, shares).
+    Salda i zestawienie wykresów są aktualizowane jednym poleceniem każde, a wersja grupy rośnie raz.
+    """
+    record_expenses(group, [(expense.currency, shares) for expense, shares in expenses])
+    record_expense_rollups(group.id, expenses)
+    bump_group_version(group.id)
+
+
+def settlement_changed(settlement, sign=1):
+    """
+    Aktualizuje dane pochodne grupy po dodaniu spłaty (sign=1) lub przed jej zmianą albo usunięciem (sign=-1).
+    """
+    record_settlement(settlement, sign)
+    bump_group_version(settlement.group_id)
+
+
+def membership_changed(group_id, user_ids):
+    """
+    Unieważnia dane zależne od składu grupy po dodaniu lub usunięciu podanych członków.
+    """
+    invalidate_membership(group_id, user_ids)
+    bump_group_version(group_id)
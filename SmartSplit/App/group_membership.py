@@ -0,0 +1,169 @@
+from sqlalchemy import delete, select, union
+from sqlalchemy.dialects.postgresql import insert
+from models import db, User, Group, UserGroup, Friends, GroupBalance, Expense, ExpenseShare, Settlement
+from group_changes import membership_changed
+
+
+class MembershipError(ValueError):
+    """
+    Zmiana składu grupy jest niedozwolona (komunikat nadaje się do pokazania użytkownikowi).
+    details to opcjonalne dane dla odpowiedzi API (np. niedozwolone identyfikatory albo salda).
+    """
+
+    def __init__(self, message, details=None):
+        super().__init__(message)
+        self.details = details or {}
+
+
+def _parse_user_ids(user_ids):
+    try:
+        return sorted({int(user_id) for user_id in user_ids})
+    except (TypeError, ValueError) as e:
+        raise MembershipError("User IDs must be integers.") from e
+
+
+def validate_friend_ids(user_id, user_ids):
+    """
+    Sprawdza jednym zapytaniem (friend_id IN (...)), czy wszyscy podani użytkownicy są znajomymi user_id.
+    Zwraca posortowaną listę identyfikatorów albo zgłasza MembershipError z listą niedozwolonych.
+    """
+    user_ids = _parse_user_ids(user_ids)
+    if not user_ids:
+        return []
+
+    friends = set(db.session.execute(
+        select(Friends.friend_id).where(Friends.user_id == user_id, Friends.friend_id.in_(user_ids))
+    ).scalars())
+
+    not_friends = [candidate for candidate in user_ids if candidate not in friends]
+    if not_friends:
+        raise MembershipError("Only your friends can be added to a group.", {'notFriends': not_friends})
+    return user_ids
+
+
+def _insert_members(group_id, user_ids):
+    """
+    Dopisuje członków jednym poleceniem INSERT z wieloma wierszami, pomijając tych, którzy już są w grupie.
+    Zwraca identyfikatory faktycznie dodanych.
+    """
+    if not user_ids:
+        return []
+
+    stmt = (
+        insert(UserGroup)
+        .values([{'user_id': user_id, 'group_id': group_id} for user_id in user_ids])
+        .on_conflict_do_nothing(index_elements=[UserGroup.user_id, UserGroup.group_id])
+        .returning(UserGroup.user_id)
+    )
+    added = sorted(db.session.execute(stmt).scalars())
+    membership_changed(group_id, added)
+    return added
+
+
+def create_group_with_members(name, creator_id, friend_ids):
+    """
+    Tworzy grupę razem z członkami (twórca i wybrani znajomi) w bieżącej transakcji: jedno zapytanie
+    sprawdzające znajomych i jeden INSERT do usergroups. Zgłasza MembershipError, jeśli ktoś nie jest znajomym.
+    """
+    friend_ids = validate_friend_ids(creator_id, friend_ids)
+
+    group = Group(name=name, created_by=creator_id)
+    db.session.add(group)
+    db.session.flush()
+
+    _insert_members(group.id, [creator_id] + [friend_id for friend_id in friend_ids if friend_id != creator_id])
+    return group
+
+
+def add_members(group, actor_id, user_ids):
+    """
+    Dodaje do grupy znajomych użytkownika actor_id (członka grupy). Zwraca identyfikatory dodanych -
+    osoby, które już są w grupie, są pomijane.
+    """
+    return _insert_members(group.id, validate_friend_ids(actor_id, user_ids))
+
+
+def find_open_balances(group_id, user_ids):
+    """
+    Zwraca niezerowe salda podanych członków w grupie jako {user_id: [(other_user_id, currency, amount), ...]}.
+    Jedno zapytanie do groupbalances (salda są zapisane w obu kierunkach, więc wystarczy strona dłużnika).
+    """
+    rows = db.session.execute(
+        select(GroupBalance.debtor_id, GroupBalance.creditor_id, GroupBalance.currency, GroupBalance.amount)
+        .where(GroupBalance.group_id == group_id,
+               GroupBalance.debtor_id.in_(user_ids),
+               GroupBalance.amount != 0)
+        .order_by(GroupBalance.debtor_id, GroupBalance.creditor_id, GroupBalance.currency)
+    ).all()
+
+    balances = {}
+    for debtor_id, creditor_id, currency, amount in rows:
+        balances.setdefault(debtor_id, []).append((creditor_id, currency, amount))
+    return balances
+
+
+def find_members_with_history(group_id, user_ids):
+    """
+    Zwraca posortowaną listę tych spośród user_ids, którzy mają w grupie udział w wydatku (jako uczestnik
+    lub płatnik) albo spłatę (jako płacący lub odbiorca). Jedno zapytanie (UNION czterech podzapytań).
+    """
+    shares = select(ExpenseShare.user_id.label('user_id'), ExpenseShare.paid_by.label('paid_by')) \
+        .join(Expense, Expense.id == ExpenseShare.expense_id) \
+        .where(Expense.group_id == group_id) \
+        .subquery()
+
+    return sorted(db.session.execute(union(
+        select(shares.c.user_id).where(shares.c.user_id.in_(user_ids)),
+        select(shares.c.paid_by).where(shares.c.paid_by.in_(user_ids)),
+        select(Settlement.payer_id).where(Settlement.group_id == group_id, Settlement.payer_id.in_(user_ids)),
+        select(Settlement.receiver_id).where(Settlement.group_id == group_id, Settlement.receiver_id.in_(user_ids)),
+    )).scalars())
+
+
+def remove_members(group, actor_id, user_ids):
+    """
+    Usuwa członków z grupy jednym poleceniem DELETE. Twórca grupy może usuwać innych, a pozostali członkowie
+    tylko siebie; twórcy nie można usunąć. Usunięcie jest odrzucane (MembershipError), dopóki którykolwiek
+    z usuwanych ma niezerowe saldo w grupie, a także gdy ma w grupie jakiekolwiek wydatki lub spłaty -
+    salda (calculate_balance, groupbalances) i cofanie wydatków przy edycji pomijają udziały osób spoza grupy,
+    więc usunięcie kogoś z historią zmieniłoby salda pozostałych. Zwraca identyfikatory usuniętych.
+    """
+    user_ids = _parse_user_ids(user_ids)
+    if not user_ids:
+        return []
+
+    if group.created_by in user_ids:
+        raise MembershipError("The group creator cannot be removed from the group.")
+    if actor_id != group.created_by and user_ids != [actor_id]:
+        raise MembershipError("Only the group creator can remove other members.")
+
+    open_balances = find_open_balances(group.id, user_ids)
+    if open_balances:
+        names = dict(db.session.execute(select(User.id, User.username).where(User.id.in_(open_balances))).all())
+        raise MembershipError(
+            f"Settle up first: {', '.join(names[user_id] for user_id in sorted(open_balances))} "
+            f"still {'has' if len(open_balances) == 1 else 'have'} a non-zero balance in this group.",
+            {'openBalances': {
+                user_id: [{'otherUserId': other_id, 'currency': currency, 'amount': str(amount)}
+                          for other_id, currency, amount in balances]
+                for user_id, balances in open_balances.items()
+            }}
+        )
+
+    with_history = find_members_with_history(group.id, user_ids)
+    if with_history:
+        names = dict(db.session.execute(select(User.id, User.username).where(User.id.in_(with_history))).all())
+        raise MembershipError(
+            f"{', '.join(names[user_id] for user_id in with_history)} "
+            f"{'has' if len(with_history) == 1 else 'have'} expenses or settlements in this group "
+            f"and cannot be removed.",
+            {'withHistory': with_history}
+        )
+
+    removed = sorted(db.session.execute(
+        delete(UserGroup)
+        .where(UserGroup.group_id == group.id, UserGroup.user_id.in_(user_ids))
+        .returning(UserGroup.user_id)
+    ).scalars())
+    membership_changed(group.id, removed)
+    return removed
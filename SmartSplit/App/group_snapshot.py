@@ -0,0 +1,52 @@
+from sqlalchemy.orm import selectinload
+from models import Group, Expense, ExpenseShare
+from balance_ledger import read_balance
+from feeds import get_expense_feed, get_settlement_feed
+
+
+def load_group(group_id):
+    """
+    Wczytuje grupę razem z członkami, wydatkami, udziałami, płatnikami i spłatami w stałej liczbie zapytań,
+    niezależnej od liczby wydatków.
+    """
+    return (
+        Group.query
+        .options(
+            selectinload(Group.members),
+            selectinload(Group.expenses).selectinload(Expense.shares).selectinload(ExpenseShare.payer),
+            selectinload(Group.settlements),
+        )
+        .filter(Group.id == group_id)
+        .first()
+    )
+
+
+def load_group_snapshot(group_id):
+    """
+    Przygotowuje dane strony szczegółów grupy: członków, saldo (z tabeli groupbalances) i pierwsze strony
+    wydatków oraz spłat. Kolejne strony strona pobiera z feedów JSON, więc koszt nie rośnie z wiekiem grupy.
+    """
+    group = (
+        Group.query
+        .options(selectinload(Group.members))
+        .filter(Group.id == group_id)
+        .first()
+    )
+
+    if not group:
+        return None
+
+    members = {member.id: member for member in group.members}
+    expenses, expenses_cursor = get_expense_feed(group.id)
+    settlements, settlements_cursor = get_settlement_feed(group.id)
+    balance_sheet = read_balance(group.id)
+
+    return {
+        "group": group,
+        "members": members,
+        "expenses": expenses,
+        "expenses_cursor": expenses_cursor,
+        "settlements": settlements,
+        "settlements_cursor": settlements_cursor,
+        "balance_sheet": balance_sheet,
+    }
@@ -0,0 +1,210 @@
+import cProfile
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Parametry zapytania w nawiasach (np. rozwinięte IN (...) albo VALUES (...)) i liczby w treści zapytania -
+# zastępowane, żeby zapytania różniące się tylko wartościami miały ten sam kształt
+_PARAMETER_LIST = re.compile(r"\(\s*(?:%\(\w+\)s|\?)(?:\s*,\s*(?:%\(\w+\)s|\?))*\s*\)")
+_PARAMETER_NAME = re.compile(r"%\(\w+\)s")
+_NUMBER = re.compile(r"\b\d+\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement):
+    """
+    Zwraca kształt zapytania SQL: treść bez wartości parametrów, z jednym znakiem zapytania w miejsce listy
+    parametrów i liczb. Zapytania wykonywane w pętli dla kolejnych obiektów (wzorzec N+1) mają ten sam kształt.
+    """
+    shape = _WHITESPACE.sub(' ', statement).strip()
+    shape = _PARAMETER_LIST.sub('(?)', shape)
+    shape = _PARAMETER_NAME.sub('?', shape)
+    return _NUMBER.sub('?', shape)
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class RequestMetrics:
+    """
+    Metryki żądań zbierane w pamięci procesu, per endpoint Flask: histogram czasu odpowiedzi, liczba
+    i łączny czas zapytań SQL oraz liczba żądań z podejrzeniem N+1. Bezpieczne wątkowo.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._lock = threading.Lock()
+        self._bucket_counts = defaultdict(lambda: [0] * len(self.buckets))
+        self._requests = Counter()
+        self._duration_sum = defaultdict(float)
+        self._sql_queries = Counter()
+        self._sql_seconds = defaultdict(float)
+        self._n_plus_one = Counter()
+        self._statuses = Counter()
+
+    def observe(self, endpoint, status, duration, sql_queries, sql_seconds, n_plus_one):
+        with self._lock:
+            counts = self._bucket_counts[endpoint]
+            for index, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    counts[index] += 1
+            self._requests[endpoint] += 1
+            self._duration_sum[endpoint] += duration
+            self._sql_queries[endpoint] += sql_queries
+            self._sql_seconds[endpoint] += sql_seconds
+            self._statuses[(endpoint, status)] += 1
+            if n_plus_one:
+                self._n_plus_one[endpoint] += 1
+
+    def render(self):
+        """
+        Zwraca metryki w formacie tekstowym Prometheus (text/plain; version=0.0.4).
+        """
+        with self._lock:
+            lines = [
+                '# HELP smartsplit_request_duration_seconds Request latency per endpoint.',
+                '# TYPE smartsplit_request_duration_seconds histogram',
+            ]
+            for endpoint in sorted(self._requests):
+                label = _escape_label(endpoint)
+                for bound, count in zip(self.buckets, self._bucket_counts[endpoint]):
+                    lines.append(f'smartsplit_request_duration_seconds_bucket{{endpoint="{label}",'
+                                 f'le="{_format_number(bound)}"}} {count}')
+                lines.append(f'smartsplit_request_duration_seconds_sum{{endpoint="{label}"}} '
+                             f'{_format_number(self._duration_sum[endpoint])}')
+                lines.append(f'smartsplit_request_duration_seconds_count{{endpoint="{label}"}} '
+                             f'{self._requests[endpoint]}')
+
+            lines += [
+                '# HELP smartsplit_requests_total Requests per endpoint and response status.',
+                '# TYPE smartsplit_requests_total counter',
+            ]
+            for (endpoint, status), count in sorted(self._statuses.items()):
+                lines.append(f'smartsplit_requests_total{{endpoint="{_escape_label(endpoint)}",'
+                             f'status="{status}"}} {count}')
+
+            for name, help_text, values in (
+                ('smartsplit_sql_queries_total', 'SQL statements executed while handling requests.',
+                 self._sql_queries),
+                ('smartsplit_sql_seconds_total', 'Time spent in SQL statements while handling requests.',
+                 self._sql_seconds),
+                ('smartsplit_n_plus_one_requests_total',
+                 'Requests that repeated one statement shape more than N_PLUS_ONE_THRESHOLD times.',
+                 self._n_plus_one),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                for endpoint in sorted(values):
+                    lines.append(f'{name}{{endpoint="{_escape_label(endpoint)}"}} {_format_number(values[endpoint])}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql_stats' in g:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    if not has_request_context() or 'sql_stats' not in g:
+        return
+
+    stats = g.sql_stats
+    stats['queries'] += 1
+    stats['seconds'] += elapsed
+    stats['shapes'][statement_shape(statement)] += 1
+
+
+def _handle_error(exception_context):
+    # Zapytanie zakończone błędem nie wywołuje after_cursor_execute - jego czas startu trzeba zdjąć ze stosu
+    started = exception_context.connection.info.get('query_started') if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def _start_request():
+    g.request_started = time.perf_counter()
+    g.sql_stats = {'queries': 0, 'seconds': 0.0, 'shapes': Counter()}
+
+    config = current_app.config
+    if config.get('PROFILE_SLOW_REQUESTS'):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Inny profiler jest już aktywny (np. w debuggerze) - to żądanie nie będzie profilowane
+            return
+        g.profiler = profiler
+
+
+def _remember_status(response):
+    g.response_status = response.status_code
+    return response
+
+
+def _finish_request(exception):
+    started = g.pop('request_started', None)
+    stats = g.pop('sql_stats', None)
+    if started is None or stats is None:
+        return
+
+    duration = time.perf_counter() - started
+    endpoint = request.endpoint or 'unmatched'
+    config = current_app.config
+
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        if duration >= config['PROFILE_THRESHOLD']:
+            os.makedirs(config['PROFILE_DIR'], exist_ok=True)
+            path = os.path.join(config['PROFILE_DIR'],
+                                f"{endpoint}-{time.strftime('%Y%m%d-%H%M%S')}-{int(duration * 1000)}ms.prof")
+            profiler.dump_stats(path)
+            current_app.logger.warning("Slow request %s %s took %.0f ms, profile saved to %s",
+                                       request.method, request.path, duration * 1000, path)
+
+    n_plus_one = False
+    if stats['shapes']:
+        shape, repeats = stats['shapes'].most_common(1)[0]
+        if repeats > config['N_PLUS_ONE_THRESHOLD']:
+            n_plus_one = True
+            current_app.logger.warning("Possible N+1 in %s %s: the same statement ran %d times (%d queries in total): %s",
+                                       request.method, request.path, repeats, stats['queries'], shape[:300])
+
+    status = g.pop('response_status', 500 if exception is not None else 200)
+    current_app.extensions['request_metrics'].observe(endpoint, status, duration, stats['queries'],
+                                                      stats['seconds'], n_plus_one)
+
+
+def init_instrumentation(app):
+    """
+    Włącza pomiar żądań aplikacji: czas odpowiedzi per endpoint, liczbę i czas zapytań SQL (zdarzenia silnika
+    SQLAlchemy), wykrywanie wzorca N+1 (ten sam kształt zapytania więcej niż N_PLUS_ONE_THRESHOLD razy
+    w jednym żądaniu) i opcjonalnie profil cProfile żądań wolniejszych niż PROFILE_THRESHOLD.
+    Metryki są dostępne przez app.extensions['request_metrics'].
+    """
+    app.extensions['request_metrics'] = RequestMetrics(app.config['METRICS_LATENCY_BUCKETS'])
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+    app.before_request(_start_request)
+    app.after_request(_remember_status)
+    app.teardown_request(_finish_request)
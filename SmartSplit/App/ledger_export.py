@@ -0,0 +1,122 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import Date, Numeric, cast, literal, select
+from sqlalchemy.orm import aliased
+from models import db, User, Expense, ExpenseShare, Settlement
+from charts import _rate_to_pln
+
+EXPORT_KINDS = ('expenses', 'shares', 'settlements')
+EXPORT_FORMATS = ('csv', 'ndjson')
+# Ile wierszy naraz pobierać z kursora po stronie serwera
+EXPORT_BATCH_SIZE = 1000
+
+
+def _converted(amount, currency, day, base_currency):
+    return cast(amount * _rate_to_pln(currency, day) / _rate_to_pln(literal(base_currency), day), Numeric(14, 2))
+
+
+def _export_statement(kind, group_id, base_currency=None):
+    """
+    Zwraca zapytanie eksportu danego rodzaju (wydatki, udziały albo spłaty) dla grupy, posortowane po dacie.
+    Z base_currency dochodzi kolumna z kwotą przeliczoną po kursie z dnia operacji.
+    """
+    if kind == 'expenses':
+        author = aliased(User)
+        columns = [
+            Expense.id, Expense.created_at, Expense.description, Expense.category, Expense.amount,
+            Expense.currency, Expense.created_by, author.username.label('created_by_name'),
+        ]
+        if base_currency:
+            columns.append(_converted(Expense.amount, Expense.currency, cast(Expense.created_at, Date), base_currency)
+                           .label(f'amount_{base_currency.lower()}'))
+        return (
+            select(*columns)
+            .outerjoin(author, author.id == Expense.created_by)
+            .where(Expense.group_id == group_id)
+            .order_by(Expense.created_at, Expense.id)
+        )
+
+    if kind == 'shares':
+        member = aliased(User)
+        columns = [
+            ExpenseShare.expense_id, Expense.created_at, ExpenseShare.user_id, member.username,
+            ExpenseShare.share, Expense.currency, ExpenseShare.paid_by,
+        ]
+        if base_currency:
+            columns.append(_converted(ExpenseShare.share, Expense.currency, cast(Expense.created_at, Date),
+                                      base_currency).label(f'share_{base_currency.lower()}'))
+        return (
+            select(*columns)
+            .join(Expense, Expense.id == ExpenseShare.expense_id)
+            .join(member, member.id == ExpenseShare.user_id)
+            .where(Expense.group_id == group_id)
+            .order_by(Expense.created_at, ExpenseShare.expense_id, ExpenseShare.user_id)
+        )
+
+    if kind == 'settlements':
+        payer = aliased(User)
+        receiver = aliased(User)
+        columns = [
+            Settlement.id, Settlement.date, Settlement.payer_id, payer.username.label('payer_name'),
+            Settlement.receiver_id, receiver.username.label('receiver_name'), Settlement.amount, Settlement.currency,
+        ]
+        if base_currency:
+            columns.append(_converted(Settlement.amount, Settlement.currency, cast(Settlement.date, Date),
+                                      base_currency).label(f'amount_{base_currency.lower()}'))
+        return (
+            select(*columns)
+            .join(payer, payer.id == Settlement.payer_id)
+            .join(receiver, receiver.id == Settlement.receiver_id)
+            .where(Settlement.group_id == group_id)
+            .order_by(Settlement.date, Settlement.id)
+        )
+
+    raise ValueError(f"Unknown export kind: {kind}")
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def stream_export(kind, group_id, export_format='csv', base_currency=None, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Generator kolejnych fragmentów eksportu (CSV z nagłówkiem albo NDJSON - jeden obiekt JSON w wierszu).
+    Wiersze są czytane kursorem po stronie serwera (yield_per) i wysyłane partiami, więc zużycie pamięci
+    nie zależy od liczby wierszy w grupie.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+
+    statement = _export_statement(kind, group_id, base_currency)
+    result = db.session.execute(statement.execution_options(yield_per=batch_size))
+    columns = list(result.keys())
+
+    try:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if export_format == 'csv':
+            writer.writerow(columns)
+
+        for partition in result.partitions():
+            for row in partition:
+                if export_format == 'csv':
+                    writer.writerow([_plain(value) for value in row])
+                else:
+                    buffer.write(json.dumps(dict(zip(columns, map(_plain, row)))))
+                    buffer.write('\n')
+
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        result.close()
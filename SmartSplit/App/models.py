@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from money import Money, MoneyAmount
 import uuid
 
 db = SQLAlchemy()
@@ -6,6 +7,10 @@ db = SQLAlchemy()
 
 class Friends(db.Model):
     __tablename__ = 'friends'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'friend_id', name='unique_friendship'),
+        db.Index('friends_friend_id_idx', 'friend_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -40,6 +45,9 @@ class User(db.Model):
 
 class UserGroup(db.Model):
     __tablename__ = 'usergroups'
+    __table_args__ = (
+        db.Index('usergroups_group_id_idx', 'group_id'),
+    )
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
     group_id = db.Column(db.Integer, db.ForeignKey('groups.id'), primary_key=True)
     joined_at = db.Column(db.DateTime, default=db.func.now())
@@ -50,6 +58,7 @@ class Group(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    data_version = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
 
     expenses = db.relationship('Expense', back_populates='group', cascade="all, delete-orphan")
 
@@ -67,16 +76,21 @@ class Group(db.Model):
 
 class Expense(db.Model):
     __tablename__ = 'expenses'
+    __table_args__ = (
+        db.Index('expenses_group_id_created_at_id_idx', 'group_id', 'created_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     group_id = db.Column(db.Integer, db.ForeignKey('groups.id'))
     description = db.Column(db.String(255))
-    amount = db.Column(db.Float, nullable=False)
+    amount = db.Column(MoneyAmount(10), nullable=False)
     currency = db.Column(db.String(3), nullable=False)
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
-    created_at = db.Column(db.DateTime, default=db.func.now())
+    created_at = db.Column(db.DateTime, default=db.func.now(), nullable=False)
     category = db.Column(db.String(50), nullable=True)
     custom_split = db.Column(db.Boolean, default=False)
+    # Kwota wydatku jako Money (grosze + waluta)
+    money = db.composite(Money.from_amount, amount, currency)
 
     shares = db.relationship('ExpenseShare', back_populates='expense', cascade="all, delete-orphan")
     group = db.relationship('Group', back_populates='expenses')
@@ -84,32 +98,69 @@ class Expense(db.Model):
 
 class ExpenseShare(db.Model):
     __tablename__ = 'expenseshares'
+    __table_args__ = (
+        db.Index('expenseshares_user_id_idx', 'user_id'),
+        db.Index('expenseshares_paid_by_idx', 'paid_by'),
+    )
 
     expense_id = db.Column(db.Integer, db.ForeignKey('expenses.id'), primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
-    share = db.Column(db.Numeric(10, 2), nullable=False)
+    share = db.Column(MoneyAmount(10), nullable=False)
     paid_by = db.Column(db.Integer, db.ForeignKey('users.id'))
 
-    expense = db.relationship('Expense', back_populates='shares')\
-
+    expense = db.relationship('Expense', back_populates='shares')
+    payer = db.relationship('User', foreign_keys=[paid_by])
 
 
 class Settlement(db.Model):
     __tablename__ = 'settlement'
+    __table_args__ = (
+        db.Index('settlement_group_id_date_id_idx', 'group_id', 'date', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     group_id = db.Column(db.Integer, db.ForeignKey('groups.id'), nullable=False)
     payer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     receiver_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    amount = db.Column(db.Numeric(10, 2), nullable=False)
-    date = db.Column(db.DateTime, default=db.func.now())
+    amount = db.Column(MoneyAmount(10), nullable=False)
+    date = db.Column(db.DateTime, default=db.func.now(), nullable=False)
     currency = db.Column(db.String(10), nullable=False, default='PLN')
+    # Kwota spłaty jako Money (grosze + waluta)
+    money = db.composite(Money.from_amount, amount, currency)
 
     payer = db.relationship('User', foreign_keys=[payer_id])
     receiver = db.relationship('User', foreign_keys=[receiver_id])
     group = db.relationship('Group', backref=db.backref('settlements', lazy=True))
 
 
+class GroupBalance(db.Model):
+    __tablename__ = 'groupbalances'
+
+    group_id = db.Column(db.Integer, db.ForeignKey('groups.id'), primary_key=True)
+    debtor_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    creditor_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    currency = db.Column(db.String(10), primary_key=True)
+    amount = db.Column(MoneyAmount(12), nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<GroupBalance {self.debtor_id} -> {self.creditor_id}: {self.amount} {self.currency}>"
+
+
+class ExpenseRollup(db.Model):
+    __tablename__ = 'expenserollups'
+
+    group_id = db.Column(db.Integer, db.ForeignKey('groups.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)
+    category = db.Column(db.String(50), primary_key=True, default='')
+    currency = db.Column(db.String(3), primary_key=True)
+    spent = db.Column(MoneyAmount(12), nullable=False, default=0)
+    share = db.Column(MoneyAmount(12), nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ExpenseRollup {self.group_id}/{self.user_id} {self.month} {self.category}: {self.spent} {self.currency}>"
+
+
 class Currency(db.Model):
     __tablename__ = 'currencies'
 
@@ -121,8 +172,22 @@ class Currency(db.Model):
         return f"<Currency {self.currency_code}: {self.exchange_rate} (updated {self.last_updated})>"
 
 
+class CurrencyRate(db.Model):
+    __tablename__ = 'currencyrates'
+
+    currency_code = db.Column(db.String(3), primary_key=True)
+    rate_date = db.Column(db.Date, primary_key=True)
+    exchange_rate = db.Column(db.Numeric(10, 6), nullable=False)
+
+    def __repr__(self):
+        return f"<CurrencyRate {self.currency_code} {self.rate_date}: {self.exchange_rate}>"
+
+
 class FriendRequest(db.Model):
     __tablename__ = 'friendrequest'
+    __table_args__ = (
+        db.Index('friendrequest_recipient_id_status_idx', 'recipient_id', 'status'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -133,3 +198,27 @@ class FriendRequest(db.Model):
 
     sender = db.relationship('User', foreign_keys=[sender_id])
     recipient = db.relationship('User', foreign_keys=[recipient_id])
+
+
+class OutgoingEmail(db.Model):
+    __tablename__ = 'emailoutbox'
+    __table_args__ = (
+        db.Index('emailoutbox_pending_idx', 'next_attempt_at', postgresql_where=db.text("status = 'pending'")),
+        db.Index('emailoutbox_dedup_idx', 'dedup_key', 'created_at'),
+        db.Index('emailoutbox_recipient_sent_idx', 'recipient', 'sent_at', postgresql_where=db.text("status = 'sent'")),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    dedup_key = db.Column(db.String(200))
+    status = db.Column(db.String(20), default='pending', nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=db.func.now(), nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=db.func.now(), nullable=False)
+    sent_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f"<OutgoingEmail {self.id} to {self.recipient}: {self.status}>"
@@ -0,0 +1,203 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from sqlalchemy import Numeric
+from sqlalchemy.types import TypeDecorator
+
+_ONE = Decimal(1)
+
+
+def to_cents(value):
+    """
+    Zamienia kwotę (Money, Decimal, int albo tekst) na liczbę groszy, zaokrąglając połówki w górę.
+    Kwoty z bazy (numeric z dwoma miejscami po przecinku) są zamieniane dokładnie, bez zaokrąglania.
+    Float nie jest akceptowany - jego wartość dziesiętna nie jest dokładna.
+    """
+    if type(value) is not Decimal:
+        if isinstance(value, Money):
+            return value.cents
+        if isinstance(value, float):
+            raise TypeError("Money amounts must not be floats")
+        try:
+            value = Decimal(str(value).strip())
+        except InvalidOperation as e:
+            raise ValueError(f"Invalid amount: {value!r}") from e
+    if not value.is_finite():
+        raise ValueError(f"Invalid amount: {value!r}")
+
+    numerator, denominator = value.as_integer_ratio()
+    if 100 % denominator == 0:
+        return numerator * (100 // denominator)
+    return int(value.scaleb(2).quantize(_ONE, rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    """
+    Zamienia liczbę groszy na Decimal z dwoma miejscami po przecinku.
+    """
+    return Decimal(cents).scaleb(-2)
+
+
+class Money:
+    """
+    Kwota pieniężna przechowywana jako całkowita liczba groszy (jednostek podrzędnych) i kod waluty.
+    Dodawanie, odejmowanie i mnożenie przez liczbę całkowitą są dokładne, a podział kwoty (allocate)
+    zawsze sumuje się do kwoty wyjściowej. Operacje na kwotach w różnych walutach zgłaszają ValueError.
+    """
+    __slots__ = ('cents', 'currency')
+
+    def __init__(self, cents, currency='PLN'):
+        if not isinstance(cents, int):
+            raise TypeError(f"Money needs an integer number of cents, got {cents!r}")
+        self.cents = cents
+        self.currency = currency
+
+    @classmethod
+    def parse(cls, value, currency='PLN'):
+        """
+        Tworzy kwotę z wartości podanej przez użytkownika lub odczytanej z bazy (np. '12.345' -> 12.35).
+        """
+        return cls(to_cents(value), currency)
+
+    @classmethod
+    def from_amount(cls, amount, currency):
+        """
+        Fabryka dla kolumn (amount, currency) - używana przez composite w modelach. Brak kwoty daje None.
+        """
+        if amount is None:
+            return None
+        return cls(to_cents(amount), currency)
+
+    @property
+    def amount(self):
+        return from_cents(self.cents)
+
+    def __composite_values__(self):
+        return self.amount, self.currency
+
+    def _check_currency(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        if other.currency != self.currency:
+            raise ValueError(f"Currency mismatch: {self.currency} and {other.currency}")
+        return other
+
+    def __add__(self, other):
+        if isinstance(other, int) and other == 0:
+            # sum() zaczyna od 0
+            return self
+        other = self._check_currency(other)
+        if other is NotImplemented:
+            return other
+        return Money(self.cents + other.cents, self.currency)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        other = self._check_currency(other)
+        if other is NotImplemented:
+            return other
+        return Money(self.cents - other.cents, self.currency)
+
+    def __neg__(self):
+        return Money(-self.cents, self.currency)
+
+    def __mul__(self, factor):
+        if not isinstance(factor, int):
+            return NotImplemented
+        return Money(self.cents * factor, self.currency)
+
+    __rmul__ = __mul__
+
+    def __eq__(self, other):
+        if isinstance(other, Money):
+            return self.cents == other.cents and self.currency == other.currency
+        if isinstance(other, int) and other == 0:
+            return self.cents == 0
+        return NotImplemented
+
+    def __lt__(self, other):
+        other = self._check_currency(other)
+        if other is NotImplemented:
+            return other
+        return self.cents < other.cents
+
+    def __le__(self, other):
+        other = self._check_currency(other)
+        if other is NotImplemented:
+            return other
+        return self.cents <= other.cents
+
+    def __gt__(self, other):
+        other = self._check_currency(other)
+        if other is NotImplemented:
+            return other
+        return self.cents > other.cents
+
+    def __ge__(self, other):
+        other = self._check_currency(other)
+        if other is NotImplemented:
+            return other
+        return self.cents >= other.cents
+
+    def __hash__(self):
+        return hash((self.cents, self.currency))
+
+    def __bool__(self):
+        return self.cents != 0
+
+    def __str__(self):
+        return str(self.amount)
+
+    def __repr__(self):
+        return f"<Money {self.amount} {self.currency}>"
+
+    def allocate(self, weights):
+        """
+        Dzieli kwotę proporcjonalnie do wag (nieujemnych liczb całkowitych) metodą największych reszt:
+        każdy dostaje część całkowitą swojego udziału w groszach, a pozostałe grosze trafiają do pozycji
+        z największymi resztami (przy remisie - do wcześniejszych). Suma części jest zawsze równa kwocie.
+        """
+        weights = list(weights)
+        total_weight = sum(weights)
+        if not weights or total_weight <= 0 or any(weight < 0 for weight in weights):
+            raise ValueError("Allocation weights must be non-negative and sum to a positive number")
+
+        sign = -1 if self.cents < 0 else 1
+        cents = abs(self.cents)
+
+        parts = []
+        remainders = []
+        for index, weight in enumerate(weights):
+            part, remainder = divmod(cents * weight, total_weight)
+            parts.append(part)
+            remainders.append((-remainder, index))
+
+        for _, index in sorted(remainders)[:cents - sum(parts)]:
+            parts[index] += 1
+
+        return [Money(part * sign, self.currency) for part in parts]
+
+    def convert(self, rate, currency):
+        """
+        Przelicza kwotę po kursie (Decimal: ile jednostek waluty docelowej za jednostkę tej waluty),
+        zaokrąglając wynik do pełnych groszy.
+        """
+        if currency == self.currency:
+            return self
+        return Money(int((self.cents * rate).quantize(_ONE, rounding=ROUND_HALF_UP)), currency)
+
+
+class MoneyAmount(TypeDecorator):
+    """
+    Typ kolumny kwoty: numeric z dwoma miejscami po przecinku. Przyjmuje Money, Decimal, int albo tekst
+    (zaokrąglając do groszy) i odrzuca float, więc do bazy nie trafiają kwoty binarne.
+    """
+    impl = Numeric
+    cache_ok = True
+
+    def __init__(self, precision=10):
+        super().__init__(precision=precision, scale=2)
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return from_cents(to_cents(value))
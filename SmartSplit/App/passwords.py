@@ -0,0 +1,145 @@
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+from caching import LRUCache
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_slots = None
+
+
+class PasswordHashingBusy(RuntimeError):
+    """
+    Wszystkie miejsca w kolejce haszowania są zajęte - żądanie należy odrzucić zamiast czekać.
+    """
+
+
+def _get_pool():
+    """
+    Zwraca pulę procesów do haszowania haseł (PASSWORD_HASH_WORKERS procesów, uruchamianych metodą spawn,
+    więc nie dziedziczą wątków ani połączeń z bazą) i semafor ograniczający liczbę oczekujących zadań
+    do PASSWORD_HASH_QUEUE_LIMIT. Przy PASSWORD_HASH_WORKERS = 0 haszowanie odbywa się w wątku żądania.
+    """
+    global _pool, _pool_slots
+
+    config = current_app.config
+    if not config['PASSWORD_HASH_WORKERS']:
+        return None, None
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=config['PASSWORD_HASH_WORKERS'],
+                                        mp_context=multiprocessing.get_context('spawn'))
+            _pool_slots = threading.BoundedSemaphore(config['PASSWORD_HASH_QUEUE_LIMIT'])
+        return _pool, _pool_slots
+
+
+def _run_hashing(fn, *args):
+    pool, slots = _get_pool()
+    if pool is None:
+        return fn(*args)
+
+    if not slots.acquire(blocking=False):
+        raise PasswordHashingBusy("Too many password checks in progress")
+    try:
+        future = pool.submit(fn, *args)
+    except Exception:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    return future.result(timeout=current_app.config['PASSWORD_HASH_TIMEOUT'])
+
+
+def hash_password(password):
+    """
+    Haszuje hasło według bieżącej polityki (PASSWORD_HASH_METHOD, PASSWORD_SALT_LENGTH) w puli procesów.
+    """
+    config = current_app.config
+    return _run_hashing(generate_password_hash, password, config['PASSWORD_HASH_METHOD'],
+                        config['PASSWORD_SALT_LENGTH'])
+
+
+def verify_password(password_hash, password):
+    """
+    Sprawdza hasło z zapisanym hashem w puli procesów, więc wątek żądania nie liczy PBKDF2/scrypt sam.
+    Zgłasza PasswordHashingBusy, gdy kolejka haszowania jest pełna.
+    """
+    return _run_hashing(check_password_hash, password_hash, password)
+
+
+@lru_cache(maxsize=8)
+def _canonical_method(method, salt_length):
+    # Metoda bez parametrów (np. 'scrypt' albo 'pbkdf2:sha256') jest zapisywana w hashu z domyślnymi
+    # parametrami werkzeug - porównujemy z tym, co faktycznie trafiłoby do bazy
+    return generate_password_hash('', method, salt_length).split('$', 1)[0]
+
+
+def needs_rehash(password_hash):
+    """
+    Sprawdza, czy hash powstał według innej polityki niż bieżąca (inna metoda, liczba iteracji
+    lub długość soli). Takie hasła są haszowane ponownie przy najbliższym udanym logowaniu.
+    """
+    config = current_app.config
+    method, _, rest = password_hash.partition('$')
+    salt, _, _ = rest.partition('$')
+    return (method != _canonical_method(config['PASSWORD_HASH_METHOD'], config['PASSWORD_SALT_LENGTH'])
+            or len(salt) != config['PASSWORD_SALT_LENGTH'])
+
+
+class LoginThrottle:
+    """
+    Limit nieudanych prób logowania w przesuwanym oknie czasowym, osobno dla konta (adresu e-mail)
+    i adresu IP. Sprawdzany przed wyszukaniem użytkownika i haszowaniem, więc odrzucenie nadmiarowej
+    próby prawie nic nie kosztuje. Liczniki są trzymane w pamięci procesu (ograniczonej LRUCache).
+    """
+
+    def __init__(self, maxsize=10000):
+        self._attempts = LRUCache(maxsize)
+        self._lock = threading.Lock()
+
+    def _recent(self, key, window, now):
+        attempts = self._attempts.get(key)
+        if attempts is None:
+            return None
+        while attempts and attempts[0] <= now - window:
+            attempts.popleft()
+        return attempts
+
+    def retry_after(self, email, ip):
+        """
+        Zwraca liczbę sekund do ponownej próby, jeśli konto lub adres IP wyczerpały limit, albo None.
+        """
+        config = current_app.config
+        now = time.monotonic()
+        limits = (
+            (('account', (email or '').strip().lower()), config['LOGIN_ACCOUNT_MAX_FAILURES'], config['LOGIN_ACCOUNT_WINDOW']),
+            (('ip', ip), config['LOGIN_IP_MAX_FAILURES'], config['LOGIN_IP_WINDOW']),
+        )
+        with self._lock:
+            waits = []
+            for key, limit, window in limits:
+                attempts = self._recent(key, window, now)
+                if attempts is not None and len(attempts) >= limit:
+                    waits.append(attempts[0] + window - now)
+        return max(1, int(max(waits)) + 1) if waits else None
+
+    def record_failure(self, email, ip):
+        config = current_app.config
+        now = time.monotonic()
+        with self._lock:
+            for key, limit in ((('account', (email or '').strip().lower()), config['LOGIN_ACCOUNT_MAX_FAILURES']),
+                               (('ip', ip), config['LOGIN_IP_MAX_FAILURES'])):
+                attempts = self._attempts.get(key)
+                if attempts is None:
+                    attempts = deque(maxlen=limit)
+                    self._attempts.set(key, attempts)
+                attempts.append(now)
+
+    def reset_account(self, email):
+        with self._lock:
+            self._attempts.pop(('account', (email or '').strip().lower()))
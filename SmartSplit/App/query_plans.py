@@ -0,0 +1,105 @@
+import json
+from datetime import datetime
+from sqlalchemy import event, text
+from models import db, Group
+from access import _get_membership_cache, is_group_member
+from balance_ledger import read_balance, read_debtors, read_net_positions
+from charts import get_charts_data_from_expenses, get_charts_data_from_rollup
+from group_snapshot import load_group_snapshot
+from feeds import encode_cursor, get_expense_feed, get_settlement_feed
+from dashboard_summary import get_dashboard_summary, get_dashboard_version
+from friend_suggestions import get_friend_suggestions, get_mutual_friends
+from vectorized_balance import load_balance_columns
+
+# Tabele, które rosną razem z liczbą użytkowników i wydatków - pełny skan którejkolwiek z nich to regresja
+WATCHED_TABLES = {
+    'expenses', 'expenseshares', 'settlement', 'usergroups', 'friends', 'friendrequest',
+    'groupbalances', 'expenserollups', 'emailoutbox',
+}
+
+
+def _hot_queries(group_id, user_id):
+    """
+    Najczęściej wykonywane ścieżki odczytu aplikacji, jako pary (nazwa, funkcja bez argumentów).
+    """
+    def membership():
+        _get_membership_cache().pop((user_id, group_id))
+        is_group_member(user_id, group_id)
+
+    return [
+        ('membership', membership),
+        ('group snapshot', lambda: load_group_snapshot(group_id)),
+        ('balance sheet', lambda: read_balance(group_id)),
+        ('net positions', lambda: read_net_positions(group_id)),
+        ('debtors', lambda: read_debtors(group_id, user_id)),
+        ('balance columns', lambda: load_balance_columns(group_id)),
+        ('charts (expenses)', lambda: get_charts_data_from_expenses(db.session.get(Group, group_id), user_id)),
+        ('charts (rollup)', lambda: get_charts_data_from_rollup(db.session.get(Group, group_id), user_id)),
+        ('expense feed', lambda: get_expense_feed(group_id, cursor=encode_cursor(datetime.now(), 0))),
+        ('expense feed by payer', lambda: get_expense_feed(group_id, payer_id=user_id)),
+        ('settlement feed', lambda: get_settlement_feed(group_id, cursor=encode_cursor(datetime.now(), 0))),
+        ('friend suggestions', lambda: get_friend_suggestions(user_id)),
+        ('mutual friends', lambda: get_mutual_friends(user_id, user_id)),
+        ('dashboard version', lambda: get_dashboard_version(user_id)),
+        ('dashboard summary', lambda: get_dashboard_summary(user_id)),
+    ]
+
+
+def _capture_statements(fn):
+    """
+    Wykonuje fn i zwraca listę wykonanych przez nią zapytań SELECT jako pary (statement, parameters).
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            statements.append((statement, parameters))
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        fn()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+    db.session.rollback()
+    return statements
+
+
+def _seq_scanned_tables(plan):
+    tables = set()
+    if plan.get('Node Type') == 'Seq Scan' and plan.get('Relation Name') in WATCHED_TABLES:
+        tables.add(plan['Relation Name'])
+    for child in plan.get('Plans', []):
+        tables |= _seq_scanned_tables(child)
+    return tables
+
+
+def check_query_plans(group_id, user_id):
+    """
+    Wykonuje najczęstsze zapytania aplikacji dla podanej grupy i użytkownika, a następnie sprawdza ich plany
+    (EXPLAIN) przy wyłączonych skanach sekwencyjnych (enable_seqscan = off). Planista wybiera wtedy pełny skan
+    tylko, gdy dla predykatu nie ma żadnego indeksu, więc wynik nie zależy od tego, ile danych jest w bazie.
+    Zwraca listę krotek (nazwa, statement, tabele skanowane sekwencyjnie) dla zapytań z regresją.
+    """
+    captured = [(name, statement, parameters)
+                for name, fn in _hot_queries(group_id, user_id)
+                for statement, parameters in _capture_statements(fn)]
+
+    regressions = []
+    connection = db.session.connection()
+    connection.execute(text("SET LOCAL enable_seqscan = off"))
+    try:
+        for name, statement, parameters in captured:
+            result = connection.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters)
+            plan = result.scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+
+            tables = _seq_scanned_tables(plan[0]['Plan'])
+            if tables:
+                regressions.append((name, statement, sorted(tables)))
+    finally:
+        db.session.rollback()
+
+    return regressions
@@ -0,0 +1,77 @@
+import json
+import os
+import requests
+from flask import current_app
+from dotenv import load_dotenv
+
+load_dotenv()
+
+FIXER_API_URL = os.getenv('FIXER_API_URL', "http://data.fixer.io/api/latest")
+FIXER_API_KEY = os.getenv('FIXER_API_KEY')
+
+
+class RateProviderError(Exception):
+    pass
+
+
+class RateProvider:
+    """
+    Źródło kursów walut. fetch_rates zwraca krotkę (base, rates), gdzie rates to słownik
+    {currency_code: kurs} wyrażony względem waluty bazowej base.
+    """
+
+    def fetch_rates(self):
+        raise NotImplementedError
+
+
+class FixerRateProvider(RateProvider):
+    """
+    Pobiera najnowsze kursy z API Fixer.io (względem EUR).
+    """
+
+    def __init__(self, api_url=FIXER_API_URL, api_key=FIXER_API_KEY, timeout=10):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.timeout = timeout
+
+    def fetch_rates(self):
+        response = requests.get(self.api_url, params={"access_key": self.api_key, "base": "EUR"}, timeout=self.timeout)
+        data = response.json()
+
+        if not data.get("success", False):
+            raise RateProviderError(f"Failed to fetch currency data: {data.get('error', 'Unknown error')}")
+
+        return data.get("base", "EUR"), data.get("rates", {})
+
+
+class FileRateProvider(RateProvider):
+    """
+    Czyta kursy z pliku JSON w formacie odpowiedzi Fixer ({"base": "EUR", "rates": {...}}).
+    Przeznaczony do testów i instalacji bez dostępu do internetu.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def fetch_rates(self):
+        try:
+            with open(self.path, encoding='utf-8') as rates_file:
+                data = json.load(rates_file)
+        except (OSError, ValueError) as e:
+            raise RateProviderError(f"Failed to read currency data from {self.path}: {e}")
+
+        return data.get("base", "EUR"), data.get("rates", {})
+
+
+def get_rate_provider():
+    """
+    Zwraca dostawcę kursów wskazanego w konfiguracji: RATE_PROVIDER = 'fixer' albo 'file' (z RATE_FILE).
+    """
+    provider = current_app.config.get('RATE_PROVIDER', 'fixer')
+
+    if provider == 'file':
+        return FileRateProvider(current_app.config['RATE_FILE'])
+    if provider == 'fixer':
+        return FixerRateProvider()
+
+    raise ValueError(f"Unknown rate provider: {provider}")
@@ -0,0 +1,43 @@
+import os
+from sqlalchemy import text
+from models import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Migrations')
+
+
+def _available_migrations():
+    return sorted(name for name in os.listdir(MIGRATIONS_DIR) if name.endswith('.sql'))
+
+
+def get_pending_migrations():
+    """
+    Zwraca nazwy plików z katalogu Migrations, które nie zostały jeszcze zastosowane (tabela schemamigrations).
+    """
+    db.session.execute(text(
+        "CREATE TABLE IF NOT EXISTS schemamigrations ("
+        "version varchar(255) PRIMARY KEY, "
+        "applied_at timestamp without time zone NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    ))
+    applied = {row.version for row in db.session.execute(text("SELECT version FROM schemamigrations"))}
+    return [name for name in _available_migrations() if name not in applied]
+
+
+def apply_migrations():
+    """
+    Stosuje kolejno (wg nazwy pliku) wszystkie oczekujące migracje, każdą w osobnej transakcji,
+    i zapisuje je w schemamigrations. Zwraca listę zastosowanych migracji.
+    """
+    pending = get_pending_migrations()
+    db.session.commit()
+
+    applied = []
+    for name in pending:
+        with open(os.path.join(MIGRATIONS_DIR, name), encoding='utf-8') as migration_file:
+            sql = migration_file.read()
+
+        db.session.connection().exec_driver_sql(sql)
+        db.session.execute(text("INSERT INTO schemamigrations (version) VALUES (:version)"), {'version': name})
+        db.session.commit()
+        applied.append(name)
+
+    return applied
@@ -0,0 +1,57 @@
+import heapq
+from collections import defaultdict
+from decimal import Decimal
+
+
+def net_positions(balance_sheet):
+    """
+    Zwija saldo grupy (format calculate_balance / read_balance) do pozycji netto członków w każdej walucie.
+    Wynik jest w groszach: {currency: {user_id: cents}}, gdzie dodatnia wartość oznacza, że członkowi
+    należą się pieniądze, a ujemna, że jest winny.
+    """
+    totals = defaultdict(Decimal)
+
+    for debtor_id, balances in balance_sheet.items():
+        for currencies in balances.values():
+            for currency, amount in currencies.items():
+                totals[(currency, debtor_id)] += amount
+
+    positions = defaultdict(dict)
+    for (currency, user_id), amount in totals.items():
+        positions[currency][user_id] = -int(amount * 100)
+
+    return positions
+
+
+def simplify_debts(net_positions_by_currency):
+    """
+    Wyznacza listę przelewów, która wyrównuje pozycje netto (format net_positions / read_net_positions).
+    Dla każdej waluty największy dłużnik spłaca największego wierzyciela (zachłannie, na kopcach),
+    więc przelewów jest co najwyżej o jeden mniej niż członków z niezerowym saldem.
+    """
+    transfers = []
+
+    for currency, positions in sorted(net_positions_by_currency.items()):
+        creditors = [(-cents, user_id) for user_id, cents in positions.items() if cents > 0]
+        debtors = [(cents, user_id) for user_id, cents in positions.items() if cents < 0]
+        heapq.heapify(creditors)
+        heapq.heapify(debtors)
+
+        while creditors and debtors:
+            credit, receiver_id = heapq.heappop(creditors)
+            debt, payer_id = heapq.heappop(debtors)
+
+            cents = min(-credit, -debt)
+            transfers.append({
+                'payer_id': payer_id,
+                'receiver_id': receiver_id,
+                'amount': Decimal(cents).scaleb(-2),
+                'currency': currency,
+            })
+
+            if -credit > cents:
+                heapq.heappush(creditors, (credit + cents, receiver_id))
+            if -debt > cents:
+                heapq.heappush(debtors, (debt + cents, payer_id))
+
+    return transfers
@@ -0,0 +1,169 @@
+from sqlalchemy import insert
+from models import db, ExpenseShare
+from money import Money, to_cents
+
+SPLIT_TYPES = ('equal', 'custom', 'percentage', 'weights', 'itemized')
+
+
+class SplitError(ValueError):
+    """
+    Niepoprawne dane podziału wydatku (komunikat nadaje się do pokazania użytkownikowi).
+    """
+
+
+def _integer_weights(values, what):
+    """
+    Zamienia wagi podane jako liczby dziesiętne (np. 33.33 albo 1.5) na liczby całkowite w setnych częściach,
+    tak żeby podział mógł być liczony dokładnie, bez ułamków.
+    """
+    try:
+        weights = {user_id: to_cents(value) for user_id, value in values.items()}
+    except (TypeError, ValueError) as e:
+        raise SplitError(f"{what} must be numbers.") from e
+    if any(weight < 0 for weight in weights.values()):
+        raise SplitError(f"{what} must not be negative.")
+    if not any(weights.values()):
+        raise SplitError(f"{what} must not all be zero.")
+    return weights
+
+
+def _allocate(amount, weights):
+    user_ids = list(weights)
+    return dict(zip(user_ids, amount.allocate([weights[user_id] for user_id in user_ids])))
+
+
+def split_equal(amount, member_ids):
+    """
+    Dzieli kwotę po równo. Grosze, które nie dzielą się równo (100.00 / 3), dostają pierwsi członkowie,
+    więc udziały różnią się najwyżej o grosz i zawsze sumują się do kwoty.
+    """
+    member_ids = list(dict.fromkeys(member_ids))
+    if not member_ids:
+        raise SplitError("Select at least one member.")
+    return _allocate(amount, {user_id: 1 for user_id in member_ids})
+
+
+def split_custom(amount, shares):
+    """
+    Udziały podane wprost - muszą sumować się dokładnie do kwoty.
+    """
+    if not shares:
+        raise SplitError("Select at least one member.")
+    try:
+        result = {user_id: Money.parse(share, amount.currency) for user_id, share in shares.items()}
+    except (TypeError, ValueError) as e:
+        raise SplitError("Custom shares must be numbers.") from e
+    if any(share.cents < 0 for share in result.values()):
+        raise SplitError("Custom shares must not be negative.")
+    if sum(result.values(), Money(0, amount.currency)) != amount:
+        raise SplitError("Custom shares do not add up to the total amount.")
+    return result
+
+
+def split_percentage(amount, percentages):
+    """
+    Podział procentowy; procenty (z dokładnością do setnych) muszą sumować się do 100.
+    """
+    if not percentages:
+        raise SplitError("Select at least one member.")
+    weights = _integer_weights(percentages, "Percentages")
+    if sum(weights.values()) != 100 * 100:
+        raise SplitError("Percentages do not add up to 100.")
+    return _allocate(amount, weights)
+
+
+def split_weights(amount, weights):
+    """
+    Podział proporcjonalny do liczby jednostek (np. nocy w hotelu albo osób w rodzinie).
+    """
+    if not weights:
+        raise SplitError("Select at least one member.")
+    return _allocate(amount, _integer_weights(weights, "Weights"))
+
+
+def split_itemized(amount, items):
+    """
+    Podział według pozycji rachunku: items to lista par (kwota pozycji, lista członków), a każda pozycja
+    jest dzielona po równo między swoich członków. Nadwyżka kwoty nad sumą pozycji (podatek, napiwek)
+    jest rozdzielana proporcjonalnie do tego, ile pozycji przypadło każdemu członkowi.
+    """
+    if not items:
+        raise SplitError("Add at least one item.")
+
+    subtotals = {}
+    items_total = Money(0, amount.currency)
+    for item_amount, member_ids in items:
+        try:
+            item_amount = Money.parse(item_amount, amount.currency)
+        except (TypeError, ValueError) as e:
+            raise SplitError("Item amounts must be numbers.") from e
+        if item_amount.cents <= 0:
+            raise SplitError("Item amounts must be positive.")
+
+        items_total += item_amount
+        for user_id, share in split_equal(item_amount, member_ids).items():
+            subtotals[user_id] = subtotals.get(user_id, Money(0, amount.currency)) + share
+
+    if items_total > amount:
+        raise SplitError("Items add up to more than the total amount.")
+
+    extra = _allocate(amount - items_total, {user_id: subtotal.cents for user_id, subtotal in subtotals.items()})
+    return {user_id: subtotal + extra[user_id] for user_id, subtotal in subtotals.items()}
+
+
+def split_expense(split_type, amount, values):
+    """
+    Dzieli kwotę (Money) wybraną strategią i zwraca {user_id: Money}. Udziały zawsze sumują się dokładnie do kwoty.
+    values zależą od strategii: lista członków (equal), {user_id: wartość} (custom, percentage, weights)
+    albo lista pozycji (itemized). Niepoprawne dane zgłaszają SplitError.
+    """
+    if split_type == 'equal':
+        return split_equal(amount, values)
+    if split_type == 'custom':
+        return split_custom(amount, values)
+    if split_type == 'percentage':
+        return split_percentage(amount, values)
+    if split_type == 'weights':
+        return split_weights(amount, values)
+    if split_type == 'itemized':
+        return split_itemized(amount, values)
+    raise SplitError(f"Unknown split type: {split_type}")
+
+
+def split_values_from_form(form, split_type):
+    """
+    Odczytuje z formularza wydatku dane dla wybranej strategii podziału: zaznaczonych członków (members)
+    i pola custom_share_<id>, percentage_<id>, weight_<id> albo pozycje item_amount_<n> / item_members_<n>.
+    """
+    member_ids = [int(member_id) for member_id in form.getlist('members')]
+
+    if split_type == 'equal':
+        return member_ids
+    if split_type in ('custom', 'percentage', 'weights'):
+        prefix = {'custom': 'custom_share', 'percentage': 'percentage', 'weights': 'weight'}[split_type]
+        return {member_id: form.get(f'{prefix}_{member_id}') or '0' for member_id in member_ids}
+    if split_type == 'itemized':
+        items = []
+        numbers = sorted(int(key[len('item_amount_'):]) for key in form
+                         if key.startswith('item_amount_') and key[len('item_amount_'):].isdigit())
+        for number in numbers:
+            key = f'item_amount_{number}'
+            item_members = [int(member_id) for member_id in form.getlist(f'item_members_{number}')]
+            if form.get(key):
+                items.append((form.get(key), item_members))
+        return items
+    raise SplitError(f"Unknown split type: {split_type}")
+
+
+def write_shares(expense_id, shares, paid_by):
+    """
+    Zapisuje udziały wydatku jednym poleceniem INSERT z wieloma wierszami (zamiast osobnego obiektu
+    ExpenseShare na członka). Zwraca listę krotek (user_id, share, paid_by) dla group_changes.expense_changed.
+    """
+    rows = [
+        {'expense_id': expense_id, 'user_id': user_id, 'share': share.amount, 'paid_by': paid_by}
+        for user_id, share in shares.items()
+    ]
+    if rows:
+        db.session.execute(insert(ExpenseShare), rows)
+    return [(user_id, share.amount, paid_by) for user_id, share in shares.items()]
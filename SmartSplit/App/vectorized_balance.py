@@ -0,0 +1,124 @@
+from collections import defaultdict
+from decimal import Decimal
+from sqlalchemy import BigInteger, and_, cast, func
+from sqlalchemy.orm import aliased
+from models import db, Expense, ExpenseShare, Settlement
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("NumPy is required for the 'numpy' balance engine.")
+
+
+def load_balance_columns(group_id):
+    """
+    Pobiera dane do wyliczenia salda jako płaskie kolumny, bez tworzenia obiektów ORM.
+    Zwraca dwie listy krotek: udziały (payer_id, member_id, currency, share_cents)
+    i spłaty (payer_id, receiver_id, currency, amount_cents).
+    """
+    payer_share = aliased(ExpenseShare)
+
+    shares = (
+        db.session.query(
+            payer_share.user_id,
+            ExpenseShare.user_id,
+            Expense.currency,
+            cast(func.round(ExpenseShare.share * 100), BigInteger),
+        )
+        .join(Expense, Expense.id == ExpenseShare.expense_id)
+        .join(payer_share, and_(payer_share.expense_id == ExpenseShare.expense_id,
+                                payer_share.paid_by == payer_share.user_id))
+        .filter(Expense.group_id == group_id, ExpenseShare.user_id != payer_share.user_id)
+        .all()
+    )
+
+    settlements = (
+        db.session.query(
+            Settlement.payer_id,
+            Settlement.receiver_id,
+            Settlement.currency,
+            cast(func.round(Settlement.amount * 100), BigInteger),
+        )
+        .filter(Settlement.group_id == group_id)
+        .all()
+    )
+
+    return shares, settlements
+
+
+def build_balance_matrix(member_ids, shares, settlements):
+    """
+    Sumuje udziały i spłaty w gęstej macierzy int64 o wymiarach [dłużnik][wierzyciel][waluta], w groszach.
+    Udziały osób spoza grupy są pomijane tak samo jak w calculate_balance.
+    Zwraca (matrix, user_ids, currencies), gdzie user_ids i currencies opisują kolejne indeksy macierzy.
+    """
+    _require_numpy()
+
+    user_ids = np.array(sorted(set(member_ids)
+                               | {row[0] for row in settlements}
+                               | {row[1] for row in settlements}), dtype=np.int64)
+    currencies = sorted({row[2] for row in shares} | {row[2] for row in settlements})
+    currency_index = {currency: index for index, currency in enumerate(currencies)}
+
+    matrix = np.zeros((len(user_ids), len(user_ids), len(currencies)), dtype=np.int64)
+
+    if shares:
+        payers = np.fromiter((row[0] for row in shares), dtype=np.int64, count=len(shares))
+        debtors = np.fromiter((row[1] for row in shares), dtype=np.int64, count=len(shares))
+        currency_ids = np.fromiter((currency_index[row[2]] for row in shares), dtype=np.int64, count=len(shares))
+        cents = np.fromiter((row[3] for row in shares), dtype=np.int64, count=len(shares))
+
+        member_array = np.array(sorted(member_ids), dtype=np.int64)
+        in_group = np.isin(payers, member_array) & np.isin(debtors, member_array)
+
+        payer_index = np.searchsorted(user_ids, payers[in_group])
+        debtor_index = np.searchsorted(user_ids, debtors[in_group])
+        currency_ids = currency_ids[in_group]
+        cents = cents[in_group]
+
+        np.add.at(matrix, (debtor_index, payer_index, currency_ids), cents)
+        np.add.at(matrix, (payer_index, debtor_index, currency_ids), -cents)
+
+    if settlements:
+        payer_index = np.searchsorted(user_ids, [row[0] for row in settlements])
+        receiver_index = np.searchsorted(user_ids, [row[1] for row in settlements])
+        currency_ids = np.array([currency_index[row[2]] for row in settlements], dtype=np.int64)
+        cents = np.array([row[3] for row in settlements], dtype=np.int64)
+
+        np.add.at(matrix, (payer_index, receiver_index, currency_ids), -cents)
+        np.add.at(matrix, (receiver_index, payer_index, currency_ids), cents)
+
+    return matrix, user_ids, currencies
+
+
+def matrix_to_balance_sheet(matrix, user_ids, currencies):
+    """
+    Zamienia macierz sald na zagnieżdżony słownik w formacie calculate_balance (kwoty Decimal z dwoma miejscami).
+    Pomijane są pozycje zerowe.
+    """
+    balance_sheet = defaultdict(lambda: defaultdict(lambda: defaultdict(Decimal)))
+
+    for debtor, creditor, currency in zip(*np.nonzero(matrix)):
+        amount = Decimal(int(matrix[debtor, creditor, currency])).scaleb(-2)
+        balance_sheet[int(user_ids[debtor])][int(user_ids[creditor])][currencies[currency]] = amount
+
+    return balance_sheet
+
+
+def calculate_balance_vectorized(group):
+    """
+    Odpowiednik calculate_balance liczony na liczbach całkowitych (grosze) przy pomocy NumPy.
+    """
+    _require_numpy()
+
+    shares, settlements = load_balance_columns(group.id)
+    member_ids = [member.id for member in group.members]
+    matrix, user_ids, currencies = build_balance_matrix(member_ids, shares, settlements)
+
+    return matrix_to_balance_sheet(matrix, user_ids, currencies)
+
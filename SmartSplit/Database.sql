@@ -55,7 +55,7 @@ CREATE TABLE IF NOT EXISTS public.settlement
     payer_id integer NOT NULL,
     receiver_id integer NOT NULL,
     amount numeric(10,2) NOT NULL,
-    date timestamp without time zone DEFAULT CURRENT_TIMESTAMP,
+    date timestamp without time zone NOT NULL DEFAULT CURRENT_TIMESTAMP,
     currency character varying(10) COLLATE pg_catalog."default" NOT NULL DEFAULT 'PLN'::character varying,
     CONSTRAINT settlement_pkey PRIMARY KEY (id),
     CONSTRAINT settlement_group_id_fkey FOREIGN KEY (group_id)
@@ -87,6 +87,7 @@ CREATE TABLE IF NOT EXISTS public.groups
     name character varying(255) COLLATE pg_catalog."default" NOT NULL,
     created_by integer,
     created_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP,
+    data_version bigint NOT NULL DEFAULT 0,
     CONSTRAINT groups_pkey PRIMARY KEY (id),
     CONSTRAINT groups_created_by_fkey FOREIGN KEY (created_by)
         REFERENCES public.users (id) MATCH SIMPLE
@@ -197,7 +198,7 @@ CREATE TABLE IF NOT EXISTS public.expenses
     amount numeric(10,2) NOT NULL,
     currency character varying(3) COLLATE pg_catalog."default" NOT NULL,
     created_by integer,
-    created_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP,
+    created_at timestamp without time zone NOT NULL DEFAULT CURRENT_TIMESTAMP,
     category character varying(50) COLLATE pg_catalog."default",
     custom_split boolean DEFAULT false,
     CONSTRAINT expenses_pkey PRIMARY KEY (id),
@@ -214,4 +215,160 @@ CREATE TABLE IF NOT EXISTS public.expenses
 TABLESPACE pg_default;
 
 ALTER TABLE IF EXISTS public.expenses
-    OWNER to postgres;
\ No newline at end of file
+    OWNER to postgres;
+
+-- Table: public.groupbalances
+
+-- DROP TABLE IF EXISTS public.groupbalances;
+
+CREATE TABLE IF NOT EXISTS public.groupbalances
+(
+    group_id integer NOT NULL,
+    debtor_id integer NOT NULL,
+    creditor_id integer NOT NULL,
+    currency character varying(10) COLLATE pg_catalog."default" NOT NULL,
+    amount numeric(12,2) NOT NULL DEFAULT 0,
+    CONSTRAINT groupbalances_pkey PRIMARY KEY (group_id, debtor_id, creditor_id, currency),
+    CONSTRAINT groupbalances_group_id_fkey FOREIGN KEY (group_id)
+        REFERENCES public.groups (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE,
+    CONSTRAINT groupbalances_debtor_id_fkey FOREIGN KEY (debtor_id)
+        REFERENCES public.users (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE,
+    CONSTRAINT groupbalances_creditor_id_fkey FOREIGN KEY (creditor_id)
+        REFERENCES public.users (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE
+)
+
+TABLESPACE pg_default;
+
+ALTER TABLE IF EXISTS public.groupbalances
+    OWNER to postgres;
+
+-- Table: public.currencyrates
+
+-- DROP TABLE IF EXISTS public.currencyrates;
+
+CREATE TABLE IF NOT EXISTS public.currencyrates
+(
+    currency_code character varying(3) COLLATE pg_catalog."default" NOT NULL,
+    rate_date date NOT NULL,
+    exchange_rate numeric(10,6) NOT NULL,
+    CONSTRAINT currencyrates_pkey PRIMARY KEY (currency_code, rate_date)
+)
+
+TABLESPACE pg_default;
+
+ALTER TABLE IF EXISTS public.currencyrates
+    OWNER to postgres;
+
+-- Table: public.expenserollups
+
+-- DROP TABLE IF EXISTS public.expenserollups;
+
+CREATE TABLE IF NOT EXISTS public.expenserollups
+(
+    group_id integer NOT NULL,
+    user_id integer NOT NULL,
+    month date NOT NULL,
+    category character varying(50) COLLATE pg_catalog."default" NOT NULL DEFAULT ''::character varying,
+    currency character varying(3) COLLATE pg_catalog."default" NOT NULL,
+    spent numeric(12,2) NOT NULL DEFAULT 0,
+    share numeric(12,2) NOT NULL DEFAULT 0,
+    CONSTRAINT expenserollups_pkey PRIMARY KEY (group_id, user_id, month, category, currency),
+    CONSTRAINT expenserollups_group_id_fkey FOREIGN KEY (group_id)
+        REFERENCES public.groups (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE,
+    CONSTRAINT expenserollups_user_id_fkey FOREIGN KEY (user_id)
+        REFERENCES public.users (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE
+)
+
+TABLESPACE pg_default;
+
+ALTER TABLE IF EXISTS public.expenserollups
+    OWNER to postgres;
+
+-- Table: public.emailoutbox
+
+-- DROP TABLE IF EXISTS public.emailoutbox;
+
+CREATE TABLE IF NOT EXISTS public.emailoutbox
+(
+    id integer NOT NULL DEFAULT nextval('emailoutbox_id_seq'::regclass),
+    recipient character varying(120) COLLATE pg_catalog."default" NOT NULL,
+    subject character varying(255) COLLATE pg_catalog."default" NOT NULL,
+    body text COLLATE pg_catalog."default" NOT NULL,
+    dedup_key character varying(200) COLLATE pg_catalog."default",
+    status character varying(20) COLLATE pg_catalog."default" NOT NULL DEFAULT 'pending'::character varying,
+    attempts integer NOT NULL DEFAULT 0,
+    last_error text COLLATE pg_catalog."default",
+    created_at timestamp without time zone NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    next_attempt_at timestamp without time zone NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    sent_at timestamp without time zone,
+    CONSTRAINT emailoutbox_pkey PRIMARY KEY (id)
+)
+
+TABLESPACE pg_default;
+
+ALTER TABLE IF EXISTS public.emailoutbox
+    OWNER to postgres;
+
+CREATE INDEX IF NOT EXISTS emailoutbox_pending_idx
+    ON public.emailoutbox USING btree
+    (next_attempt_at ASC NULLS LAST)
+    TABLESPACE pg_default
+    WHERE status::text = 'pending'::text;
+
+CREATE INDEX IF NOT EXISTS emailoutbox_dedup_idx
+    ON public.emailoutbox USING btree
+    (dedup_key COLLATE pg_catalog."default" ASC NULLS LAST, created_at ASC NULLS LAST)
+    TABLESPACE pg_default;
+
+CREATE INDEX IF NOT EXISTS emailoutbox_recipient_sent_idx
+    ON public.emailoutbox USING btree
+    (recipient COLLATE pg_catalog."default" ASC NULLS LAST, sent_at ASC NULLS LAST)
+    TABLESPACE pg_default
+    WHERE status::text = 'sent'::text;
+
+-- Indexes (Migrations/001_query_indexes.sql, 002_feed_indexes.sql)
+
+CREATE INDEX IF NOT EXISTS expenses_group_id_created_at_id_idx
+    ON public.expenses USING btree
+    (group_id ASC NULLS LAST, created_at ASC NULLS LAST, id ASC NULLS LAST)
+    TABLESPACE pg_default;
+
+CREATE INDEX IF NOT EXISTS expenseshares_user_id_idx
+    ON public.expenseshares USING btree
+    (user_id ASC NULLS LAST)
+    TABLESPACE pg_default;
+
+CREATE INDEX IF NOT EXISTS expenseshares_paid_by_idx
+    ON public.expenseshares USING btree
+    (paid_by ASC NULLS LAST)
+    TABLESPACE pg_default;
+
+CREATE INDEX IF NOT EXISTS settlement_group_id_date_id_idx
+    ON public.settlement USING btree
+    (group_id ASC NULLS LAST, date ASC NULLS LAST, id ASC NULLS LAST)
+    TABLESPACE pg_default;
+
+CREATE INDEX IF NOT EXISTS usergroups_group_id_idx
+    ON public.usergroups USING btree
+    (group_id ASC NULLS LAST)
+    TABLESPACE pg_default;
+
+CREATE INDEX IF NOT EXISTS friendrequest_recipient_id_status_idx
+    ON public.friendrequest USING btree
+    (recipient_id ASC NULLS LAST, status COLLATE pg_catalog."default" ASC NULLS LAST)
+    TABLESPACE pg_default;
+
+CREATE INDEX IF NOT EXISTS friends_friend_id_idx
+    ON public.friends USING btree
+    (friend_id ASC NULLS LAST)
+    TABLESPACE pg_default;
\ No newline at end of file
@@ -0,0 +1,44 @@
+-- Migration 001: indeksy pod zapytania filtrowane w app.py, charts.py i calculate_balance.py.
+-- Klucze główne i ograniczenia UNIQUE nie obsługują tych predykatów (inna kolejność kolumn albo ich brak).
+
+-- Wydatki grupy, sortowane i grupowane po dacie (widok grupy, wykresy, eksport)
+CREATE INDEX IF NOT EXISTS expenses_group_id_created_at_idx
+    ON public.expenses USING btree
+    (group_id ASC NULLS LAST, created_at ASC NULLS LAST)
+    TABLESPACE pg_default;
+
+-- Udziały użytkownika (pulpit, sugestie znajomych); klucz główny zaczyna się od expense_id
+CREATE INDEX IF NOT EXISTS expenseshares_user_id_idx
+    ON public.expenseshares USING btree
+    (user_id ASC NULLS LAST)
+    TABLESPACE pg_default;
+
+-- Udziały opłacone przez użytkownika (klucz obcy paid_by)
+CREATE INDEX IF NOT EXISTS expenseshares_paid_by_idx
+    ON public.expenseshares USING btree
+    (paid_by ASC NULLS LAST)
+    TABLESPACE pg_default;
+
+-- Spłaty grupy (salda, historia spłat)
+CREATE INDEX IF NOT EXISTS settlement_group_id_idx
+    ON public.settlement USING btree
+    (group_id ASC NULLS LAST)
+    TABLESPACE pg_default;
+
+-- Członkowie grupy; klucz główny (user_id, group_id) obsługuje tylko wyszukiwanie po użytkowniku
+CREATE INDEX IF NOT EXISTS usergroups_group_id_idx
+    ON public.usergroups USING btree
+    (group_id ASC NULLS LAST)
+    TABLESPACE pg_default;
+
+-- Oczekujące zaproszenia do znajomych odbiorcy
+CREATE INDEX IF NOT EXISTS friendrequest_recipient_id_status_idx
+    ON public.friendrequest USING btree
+    (recipient_id ASC NULLS LAST, status COLLATE pg_catalog."default" ASC NULLS LAST)
+    TABLESPACE pg_default;
+
+-- Znajomości w drugą stronę; unique_friendship (user_id, friend_id) obsługuje tylko user_id
+CREATE INDEX IF NOT EXISTS friends_friend_id_idx
+    ON public.friends USING btree
+    (friend_id ASC NULLS LAST)
+    TABLESPACE pg_default;
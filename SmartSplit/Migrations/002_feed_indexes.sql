@@ -0,0 +1,16 @@
+-- Migration 002: indeksy pod paginację feedów wydatków i spłat po (data, id).
+-- Zastępują indeksy z migracji 001, których są rozszerzeniem (te same kolumny wiodące).
+
+CREATE INDEX IF NOT EXISTS expenses_group_id_created_at_id_idx
+    ON public.expenses USING btree
+    (group_id ASC NULLS LAST, created_at ASC NULLS LAST, id ASC NULLS LAST)
+    TABLESPACE pg_default;
+
+DROP INDEX IF EXISTS public.expenses_group_id_created_at_idx;
+
+CREATE INDEX IF NOT EXISTS settlement_group_id_date_id_idx
+    ON public.settlement USING btree
+    (group_id ASC NULLS LAST, date ASC NULLS LAST, id ASC NULLS LAST)
+    TABLESPACE pg_default;
+
+DROP INDEX IF EXISTS public.settlement_group_id_idx;
@@ -0,0 +1,19 @@
+-- Migration 003: kwota wydatku jako numeric(10,2), tak jak w pozostałych tabelach z kwotami.
+-- Bazy utworzone z modeli (db.create_all) miały tu double precision. Zmiana typu przepisuje całą tabelę
+-- pod blokadą ACCESS EXCLUSIVE, więc jest wykonywana tylko wtedy, gdy kolumna wciąż ma typ double precision.
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_schema = 'public'
+          AND table_name = 'expenses'
+          AND column_name = 'amount'
+          AND data_type = 'double precision'
+    ) THEN
+        ALTER TABLE public.expenses
+            ALTER COLUMN amount TYPE numeric(10,2) USING round(amount::numeric, 2);
+    END IF;
+END
+$$;
@@ -0,0 +1,122 @@
+-- Migration 004: kolumna groups.data_version i tabele pochodne (salda, historia kursów, zestawienie wykresów,
+-- kolejka e-maili) dla baz utworzonych przed ich dodaniem do Database.sql. Dla baz, które już je mają,
+-- polecenia nic nie zmieniają. Nowo utworzone tabele są puste - po migracji należy wypełnić salda
+-- (flask rebuild-balances) i zestawienie wykresów (flask backfill-rollups).
+
+ALTER TABLE IF EXISTS public.groups
+    ADD COLUMN IF NOT EXISTS data_version bigint NOT NULL DEFAULT 0;
+
+CREATE SEQUENCE IF NOT EXISTS public.emailoutbox_id_seq;
+
+-- Table: public.groupbalances
+
+CREATE TABLE IF NOT EXISTS public.groupbalances
+(
+    group_id integer NOT NULL,
+    debtor_id integer NOT NULL,
+    creditor_id integer NOT NULL,
+    currency character varying(10) COLLATE pg_catalog."default" NOT NULL,
+    amount numeric(12,2) NOT NULL DEFAULT 0,
+    CONSTRAINT groupbalances_pkey PRIMARY KEY (group_id, debtor_id, creditor_id, currency),
+    CONSTRAINT groupbalances_group_id_fkey FOREIGN KEY (group_id)
+        REFERENCES public.groups (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE,
+    CONSTRAINT groupbalances_debtor_id_fkey FOREIGN KEY (debtor_id)
+        REFERENCES public.users (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE,
+    CONSTRAINT groupbalances_creditor_id_fkey FOREIGN KEY (creditor_id)
+        REFERENCES public.users (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE
+)
+
+TABLESPACE pg_default;
+
+ALTER TABLE IF EXISTS public.groupbalances
+    OWNER to postgres;
+
+-- Table: public.currencyrates
+
+CREATE TABLE IF NOT EXISTS public.currencyrates
+(
+    currency_code character varying(3) COLLATE pg_catalog."default" NOT NULL,
+    rate_date date NOT NULL,
+    exchange_rate numeric(10,6) NOT NULL,
+    CONSTRAINT currencyrates_pkey PRIMARY KEY (currency_code, rate_date)
+)
+
+TABLESPACE pg_default;
+
+ALTER TABLE IF EXISTS public.currencyrates
+    OWNER to postgres;
+
+-- Table: public.expenserollups
+
+CREATE TABLE IF NOT EXISTS public.expenserollups
+(
+    group_id integer NOT NULL,
+    user_id integer NOT NULL,
+    month date NOT NULL,
+    category character varying(50) COLLATE pg_catalog."default" NOT NULL DEFAULT ''::character varying,
+    currency character varying(3) COLLATE pg_catalog."default" NOT NULL,
+    spent numeric(12,2) NOT NULL DEFAULT 0,
+    share numeric(12,2) NOT NULL DEFAULT 0,
+    CONSTRAINT expenserollups_pkey PRIMARY KEY (group_id, user_id, month, category, currency),
+    CONSTRAINT expenserollups_group_id_fkey FOREIGN KEY (group_id)
+        REFERENCES public.groups (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE,
+    CONSTRAINT expenserollups_user_id_fkey FOREIGN KEY (user_id)
+        REFERENCES public.users (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE
+)
+
+TABLESPACE pg_default;
+
+ALTER TABLE IF EXISTS public.expenserollups
+    OWNER to postgres;
+
+-- Table: public.emailoutbox
+
+CREATE TABLE IF NOT EXISTS public.emailoutbox
+(
+    id integer NOT NULL DEFAULT nextval('emailoutbox_id_seq'::regclass),
+    recipient character varying(120) COLLATE pg_catalog."default" NOT NULL,
+    subject character varying(255) COLLATE pg_catalog."default" NOT NULL,
+    body text COLLATE pg_catalog."default" NOT NULL,
+    dedup_key character varying(200) COLLATE pg_catalog."default",
+    status character varying(20) COLLATE pg_catalog."default" NOT NULL DEFAULT 'pending'::character varying,
+    attempts integer NOT NULL DEFAULT 0,
+    last_error text COLLATE pg_catalog."default",
+    created_at timestamp without time zone NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    next_attempt_at timestamp without time zone NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    sent_at timestamp without time zone,
+    CONSTRAINT emailoutbox_pkey PRIMARY KEY (id)
+)
+
+TABLESPACE pg_default;
+
+ALTER TABLE IF EXISTS public.emailoutbox
+    OWNER to postgres;
+
+CREATE INDEX IF NOT EXISTS emailoutbox_pending_idx
+    ON public.emailoutbox USING btree
+    (next_attempt_at ASC NULLS LAST)
+    TABLESPACE pg_default
+    WHERE status::text = 'pending'::text;
+
+CREATE INDEX IF NOT EXISTS emailoutbox_dedup_idx
+    ON public.emailoutbox USING btree
+    (dedup_key COLLATE pg_catalog."default" ASC NULLS LAST, created_at ASC NULLS LAST)
+    TABLESPACE pg_default;
+
+CREATE INDEX IF NOT EXISTS emailoutbox_recipient_sent_idx
+    ON public.emailoutbox USING btree
+    (recipient COLLATE pg_catalog."default" ASC NULLS LAST, sent_at ASC NULLS LAST)
+    TABLESPACE pg_default
+    WHERE status::text = 'sent'::text;
+
+ALTER SEQUENCE public.emailoutbox_id_seq OWNED BY public.emailoutbox.id;
@@ -0,0 +1,33 @@
+-- Migration 005: expenses.created_at i settlement.date jako NOT NULL. Feedy stronicują po (data, id),
+-- więc wiersz bez daty nigdy nie trafiał na żadną stronę, a kończąc stronę psułby kursor.
+-- Brakującą datę uzupełniamy datą najbliższego wcześniejszego (po id) wiersza tej samej grupy, a gdy go nie ma -
+-- bieżącą. Wydatki bez daty nie były ujęte w zestawieniu wykresów - po migracji należy uruchomić
+-- flask backfill-rollups.
+
+UPDATE public.expenses AS expense
+SET created_at = COALESCE(
+    (SELECT previous.created_at
+     FROM public.expenses AS previous
+     WHERE previous.group_id = expense.group_id AND previous.id < expense.id
+       AND previous.created_at IS NOT NULL
+     ORDER BY previous.id DESC
+     LIMIT 1),
+    CURRENT_TIMESTAMP)
+WHERE expense.created_at IS NULL;
+
+ALTER TABLE public.expenses
+    ALTER COLUMN created_at SET NOT NULL;
+
+UPDATE public.settlement AS settlement
+SET date = COALESCE(
+    (SELECT previous.date
+     FROM public.settlement AS previous
+     WHERE previous.group_id = settlement.group_id AND previous.id < settlement.id
+       AND previous.date IS NOT NULL
+     ORDER BY previous.id DESC
+     LIMIT 1),
+    CURRENT_TIMESTAMP)
+WHERE settlement.date IS NULL;
+
+ALTER TABLE public.settlement
+    ALTER COLUMN date SET NOT NULL;
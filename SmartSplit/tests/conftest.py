@@ -0,0 +1,108 @@
+import os
+import sys
+from contextlib import contextmanager
+import pytest
+from flask.testing import FlaskClient
+from sqlalchemy import event
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'App')
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+# app.py wymaga danych konta pocztowego już przy imporcie; testy niczego nie wysyłają
+os.environ.setdefault('SENDER_EMAIL', 'tests@example.invalid')
+os.environ.setdefault('PASSWORD', 'unused')
+
+# Testy korzystające z bazy (fikstura database) czyszczą ją przed każdym testem - należy podać osobną,
+# jednorazową bazę PostgreSQL, np. postgresql+psycopg2://postgres@localhost/smartsplit_test
+TEST_DATABASE_URI = os.environ.get('SMARTSPLIT_TEST_DATABASE_URI')
+
+
+class IsolatedClient(FlaskClient):
+    """
+    Klient testowy obsługujący każde żądanie we własnym kontekście aplikacji, jak działająca aplikacja.
+    Inaczej żądanie użyłoby kontekstu testu, a z nim flask.g i sesji bazy, w której test przygotował dane.
+    """
+
+    def open(self, *args, **kwargs):
+        with self.application.app_context():
+            return super().open(*args, **kwargs)
+
+
+@pytest.fixture(scope='session')
+def app():
+    """
+    Aplikacja Flask podłączona do bazy testowej. Bez SMARTSPLIT_TEST_DATABASE_URI albo gdy baza jest
+    niedostępna, testy wymagające bazy są pomijane.
+    """
+    if not TEST_DATABASE_URI:
+        pytest.skip("SMARTSPLIT_TEST_DATABASE_URI is not set")
+
+    import config
+    config.Config.SQLALCHEMY_DATABASE_URI = TEST_DATABASE_URI
+    config.Config.EMAIL_WORKER = False
+    config.Config.PASSWORD_HASH_WORKERS = 0
+
+    from sqlalchemy.exc import OperationalError
+    from app import app as flask_app
+    from models import db
+
+    flask_app.config['TESTING'] = True
+    flask_app.test_client_class = IsolatedClient
+    with flask_app.app_context():
+        try:
+            db.engine.connect().close()
+        except OperationalError as e:
+            pytest.skip(f"Test database is not available: {e}")
+    return flask_app
+
+
+@pytest.fixture
+def database(app):
+    """
+    Pusta baza (drop_all/create_all) i kontekst aplikacji na czas testu. Czyści też cache procesu, bo
+    identyfikatory w odtworzonej bazie zaczynają się od nowa.
+    """
+    import access
+    import app as app_module
+    import exchange_rate
+    from models import db
+
+    access._membership_cache = None
+    exchange_rate._rate_cache = {}
+    exchange_rate._rate_cache_loaded_at = None
+    for cache in (app_module.charts_cache, app_module.dashboard_cache):
+        cache.clear()
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield db
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app, database):
+    return app.test_client()
+
+
+@pytest.fixture
+def count_queries(database):
+    """
+    Zwraca kontekst zbierający treść zapytań SQL wykonanych w jego obrębie (także przez żądania klienta):
+    with count_queries() as statements: ...
+    """
+    @contextmanager
+    def counter():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(database.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(database.engine, 'before_cursor_execute', before_cursor_execute)
+
+    return counter
@@ -0,0 +1,64 @@
+from datetime import datetime
+from decimal import Decimal
+from models import db, User, Group, UserGroup, Expense, ExpenseShare, Settlement, Friends
+from group_changes import expense_changed, settlement_changed
+
+
+def login(client, user_id):
+    with client.session_transaction() as client_session:
+        client_session['user_id'] = user_id
+
+
+def make_users(count, prefix='user'):
+    users = [User(username=f'{prefix}{index}', email=f'{prefix}{index}@example.invalid', password='-')
+             for index in range(count)]
+    db.session.add_all(users)
+    db.session.flush()
+    return users
+
+
+def make_friends(user, others):
+    for other in others:
+        db.session.add(Friends(user_id=user.id, friend_id=other.id))
+        db.session.add(Friends(user_id=other.id, friend_id=user.id))
+    db.session.flush()
+
+
+def make_group(members, name='Trip'):
+    group = Group(name=name, created_by=members[0].id)
+    db.session.add(group)
+    db.session.flush()
+    for member in members:
+        db.session.add(UserGroup(user_id=member.id, group_id=group.id))
+    db.session.flush()
+    db.session.refresh(group)
+    return group
+
+
+def add_expense(group, payer, shares, currency='PLN', category='Food', created_at=None, description='Dinner'):
+    """
+    Zapisuje wydatek opłacony przez payer z udziałami {user: kwota} i aktualizuje dane pochodne grupy
+    (salda, zestawienie wykresów), tak jak widok add_expense.
+    """
+    amount = sum((Decimal(share) for share in shares.values()), Decimal('0.00'))
+    expense = Expense(group_id=group.id, description=description, amount=amount, currency=currency,
+                      created_by=payer.id, created_at=created_at or datetime(2026, 1, 15), category=category)
+    db.session.add(expense)
+    db.session.flush()
+
+    rows = []
+    for user, share in shares.items():
+        db.session.add(ExpenseShare(expense_id=expense.id, user_id=user.id, share=Decimal(share), paid_by=payer.id))
+        rows.append((user.id, Decimal(share), payer.id))
+    db.session.flush()
+    expense_changed(group, expense, rows)
+    return expense
+
+
+def add_settlement(group, payer, receiver, amount, currency='PLN'):
+    settlement = Settlement(group_id=group.id, payer_id=payer.id, receiver_id=receiver.id, amount=Decimal(amount),
+                            currency=currency, date=datetime(2026, 1, 20))
+    db.session.add(settlement)
+    db.session.flush()
+    settlement_changed(settlement)
+    return settlement
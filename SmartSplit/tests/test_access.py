@@ -0,0 +1,79 @@
+from access import is_group_member
+from tests.factories import login, make_users, make_friends, make_group, add_expense
+
+
+def request_counts(client, count_queries, url, times=2):
+    counts = []
+    for _ in range(times):
+        with count_queries() as statements:
+            response = client.get(url)
+        assert response.status_code in (200, 304), response.status_code
+        counts.append(len(statements))
+    return counts
+
+
+def test_membership_check_is_cached(database, client, count_queries):
+    alice, bob = make_users(2)
+    group = make_group([alice, bob])
+    add_expense(group, alice, {alice: '5.00', bob: '5.00'})
+    database.session.commit()
+    group_id = group.id
+    login(client, alice.id)
+
+    # Pierwsze żądanie: EXISTS po kluczu usergroups, lista walut (do sprawdzenia base) i grupa;
+    # kolejne: członkostwo i waluty z cache, tylko grupa
+    assert request_counts(client, count_queries, f'/charts/{group_id}') == [3, 1]
+
+
+def test_charts_data_revalidation_runs_one_query(database, client, count_queries):
+    alice, bob = make_users(2)
+    group = make_group([alice, bob])
+    add_expense(group, alice, {alice: '5.00', bob: '5.00'})
+    database.session.commit()
+    group_id = group.id
+    login(client, alice.id)
+
+    url = f'/charts_data/{group_id}'
+    first = client.get(url)
+    assert first.status_code == 200
+
+    # Członkostwo z cache, ETag z wersji danych grupy - jedno zapytanie i odpowiedź 304 bez danych
+    with count_queries() as statements:
+        response = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 304
+    assert len(statements) == 1
+
+
+def test_non_member_is_rejected_without_loading_members(database, client, count_queries):
+    alice, bob, mallory = make_users(3)
+    group = make_group([alice, bob])
+    database.session.commit()
+    group_id = group.id
+    login(client, mallory.id)
+
+    with count_queries() as statements:
+        response = client.get(f'/group/{group_id}/suggested_settlements')
+    assert response.status_code == 403
+    # EXISTS i odczyt grupy po kluczu (odróżnienie 403 od 404), bez listy członków
+    assert len(statements) == 2
+    assert not any('usergroups JOIN users' in statement for statement in statements)
+
+    assert client.get('/group/999999/suggested_settlements').status_code == 404
+
+
+def test_membership_cache_is_invalidated_when_member_is_added(database, client):
+    alice, bob = make_users(2)
+    make_friends(alice, [bob])
+    group = make_group([alice])
+    database.session.commit()
+    group_id = group.id
+
+    login(client, bob.id)
+    assert client.get(f'/group/{group_id}/suggested_settlements').status_code == 403
+
+    login(client, alice.id)
+    assert client.post(f'/group/{group_id}/members', json={'userIds': [bob.id]}).status_code == 200
+
+    login(client, bob.id)
+    assert client.get(f'/group/{group_id}/suggested_settlements').status_code == 200
+    assert is_group_member(bob.id, group_id)
@@ -0,0 +1,128 @@
+from types import SimpleNamespace
+import pytest
+from hypothesis import given, settings, strategies as st, HealthCheck
+from calculate_balance import calculate_balance
+from models import User, Group, UserGroup, Expense, ExpenseShare, Settlement
+from money import from_cents
+from vectorized_balance import build_balance_matrix, calculate_balance_vectorized, matrix_to_balance_sheet
+
+pytest.importorskip('numpy')
+
+MEMBERS = (1, 2, 3, 4, 5)
+# Osoby spoza grupy (np. byli członkowie) - ich udziały są pomijane, spłaty liczone
+OUTSIDERS = (6, 7)
+CURRENCIES = ('PLN', 'EUR', 'USD')
+
+cents = st.integers(min_value=0, max_value=10 ** 9)
+
+
+@st.composite
+def expenses(draw):
+    payer = draw(st.sampled_from(MEMBERS + OUTSIDERS))
+    participants = draw(st.lists(st.sampled_from(MEMBERS + OUTSIDERS), min_size=1, max_size=6, unique=True))
+    # Część wydatków nie ma udziału płatnika (paid_by == user_id) - oba silniki je pomijają
+    if draw(st.booleans()) and payer not in participants:
+        participants.append(payer)
+    return SimpleNamespace(
+        currency=draw(st.sampled_from(CURRENCIES)),
+        shares=[SimpleNamespace(user_id=user_id, share=from_cents(draw(cents)), paid_by=payer)
+                for user_id in participants],
+    )
+
+
+settlements = st.builds(
+    SimpleNamespace,
+    payer_id=st.sampled_from(MEMBERS + OUTSIDERS),
+    receiver_id=st.sampled_from(MEMBERS + OUTSIDERS),
+    amount=cents.map(from_cents),
+    currency=st.sampled_from(CURRENCIES),
+)
+
+
+def balance_columns(group):
+    """
+    Odpowiednik load_balance_columns dla grupy zbudowanej w pamięci.
+    """
+    shares = []
+    for expense in group.expenses:
+        payer_ids = [share.user_id for share in expense.shares if share.paid_by == share.user_id]
+        for payer_id in payer_ids:
+            shares += [(payer_id, share.user_id, expense.currency, int(share.share.scaleb(2)))
+                       for share in expense.shares if share.user_id != payer_id]
+    settlement_rows = [(settlement.payer_id, settlement.receiver_id, settlement.currency,
+                        int(settlement.amount.scaleb(2))) for settlement in group.settlements]
+    return shares, settlement_rows
+
+
+def non_zero(balance_sheet):
+    """
+    Spłaszcza saldo do {(dłużnik, wierzyciel, waluta): kwota} bez pozycji zerowych (silnik NumPy ich nie zwraca).
+    """
+    return {
+        (user_id, other_user_id, currency): amount
+        for user_id, balances in balance_sheet.items()
+        for other_user_id, currencies in balances.items()
+        for currency, amount in currencies.items()
+        if amount
+    }
+
+
+def assert_same_to_the_cent(expected, actual):
+    expected, actual = non_zero(expected), non_zero(actual)
+    assert actual == expected
+    assert all(amount.as_tuple().exponent == -2 for amount in actual.values())
+
+
+@settings(max_examples=300)
+@given(expense_list=st.lists(expenses(), max_size=30), settlement_list=st.lists(settlements, max_size=15))
+def test_numpy_engine_matches_calculate_balance(expense_list, settlement_list):
+    group = SimpleNamespace(id=1, members=[SimpleNamespace(id=user_id) for user_id in MEMBERS],
+                            expenses=expense_list, settlements=settlement_list)
+
+    shares, settlement_rows = balance_columns(group)
+    matrix, user_ids, currencies = build_balance_matrix(MEMBERS, shares, settlement_rows)
+
+    assert_same_to_the_cent(calculate_balance(group), matrix_to_balance_sheet(matrix, user_ids, currencies))
+
+
+@given(expense_list=st.lists(expenses(), max_size=30), settlement_list=st.lists(settlements, max_size=15))
+def test_balance_is_antisymmetric(expense_list, settlement_list):
+    group = SimpleNamespace(id=1, members=[SimpleNamespace(id=user_id) for user_id in MEMBERS],
+                            expenses=expense_list, settlements=settlement_list)
+
+    balances = non_zero(calculate_balance(group))
+    for (user_id, other_user_id, currency), amount in balances.items():
+        assert balances[(other_user_id, user_id, currency)] == -amount
+
+
+@settings(max_examples=20, deadline=None, suppress_health_check=[HealthCheck.function_scoped_fixture])
+@given(expense_list=st.lists(expenses(), max_size=10), settlement_list=st.lists(settlements, max_size=5))
+def test_numpy_engine_matches_calculate_balance_in_database(database, expense_list, settlement_list):
+    database.session.rollback()
+    for model in (ExpenseShare, Expense, Settlement, UserGroup, Group, User):
+        database.session.query(model).delete()
+
+    database.session.add_all(User(id=user_id, username=f'user{user_id}', email=f'user{user_id}@example.invalid',
+                                  password='-') for user_id in MEMBERS + OUTSIDERS)
+    database.session.flush()
+    group = Group(name='Trip', created_by=MEMBERS[0])
+    database.session.add(group)
+    database.session.flush()
+    database.session.add_all(UserGroup(user_id=user_id, group_id=group.id) for user_id in MEMBERS)
+
+    for expense in expense_list:
+        database.session.add(Expense(
+            group_id=group.id, description='-', currency=expense.currency, created_by=expense.shares[0].paid_by,
+            amount=sum(share.share for share in expense.shares),
+            shares=[ExpenseShare(user_id=share.user_id, share=share.share, paid_by=share.paid_by)
+                    for share in expense.shares],
+        ))
+    database.session.add_all(Settlement(group_id=group.id, payer_id=settlement.payer_id,
+                                        receiver_id=settlement.receiver_id, amount=settlement.amount,
+                                        currency=settlement.currency) for settlement in settlement_list)
+    database.session.flush()
+    database.session.expire_all()
+
+    # Silnik NumPy czyta udziały z bazy (load_balance_columns), calculate_balance z relacji ORM
+    group = database.session.get(Group, group.id)
+    assert_same_to_the_cent(calculate_balance(group), calculate_balance_vectorized(group))
@@ -0,0 +1,43 @@
+from tests.factories import make_users, make_group, add_expense
+
+
+def test_bench_money_reports_every_path(app):
+    result = app.test_cli_runner().invoke(args=['bench-money', '--amounts', '100', '--repeat', '1'])
+
+    assert result.exit_code == 0, result.output
+    for path in ('parse', 'read', 'sum', 'split', 'convert'):
+        assert f"{path} decimal (100 amounts)" in result.output
+        assert f"{path} cents (100 amounts)" in result.output
+
+
+def test_bench_settle_up_fails_over_the_limit(app, database):
+    alice, bob, carol = make_users(3)
+    group = make_group([alice, bob, carol])
+    add_expense(group, alice, {alice: '10.00', bob: '10.00', carol: '10.00'})
+    database.session.commit()
+
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['bench-settle-up', '--group-id', str(group.id), '--repeat', '1'])
+    assert result.exit_code == 0, result.output
+    assert f"Group {group.id}, 3 members, 3 shares, 1 runs:" in result.output
+
+    result = runner.invoke(args=['bench-settle-up', '--group-id', str(group.id), '--repeat', '1', '--limit', '0'])
+    assert result.exit_code == 1
+    assert "over the limit of 0 ms" in result.output
+
+
+def test_check_export_memory_fails_over_the_limit(app, database):
+    alice, bob = make_users(2)
+    group = make_group([alice, bob])
+    add_expense(group, alice, {alice: '10.00', bob: '10.00'})
+    database.session.commit()
+
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['check-export-memory', '--group-id', str(group.id)])
+    assert result.exit_code == 0, result.output
+    assert f"Exported shares of group {group.id} as csv: 3 lines" in result.output
+
+    result = runner.invoke(args=['check-export-memory', '--group-id', str(group.id), '--format', 'ndjson',
+                                 '--limit', '0'])
+    assert result.exit_code == 1
+    assert "over the limit of 0 MB" in result.output
@@ -0,0 +1,85 @@
+import pytest
+from models import Group
+from tests.factories import login, make_users, make_friends, make_group, add_expense, add_settlement
+
+
+@pytest.fixture
+def group_ids(database):
+    """
+    Grupa Alice (twórczyni), Boba i Dave'a (bez wydatków) z jednym wydatkiem i jedną spłatą.
+    Carol jest znajomą Alice spoza grupy. Zwraca identyfikatory, bo obiekty wygasają po commit.
+    """
+    alice, bob, carol, dave = make_users(4)
+    make_friends(alice, [bob, carol, dave])
+    group = make_group([alice, bob, dave])
+    expense = add_expense(group, alice, {alice: '10.00', bob: '10.00'})
+    settlement = add_settlement(group, bob, alice, '5.00')
+    database.session.commit()
+    return {'group': group.id, 'expense': expense.id, 'settlement': settlement.id,
+            'alice': alice.id, 'bob': bob.id, 'carol': carol.id, 'dave': dave.id}
+
+
+def expense_form(ids, amount):
+    return {'description': 'Taxi', 'amount': amount, 'currency': 'PLN', 'category': 'Travel', 'split_type': 'equal',
+            'members': [ids['alice'], ids['bob']], 'paid_by': ids['alice']}
+
+
+WRITES = {
+    'add_expense': lambda client, ids: client.post(f"/group/{ids['group']}/add_expense",
+                                                   data=expense_form(ids, '30.00')),
+    'edit_expense': lambda client, ids: client.post(f"/expense/{ids['expense']}/edit",
+                                                    data=expense_form(ids, '44.00')),
+    'delete_expense': lambda client, ids: client.post(f"/expense/{ids['expense']}/delete"),
+    'settle': lambda client, ids: client.post(f"/group/{ids['group']}/settle",
+                                              data={'payer_id': ids['bob'], 'amount': '1.00', 'currency': 'PLN'}),
+    'edit_settlement': lambda client, ids: client.post(
+        f"/group/{ids['group']}/settlement/edit/{ids['settlement']}",
+        data={'payer_id': ids['bob'], 'amount': '2.00', 'currency': 'PLN'}),
+    'delete_settlement': lambda client, ids: client.post(
+        f"/group/{ids['group']}/settlement/delete/{ids['settlement']}"),
+    'import': lambda client, ids: client.post(f"/group/{ids['group']}/import", json=[
+        {'description': 'Hotel', 'amount': '90.00', 'currency': 'PLN', 'date': '2026-01-10',
+         'paid_by': ids['bob'], 'split': 'equal', 'members': [ids['alice'], ids['bob']]},
+    ]),
+    'add_member': lambda client, ids: client.post(f"/group/{ids['group']}/members", json={'userIds': [ids['carol']]}),
+    'remove_member': lambda client, ids: client.post(f"/group/{ids['group']}/members/remove",
+                                                     json={'userIds': [ids['dave']]}),
+}
+
+
+def data_version(database, group_id):
+    database.session.expire_all()
+    return database.session.get(Group, group_id).data_version
+
+
+@pytest.mark.parametrize('write', sorted(WRITES))
+def test_every_write_invalidates_cached_group_data(database, client, group_ids, write):
+    login(client, group_ids['alice'])
+    charts_url = f"/charts_data/{group_ids['group']}"
+
+    version = data_version(database, group_ids['group'])
+    etag = client.get(charts_url).headers['ETag']
+    summary = client.get('/dashboard/summary').get_json()
+    assert client.get(charts_url, headers={'If-None-Match': etag}).status_code == 304
+
+    response = WRITES[write](client, group_ids)
+    assert response.status_code in (200, 201, 302), response.get_data(as_text=True)
+
+    assert data_version(database, group_ids['group']) > version
+    # Zapisany ETag i odpowiedź z cache nie mogą już zostać użyte
+    response = client.get(charts_url, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+    if write not in ('add_member', 'remove_member'):
+        assert client.get('/dashboard/summary').get_json() != summary
+
+
+def test_rejected_write_keeps_version(database, client, group_ids):
+    login(client, group_ids['alice'])
+    version = data_version(database, group_ids['group'])
+
+    # Boba nie można usunąć (ma wydatki i spłaty) - transakcja jest wycofana
+    response = client.post(f"/group/{group_ids['group']}/members/remove", json={'userIds': [group_ids['bob']]})
+    assert response.status_code == 409
+    assert data_version(database, group_ids['group']) == version
@@ -0,0 +1,93 @@
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP
+import pytest
+from charts import get_charts_data_for_group_and_user, get_charts_data_from_expenses, get_charts_data_from_rollup
+from models import Currency, CurrencyRate, Expense, ExpenseShare
+from tests.factories import login, make_users, make_group, add_expense
+
+
+def test_unknown_base_currency_is_rejected(database, client):
+    alice, = make_users(1)
+    group = make_group([alice])
+    database.session.add(Currency(currency_code='EUR', exchange_rate='4.300000'))
+    database.session.commit()
+    group_id = group.id
+    login(client, alice.id)
+
+    for url in (f'/charts/{group_id}', f'/charts_data/{group_id}'):
+        assert client.get(url, query_string={'base': 'XYZ'}).status_code == 400
+        assert client.get(url, query_string={'base': "');alert(1);//"}).status_code == 400
+        assert client.get(url, query_string={'base': 'eur'}).status_code == 200
+        assert client.get(url, query_string={'base': 'PLN'}).status_code == 200
+
+
+def make_multi_currency_group(database):
+    alice, bob = make_users(2)
+    group = make_group([alice, bob])
+    database.session.add_all([
+        Currency(currency_code='EUR', exchange_rate='4.300000'),
+        Currency(currency_code='USD', exchange_rate='4.000000'),
+    ])
+    add_expense(group, alice, {alice: '10.00', bob: '20.00'}, currency='PLN', created_at=datetime(2026, 1, 5))
+    add_expense(group, bob, {alice: '7.33', bob: '7.33'}, currency='EUR', created_at=datetime(2026, 1, 12))
+    add_expense(group, alice, {alice: '0.01', bob: '19.99'}, currency='USD', created_at=datetime(2026, 1, 28),
+                category='Travel')
+    add_expense(group, bob, {alice: '3.00', bob: '3.00'}, currency='EUR', created_at=datetime(2026, 2, 1))
+    database.session.commit()
+    return group, alice
+
+
+@pytest.mark.parametrize('source', ['expenses', 'rollup'])
+@pytest.mark.parametrize('base_currency', ['PLN', 'EUR', 'USD'])
+def test_chart_totals_equal_converted_sums(app, database, monkeypatch, source, base_currency):
+    monkeypatch.setitem(app.config, 'CHARTS_SOURCE', source)
+    group, alice = make_multi_currency_group(database)
+
+    expenses = database.session.query(Expense).filter_by(group_id=group.id).all()
+    alice_shares = {share.expense_id: share.share
+                    for share in database.session.query(ExpenseShare).filter_by(user_id=alice.id)}
+    rates = {'PLN': Decimal(1), 'EUR': Decimal('4.3'), 'USD': Decimal('4.0')}
+
+    def converted_sum(amounts_by_expense, month):
+        total = sum(amounts_by_expense[expense.id] * rates[expense.currency] / rates[base_currency]
+                    for expense in expenses if expense.created_at.strftime('%Y-%m') == month)
+        return total.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+    group_data, user_data = get_charts_data_for_group_and_user(group, alice.id, base_currency)
+
+    amounts = {expense.id: expense.amount for expense in expenses}
+    assert group_data['monthly']['labels'] == ['2026-01', '2026-02']
+    assert group_data['monthly']['values'] == [converted_sum(amounts, '2026-01'), converted_sum(amounts, '2026-02')]
+    assert user_data['monthly']['values'] == [converted_sum(alice_shares, '2026-01'),
+                                              converted_sum(alice_shares, '2026-02')]
+
+
+@pytest.mark.parametrize('base_currency', ['PLN', 'EUR'])
+def test_both_sources_leave_out_currencies_without_a_rate(database, base_currency):
+    group, alice = make_multi_currency_group(database)
+    # GBP nie ma kursu w bazie
+    add_expense(group, alice, {alice: '50.00'}, currency='GBP', created_at=datetime(2026, 1, 20))
+    add_expense(group, alice, {alice: '8.00'}, currency='GBP', created_at=datetime(2026, 3, 3), category='Fun')
+    database.session.commit()
+
+    from_expenses = get_charts_data_from_expenses(group, alice.id, base_currency)
+    from_rollup = get_charts_data_from_rollup(group, alice.id, base_currency)
+
+    assert from_rollup == from_expenses
+    group_data, _ = from_rollup
+    assert group_data['monthly']['labels'] == ['2026-01', '2026-02']
+
+
+def test_expense_charts_convert_at_the_rate_of_the_expense_day(app, database, monkeypatch):
+    monkeypatch.setitem(app.config, 'CHARTS_SOURCE', 'expenses')
+    group, alice = make_multi_currency_group(database)
+    database.session.add_all([
+        CurrencyRate(currency_code='EUR', rate_date=date(2026, 1, 1), exchange_rate='4.100000'),
+        CurrencyRate(currency_code='EUR', rate_date=date(2026, 1, 20), exchange_rate='4.600000'),
+        CurrencyRate(currency_code='USD', rate_date=date(2026, 1, 1), exchange_rate='3.900000'),
+    ])
+    database.session.commit()
+
+    # Styczeń: 30.00 PLN + 14.66 EUR po 4.10 + 20.00 USD po 3.90, luty: 6.00 EUR po 4.60
+    group_data, _ = get_charts_data_for_group_and_user(group, alice.id, 'PLN')
+    assert group_data['monthly']['values'] == [Decimal('168.11'), Decimal('27.60')]
@@ -0,0 +1,91 @@
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+import pytest
+from calculate_balance import compute_balance
+from dashboard_summary import get_dashboard_summary, get_dashboard_version
+from models import Currency
+from tests.factories import make_users, make_group, add_expense, add_settlement
+
+
+def seed_groups(database):
+    database.session.add(Currency(currency_code='EUR', exchange_rate='4.300000'))
+    alice, bob, carol, dave = make_users(4)
+    trip = make_group([alice, bob, carol], name='Trip')
+    flat = make_group([alice, bob, dave], name='flat')
+    add_expense(trip, alice, {alice: '10.00', bob: '10.00', carol: '10.00'})
+    add_expense(trip, bob, {alice: '4.50', bob: '4.50'}, currency='EUR')
+    add_expense(trip, carol, {alice: '7.25', carol: '7.25'}, created_at=datetime(2026, 1, 16))
+    add_settlement(trip, bob, alice, '3.00')
+    add_expense(flat, bob, {alice: '20.00', bob: '20.00', dave: '20.00'})
+    add_expense(flat, dave, {alice: '1.00', dave: '1.00'}, currency='EUR')
+    # Saldo wyzerowane spłatą nie powinno pojawić się w podsumowaniu
+    add_expense(flat, alice, {alice: '5.00', dave: '5.00'})
+    add_settlement(flat, dave, alice, '5.00')
+    database.session.commit()
+    return alice, [trip, flat]
+
+
+def test_summary_matches_the_balance_computed_from_scratch(database):
+    alice, groups = seed_groups(database)
+
+    owe, owed = defaultdict(Decimal), defaultdict(Decimal)
+    by_group, by_person = {}, defaultdict(lambda: defaultdict(Decimal))
+    for group in groups:
+        sheet = compute_balance(group)
+        by_group[group.id] = {}
+        for other_id, currencies in sheet[alice.id].items():
+            for currency, amount in currencies.items():
+                if amount > 0:
+                    owe[currency] += amount
+                elif amount < 0:
+                    owed[currency] -= amount
+                if amount:
+                    by_group[group.id][(other_id, currency)] = -amount
+                    by_person[other_id][currency] -= amount
+
+    summary = get_dashboard_summary(alice.id)
+
+    assert summary['owe'] == dict(owe)
+    assert summary['owed'] == dict(owed)
+    assert summary['net'] == {currency: owed[currency] - owe[currency] for currency in set(owe) | set(owed)
+                              if owed[currency] != owe[currency]}
+    assert [group['name'] for group in summary['groups']] == ['flat', 'Trip']
+    for group in summary['groups']:
+        assert {(entry['user_id'], entry['currency']): entry['amount'] for entry in group['counterparties']} == \
+            by_group[group['id']]
+        net = defaultdict(Decimal)
+        for (_, currency), amount in by_group[group['id']].items():
+            net[currency] += amount
+        assert group['net'] == {currency: amount for currency, amount in net.items() if amount}
+    assert {person['user_id']: person['net'] for person in summary['people']} == \
+        {other_id: {currency: amount for currency, amount in net.items() if amount}
+         for other_id, net in by_person.items() if any(net.values())}
+
+
+def test_summary_totals(database):
+    alice, _ = seed_groups(database)
+
+    summary = get_dashboard_summary(alice.id)
+
+    # Trip: bob winny 10.00 - 3.00 PLN, carol 10.00 - 7.25 PLN, alice winna bobowi 4.50 EUR;
+    # flat: alice winna bobowi 20.00 PLN i dave'owi 1.00 EUR, z dave'em rozliczona w PLN
+    assert summary['owe'] == {'EUR': Decimal('5.50'), 'PLN': Decimal('20.00')}
+    assert summary['owed'] == {'PLN': Decimal('9.75')}
+    assert summary['net'] == {'EUR': Decimal('-5.50'), 'PLN': Decimal('-10.25')}
+    assert [(person['username'], person['net']) for person in summary['people']] == [
+        ('user1', {'EUR': Decimal('-4.50'), 'PLN': Decimal('-13.00')}),
+        ('user2', {'PLN': Decimal('2.75')}),
+        ('user3', {'EUR': Decimal('-1.00')}),
+    ]
+
+
+@pytest.mark.filterwarnings('error::sqlalchemy.exc.SADeprecationWarning')
+def test_version_changes_with_group_data(database):
+    alice, groups = seed_groups(database)
+    version = get_dashboard_version(alice.id)
+
+    assert version == tuple((group.id, group.data_version) for group in sorted(groups, key=lambda group: group.id))
+    add_expense(groups[0], alice, {alice: '1.00'})
+    database.session.commit()
+    assert get_dashboard_version(alice.id) != version
@@ -0,0 +1,149 @@
+import socketserver
+import threading
+from datetime import timedelta
+import pytest
+from sqlalchemy import func
+import email_outbox
+from email_outbox import SmtpConnection, enqueue_email, send_pending_emails, get_email_outbox_stats
+from models import OutgoingEmail
+
+
+class SmtpStandIn(socketserver.ThreadingTCPServer):
+    """
+    Lokalny serwer SMTP na potrzeby testów: przyjmuje wiadomości bez uwierzytelniania, zapamiętuje je
+    i liczy połączenia. Adresy z rejected są odrzucane przy RCPT TO (550), jak przez prawdziwy serwer.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SmtpStandInHandler)
+        self.connections = 0
+        self.messages = []
+        self.rejected = set()
+
+
+class SmtpStandInHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost stand-in')
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().strip()
+            command = line[:4].upper()
+            if not line or command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            if command == 'EHLO':
+                self.reply('250 localhost')
+            elif command == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif command == 'RCPT':
+                recipient = line.split(':', 1)[1].strip(' <>')
+                if recipient in self.server.rejected:
+                    self.reply('550 No such user')
+                else:
+                    recipients.append(recipient)
+                    self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() != b'.\r\n':
+                    pass
+                self.server.messages.extend(recipients)
+                self.reply('250 OK')
+            else:
+                self.reply('250 OK')
+
+
+@pytest.fixture
+def smtp_server():
+    server = SmtpStandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def connection(smtp_server):
+    connection = SmtpConnection('127.0.0.1', smtp_server.server_address[1], use_ssl=False, timeout=5)
+    yield connection
+    connection.close()
+
+
+def seconds_until_next_attempt(database, email_id):
+    return database.session.query(
+        func.extract('epoch', OutgoingEmail.next_attempt_at - func.now())
+    ).filter(OutgoingEmail.id == email_id).scalar()
+
+
+def test_batches_reuse_one_connection(database, smtp_server, connection):
+    for index in range(5):
+        enqueue_email(f'user{index}@example.invalid', 'Payment Reminder', '-')
+    database.session.commit()
+    before = get_email_outbox_stats()
+
+    assert send_pending_emails(connection, batch_size=3) == 3
+    assert send_pending_emails(connection, batch_size=3) == 2
+    assert send_pending_emails(connection, batch_size=3) == 0
+
+    assert smtp_server.connections == 1
+    assert sorted(smtp_server.messages) == [f'user{index}@example.invalid' for index in range(5)]
+    assert database.session.query(OutgoingEmail).filter_by(status='sent').count() == 5
+
+    after = get_email_outbox_stats()
+    assert after['connections'] - before['connections'] == 1
+    assert after['sent'] - before['sent'] == 5
+    assert after['batches'] - before['batches'] == 2
+    assert after['queue_depth'] == 0
+    assert after['oldest_pending_seconds'] is None
+    assert after['avg_send_seconds'] > 0
+
+
+def test_failed_send_is_retried_with_growing_delay(app, database, smtp_server, connection, monkeypatch):
+    monkeypatch.setitem(app.config, 'EMAIL_RETRY_DELAY', 30)
+    monkeypatch.setitem(app.config, 'EMAIL_MAX_ATTEMPTS', 3)
+    smtp_server.rejected.add('bounce@example.invalid')
+    bounced = enqueue_email('bounce@example.invalid', 'Payment Reminder', '-')
+    enqueue_email('user0@example.invalid', 'Payment Reminder', '-')
+    database.session.commit()
+    email_id = bounced.id
+
+    delays = []
+    for _ in range(2):
+        assert send_pending_emails(connection) >= 1
+        email = database.session.get(OutgoingEmail, email_id)
+        assert (email.status, email.last_error is not None) == ('pending', True)
+        delays.append(seconds_until_next_attempt(database, email_id))
+        # Nie czekamy na opóźnienie - wiadomość od razu staje się gotowa do ponowienia
+        email.next_attempt_at = func.now()
+        database.session.commit()
+
+    assert delays[0] == pytest.approx(30, abs=2)
+    assert delays[1] == pytest.approx(60, abs=2)
+
+    assert send_pending_emails(connection) == 1
+    database.session.expire_all()
+    email = database.session.get(OutgoingEmail, email_id)
+    assert (email.status, email.attempts) == ('failed', 3)
+    # Pozostałe wiadomości z paczki zostały wysłane mimo błędu
+    assert smtp_server.messages == ['user0@example.invalid']
+
+
+def test_stats_report_queue_depth_and_age(database):
+    enqueue_email('user0@example.invalid', 'Payment Reminder', '-')
+    enqueue_email('user1@example.invalid', 'Payment Reminder', '-')
+    database.session.commit()
+    database.session.query(OutgoingEmail).update({OutgoingEmail.created_at: func.now() - timedelta(minutes=2)})
+    database.session.commit()
+
+    stats = get_email_outbox_stats()
+    assert stats['queue_depth'] == 2
+    assert stats['oldest_pending_seconds'] >= 120
+    assert set(email_outbox._outbox_stats) <= set(stats)
@@ -0,0 +1,89 @@
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal
+import pytest
+import exchange_rate
+from exchange_rate import get_exchange_rate, get_rate_cache_stats, convert_to_pln, update_currency_rates
+from models import Currency, CurrencyRate
+from money import Money
+from rate_providers import RateProvider, RateProviderError
+
+
+class StubRateProvider(RateProvider):
+    """
+    Dostawca kursów zwracający podane kursy (względem EUR, jak Fixer) i liczący wywołania.
+    """
+
+    def __init__(self, rates=None, error=None):
+        self.rates = rates or {'EUR': Decimal('1'), 'PLN': Decimal('4.3'), 'USD': Decimal('1.075')}
+        self.error = error
+        self.calls = 0
+
+    def fetch_rates(self):
+        self.calls += 1
+        if self.error:
+            raise RateProviderError(self.error)
+        return 'EUR', self.rates
+
+
+@pytest.fixture
+def provider(database, monkeypatch):
+    provider = StubRateProvider()
+    monkeypatch.setattr(exchange_rate, 'get_rate_provider', lambda: provider)
+    monkeypatch.setattr(exchange_rate, '_last_refresh_attempt', None)
+    return provider
+
+
+def wait_for_background_refresh():
+    for thread in threading.enumerate():
+        if thread.name == 'currency-rate-refresh':
+            thread.join(timeout=10)
+
+
+def test_rates_are_stored_relative_to_pln_with_history(database, provider):
+    assert update_currency_rates(provider)
+
+    rates = {currency.currency_code: currency.exchange_rate for currency in database.session.query(Currency)}
+    assert rates == {'EUR': Decimal('4.300000'), 'PLN': Decimal('1.000000'), 'USD': Decimal('4.000000')}
+    history = database.session.query(CurrencyRate).filter_by(currency_code='USD').one()
+    assert history.exchange_rate == Decimal('4.000000')
+
+
+def test_missing_rate_is_fetched_once_then_served_from_memory(database, provider, count_queries):
+    assert get_exchange_rate('EUR') == Decimal('4.300000')
+    assert provider.calls == 1
+
+    hits = get_rate_cache_stats()['hits']
+    with count_queries() as statements:
+        assert get_exchange_rate('USD') == Decimal('4.000000')
+        assert convert_to_pln(Money.parse('10.00', 'EUR'), 'EUR') == Money.parse('43.00', 'PLN')
+    assert statements == []
+    assert provider.calls == 1
+    assert get_rate_cache_stats()['hits'] == hits + 2
+
+
+def test_stale_rate_is_served_while_refreshing_in_background(database, provider):
+    database.session.add(Currency(currency_code='EUR', exchange_rate=Decimal('4.1'),
+                                  last_updated=datetime.utcnow() - timedelta(hours=9)))
+    database.session.commit()
+
+    # Nieaktualny kurs jest zwracany od razu, bez czekania na dostawcę
+    assert get_exchange_rate('EUR') == Decimal('4.100000')
+    wait_for_background_refresh()
+
+    assert provider.calls == 1
+    assert get_exchange_rate('EUR') == Decimal('4.300000')
+
+
+def test_failed_refresh_is_not_retried_immediately(database, provider):
+    provider.error = 'service unavailable'
+    failures = get_rate_cache_stats()['refresh_failures']
+
+    with pytest.raises(ValueError):
+        get_exchange_rate('EUR')
+    with pytest.raises(ValueError):
+        get_exchange_rate('EUR')
+
+    # Druga próba mieści się w RATE_REFRESH_RETRY - dostawca nie jest odpytywany ponownie
+    assert provider.calls == 1
+    assert get_rate_cache_stats()['refresh_failures'] == failures + 1
@@ -0,0 +1,118 @@
+import json
+from decimal import Decimal
+from io import BytesIO
+from balance_ledger import find_balance_drift
+from expense_import import parse_import, validate_import
+from models import Currency, Expense, ExpenseShare, Group
+from tests.factories import login, make_users, make_group
+
+CSV_HEADER = 'description,amount,currency,category,date,paid_by,split,members,shares\n'
+
+
+def seed_group(database):
+    database.session.add(Currency(currency_code='EUR', exchange_rate='4.300000'))
+    alice, bob, outsider = make_users(3)
+    group = make_group([alice, bob])
+    database.session.commit()
+    return group, alice, bob, outsider
+
+
+def test_rows_are_validated_one_by_one(database):
+    group, alice, bob, outsider = seed_group(database)
+
+    rows = parse_import(CSV_HEADER + (
+        f'Dinner,30.00,PLN,Food,2026-01-15,{alice.id},equal,{alice.id};{bob.id},\n'
+        f'Taxi,12.00,GBP,Travel,2026-01-16,{outsider.id},equal,{alice.id};{outsider.id},\n'
+        f'Hotel,100.00,EUR,Rent,yesterday,user1,custom,,user0:60.00;user1:30.00\n'
+        f',-5,PLN,,,user0,thirds,,\n'
+        f'Museum,20.00,eur,Fun,2026-01-17,user1,percentage,,user0:25;#{bob.id}:75\n'
+    ), 'csv')
+    expenses, errors = validate_import(group, rows, alice.id)
+
+    assert errors == [
+        (2, 'unknown currency: GBP'),
+        (2, f"payer: not a member of the group: '{outsider.id}'"),
+        (2, f"not a member of the group: '{outsider.id}'"),
+        (3, "invalid date: 'yesterday'"),
+        (3, 'Custom shares do not add up to the total amount.'),
+        (4, 'description is required'),
+        (4, 'amount must be positive'),
+        (4, "unsupported split type: 'thirds'"),
+    ]
+    assert [(expense.description, expense.currency, expense.paid_by) for expense in expenses] == [
+        ('Dinner', 'PLN', alice.id),
+        ('Museum', 'EUR', bob.id),
+    ]
+    assert {user_id: share.amount for user_id, share in expenses[1].shares.items()} == \
+        {alice.id: Decimal('5.00'), bob.id: Decimal('15.00')}
+
+
+def test_username_that_looks_like_an_id_is_not_confused_with_it(database):
+    group, alice, bob, _ = seed_group(database)
+    # Bob nazywa się tak, jak brzmi id Alice
+    bob.username = str(alice.id)
+    database.session.commit()
+
+    rows = [
+        {'description': 'Ambiguous payer', 'amount': '10.00', 'paid_by': str(alice.id), 'members': [bob.id]},
+        {'description': 'Payer by id', 'amount': '10.00', 'paid_by': f'#{alice.id}', 'members': [bob.id]},
+        {'description': 'Ambiguous member', 'amount': '10.00', 'paid_by': 'user0', 'members': [str(alice.id)]},
+        {'description': 'Member by id', 'amount': '10.00', 'paid_by': 'user0', 'members': [str(bob.id)]},
+    ]
+    expenses, errors = validate_import(group, rows, alice.id)
+
+    assert {number for number, _ in errors} == {1, 3}
+    assert errors[0][1].startswith(f"payer: ambiguous member '{alice.id}'")
+    assert errors[1][1].startswith(f"ambiguous member '{alice.id}'")
+    assert [(expense.description, expense.paid_by, list(expense.shares)) for expense in expenses] == [
+        ('Payer by id', alice.id, [bob.id]),
+        ('Member by id', alice.id, [bob.id]),
+    ]
+
+
+def test_import_endpoint_saves_all_rows_or_none(database, client):
+    group, alice, bob, _ = seed_group(database)
+    group_id, alice_id, bob_id = group.id, alice.id, bob.id
+    login(client, alice_id)
+
+    rows = [
+        {'description': 'Dinner', 'amount': 30, 'paid_by': alice_id, 'members': [alice_id, bob_id]},
+        {'description': 'Taxi', 'amount': '12.50', 'currency': 'USD', 'paid_by': bob_id, 'members': [alice_id]},
+    ]
+    response = client.post(f'/group/{group_id}/import', json=rows)
+    assert response.status_code == 400
+    assert response.get_json()['errors'] == [{'row': 2, 'message': 'unknown currency: USD'}]
+    assert database.session.query(Expense).count() == 0
+
+    rows[1]['currency'] = 'EUR'
+    response = client.post(f'/group/{group_id}/import', data={
+        'file': (BytesIO(json.dumps(rows).encode()), 'expenses.json'),
+    })
+    assert response.status_code == 201
+    assert (response.get_json()['imported'], response.get_json()['shares']) == (2, 3)
+    assert sorted(database.session.query(Expense.description)) == [('Dinner',), ('Taxi',)]
+    assert database.session.query(ExpenseShare).count() == 3
+    assert find_balance_drift(database.session.get(Group, group_id)) == []
+
+
+def test_import_command(app, database, tmp_path):
+    group, alice, bob, _ = seed_group(database)
+    group_id = group.id
+    runner = app.test_cli_runner()
+
+    bad = tmp_path / 'bad.csv'
+    bad.write_text(CSV_HEADER + 'Dinner,30.00,PLN,Food,,user0,equal,user0;user9,\n', encoding='utf-8')
+    result = runner.invoke(args=['import-expenses', str(bad), '--group-id', str(group_id)])
+    assert result.exit_code == 1
+    assert "Row 1: not a member of the group: 'user9'" in result.output
+    assert database.session.query(Expense).count() == 0
+
+    good = tmp_path / 'good.csv'
+    good.write_text(CSV_HEADER + 'Dinner,30.00,PLN,Food,,user0,equal,user0;user1,\n'
+                                 'Taxi,9.99,EUR,Travel,2026-01-16,user1,weights,,user0:2;user1:1\n', encoding='utf-8')
+    result = runner.invoke(args=['import-expenses', str(good), '--group-id', str(group_id)])
+    assert result.exit_code == 0, result.output
+    assert f"Imported 2 expense(s) with 4 share(s) into group {group_id}" in result.output
+    database.session.expire_all()
+    assert sorted(str(share.share) for share in database.session.query(ExpenseShare)) == \
+        ['15.00', '15.00', '3.33', '6.66']
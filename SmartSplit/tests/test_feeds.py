@@ -0,0 +1,105 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from tests.factories import login, make_users, make_group, add_expense, add_settlement
+
+
+def walk(client, url, limit):
+    """
+    Przechodzi wszystkie strony feedu i zwraca identyfikatory w kolejności stron.
+    """
+    ids = []
+    cursor = None
+    while True:
+        page = client.get(url, query_string={'limit': limit, **({'cursor': cursor} if cursor else {})}).get_json()
+        assert len(page['items']) <= limit
+        ids += [item['id'] for item in page['items']]
+        cursor = page['nextCursor']
+        if cursor is None:
+            return ids
+
+
+@pytest.fixture
+def feed_group(database):
+    alice, bob = make_users(2)
+    group = make_group([alice, bob])
+    expenses = []
+    # Kilka wydatków z tą samą datą - kolejność w obrębie daty wyznacza id
+    for index, day in enumerate((3, 1, 2, 2, 2, 5, 4)):
+        payer = alice if index % 2 else bob
+        expenses.append(add_expense(group, payer, {alice: '5.00', bob: '5.00'}, created_at=datetime(2026, 1, day),
+                                    category='Food' if index % 3 else 'Travel', description=f'expense {index}'))
+    settlements = [add_settlement(group, bob, alice, '1.00'), add_settlement(group, alice, bob, '2.00'),
+                   add_settlement(group, bob, alice, '3.00')]
+    database.session.commit()
+    return group.id, alice.id, bob.id, expenses, settlements
+
+
+def newest_first(rows, date_of):
+    return [row.id for row in sorted(rows, key=lambda row: (date_of(row), row.id), reverse=True)]
+
+
+@pytest.mark.parametrize('limit', [1, 2, 3, 7, 100])
+def test_expense_pages_have_no_gaps_or_duplicates(feed_group, client, limit):
+    group_id, alice_id, _, expenses, _ = feed_group
+    login(client, alice_id)
+
+    assert walk(client, f'/group/{group_id}/expenses_feed', limit) == \
+        newest_first(expenses, lambda expense: expense.created_at)
+
+
+@pytest.mark.parametrize('limit', [1, 2, 3])
+def test_settlement_pages_have_no_gaps_or_duplicates(feed_group, client, limit):
+    group_id, alice_id, _, _, settlements = feed_group
+    login(client, alice_id)
+
+    assert walk(client, f'/group/{group_id}/settlements_feed', limit) == \
+        newest_first(settlements, lambda settlement: settlement.date)
+
+
+def test_feed_filters(feed_group, client):
+    group_id, alice_id, bob_id, expenses, settlements = feed_group
+    login(client, alice_id)
+
+    def ids(url, **args):
+        return {item['id'] for item in client.get(url, query_string=args).get_json()['items']}
+
+    feed = f'/group/{group_id}/expenses_feed'
+    assert ids(feed, category='Travel') == {expense.id for expense in expenses if expense.category == 'Travel'}
+    assert ids(feed, payer_id=alice_id) == {expense.id for index, expense in enumerate(expenses) if index % 2}
+    assert ids(feed, date_from='2026-01-02', date_to='2026-01-03') == \
+        {expense.id for expense in expenses if expense.created_at.day in (2, 3)}
+    assert ids(feed, category='Food', date_to='2026-01-02') == \
+        {expense.id for expense in expenses if expense.category == 'Food' and expense.created_at.day <= 2}
+
+    assert ids(f'/group/{group_id}/settlements_feed', payer_id=bob_id) == \
+        {settlement.id for settlement in settlements if settlement.payer_id == bob_id}
+
+
+def test_invalid_feed_arguments_are_rejected(feed_group, client):
+    group_id, alice_id, _, _, _ = feed_group
+    login(client, alice_id)
+
+    for feed in ('expenses_feed', 'settlements_feed'):
+        for args in ({'cursor': 'not-a-cursor'}, {'limit': 0}, {'limit': 'many'}, {'date_from': '2026-13-01'}):
+            response = client.get(f'/group/{group_id}/{feed}', query_string=args)
+            assert response.status_code == 400, args
+            assert 'error' in response.get_json()
+
+
+def test_feed_dates_are_required(feed_group, database):
+    group_id, alice_id, bob_id, _, _ = feed_group
+
+    with pytest.raises(IntegrityError):
+        database.session.execute(text(
+            "INSERT INTO expenses (group_id, description, amount, currency, created_by, created_at) "
+            "VALUES (:group_id, '-', 1, 'PLN', :user_id, NULL)"
+        ), {'group_id': group_id, 'user_id': alice_id})
+    database.session.rollback()
+
+    with pytest.raises(IntegrityError):
+        database.session.execute(text(
+            "INSERT INTO settlement (group_id, payer_id, receiver_id, amount, currency, date) "
+            "VALUES (:group_id, :payer_id, :receiver_id, 1, 'PLN', NULL)"
+        ), {'group_id': group_id, 'payer_id': alice_id, 'receiver_id': bob_id})
@@ -0,0 +1,55 @@
+from friend_suggestions import get_friend_suggestions
+from models import FriendRequest
+from tests.factories import login, make_users, make_friends
+
+
+def suggested_ids(user):
+    return [suggestion['id'] for suggestion in get_friend_suggestions(user.id)]
+
+
+def test_suggestions_rank_friends_of_friends_by_mutual_count(database):
+    alice, bob, carol, dave, erin = make_users(5)
+    make_friends(alice, [bob, carol])
+    make_friends(dave, [bob, carol])
+    make_friends(erin, [bob])
+
+    suggestions = get_friend_suggestions(alice.id)
+    assert [(suggestion['id'], suggestion['mutual_count']) for suggestion in suggestions] == [(dave.id, 2),
+                                                                                              (erin.id, 1)]
+    assert suggestions[0]['mutual_names'] == [bob.username, carol.username]
+
+
+def test_suggestions_skip_pending_requests_in_both_directions(database):
+    alice, bob, carol, dave, erin = make_users(5)
+    make_friends(bob, [alice, carol, dave, erin])
+    database.session.add(FriendRequest(sender_id=alice.id, recipient_id=carol.id, status='pending'))
+    database.session.add(FriendRequest(sender_id=dave.id, recipient_id=alice.id, status='pending'))
+    database.session.add(FriendRequest(sender_id=erin.id, recipient_id=alice.id, status='rejected'))
+    database.session.flush()
+
+    assert suggested_ids(alice) == [erin.id]
+
+
+def test_mutual_friends_only_for_friends_and_suggestions(database, client):
+    alice, bob, carol, dave, stranger = make_users(5)
+    make_friends(alice, [bob, carol])
+    make_friends(dave, [bob])
+    database.session.add(FriendRequest(sender_id=carol.id, recipient_id=dave.id, status='pending'))
+    database.session.commit()
+    ids = {name: user.id for name, user in (('alice', alice), ('bob', bob), ('carol', carol), ('dave', dave),
+                                              ('stranger', stranger))}
+    login(client, ids['alice'])
+
+    # Znajomy znajomego (pojawia się w sugestiach)
+    response = client.get(f"/friends/{ids['dave']}/mutual")
+    assert response.status_code == 200
+    assert [friend['id'] for friend in response.get_json()] == [ids['bob']]
+
+    # Własny znajomy
+    assert client.get(f"/friends/{ids['bob']}/mutual").status_code == 200
+
+    # Obcy, siebie samego i znajomy znajomego z oczekującym zaproszeniem - brak dostępu
+    assert client.get(f"/friends/{ids['stranger']}/mutual").status_code == 403
+    assert client.get(f"/friends/{ids['alice']}/mutual").status_code == 403
+    login(client, ids['carol'])
+    assert client.get(f"/friends/{ids['dave']}/mutual").status_code == 403
@@ -0,0 +1,43 @@
+from datetime import datetime
+from tests.factories import login, make_users, make_group, add_expense, add_settlement
+
+
+def make_group_with_history(expense_count):
+    alice, bob, carol = make_users(3, prefix=f'g{expense_count}-')
+    group = make_group([alice, bob, carol])
+    for index in range(expense_count):
+        payer = (alice, bob, carol)[index % 3]
+        add_expense(group, payer, {alice: '4.00', bob: '3.00', carol: '3.00'},
+                    currency=('PLN', 'EUR')[index % 2], created_at=datetime(2026, 1, 1 + index % 28))
+    for index in range(expense_count // 2):
+        add_settlement(group, bob, alice, '1.00')
+    return group, alice
+
+
+def test_group_page_runs_fixed_number_of_queries(database, client, count_queries):
+    small_group, small_user = make_group_with_history(2)
+    large_group, large_user = make_group_with_history(60)
+    database.session.commit()
+
+    counts = []
+    for group, user in ((small_group, small_user), (large_group, large_user)):
+        url = f'/group/{group.id}'
+        login(client, user.id)
+        with count_queries() as statements:
+            response = client.get(url)
+        assert response.status_code == 200
+        counts.append(len(statements))
+
+    # Grupa, członkowie, pierwsze strony wydatków i spłat, salda, znajomi zalogowanego użytkownika -
+    # niezależnie od liczby wydatków, spłat i walut
+    assert counts == [6, 6]
+
+
+def test_group_page_of_other_group_redirects(database, client):
+    group, _ = make_group_with_history(1)
+    outsider, = make_users(1, prefix='outsider')
+    database.session.commit()
+    login(client, outsider.id)
+
+    response = client.get(f'/group/{group.id}')
+    assert response.status_code == 302
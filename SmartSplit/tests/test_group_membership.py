@@ -0,0 +1,59 @@
+from balance_ledger import find_balance_drift
+from models import UserGroup
+from tests.factories import login, make_users, make_friends, make_group, add_expense, add_settlement
+
+
+def remove(client, group, user_ids):
+    return client.post(f'/group/{group.id}/members/remove', json={'userIds': user_ids})
+
+
+def test_removing_member_with_settled_history_is_rejected(app, database, client):
+    alice, bob, carol, dave = make_users(4)
+    make_friends(alice, [bob, carol, dave])
+    group = make_group([alice, bob, carol, dave])
+    add_expense(group, alice, {alice: '10.00', bob: '10.00', carol: '10.00'})
+    add_settlement(group, bob, alice, '10.00')
+    database.session.commit()
+    login(client, alice.id)
+
+    # Saldo Boba jest zerowe, ale ma udział w wydatku i spłatę - jego usunięcie zmieniłoby saldo Carol
+    response = remove(client, group, [bob.id])
+    assert response.status_code == 409
+    assert response.get_json()['withHistory'] == [bob.id]
+    assert database.session.get(UserGroup, (bob.id, group.id)) is not None
+
+    # Osoba bez wydatków i spłat może zostać usunięta, a salda pozostałych się nie zmieniają
+    response = remove(client, group, [dave.id])
+    assert response.status_code == 200
+    assert response.get_json() == {'removed': [dave.id]}
+
+    database.session.expire_all()
+    assert find_balance_drift(group) == []
+
+    result = app.test_cli_runner().invoke(args=['rebuild-balances', '--verify-only'])
+    assert result.exit_code == 0
+    assert 'No drift found.' in result.output
+
+
+def test_removing_member_with_open_balance_is_rejected(database, client):
+    alice, bob = make_users(2)
+    make_friends(alice, [bob])
+    group = make_group([alice, bob])
+    add_expense(group, alice, {alice: '5.00', bob: '5.00'})
+    database.session.commit()
+    login(client, bob.id)
+
+    response = remove(client, group, [bob.id])
+    assert response.status_code == 409
+    assert str(bob.id) in response.get_json()['openBalances']
+
+
+def test_only_creator_removes_other_members(database, client):
+    alice, bob, carol = make_users(3)
+    group = make_group([alice, bob, carol])
+    database.session.commit()
+    login(client, bob.id)
+
+    assert remove(client, group, [carol.id]).status_code == 400
+    assert remove(client, group, [alice.id]).status_code == 400
+    assert remove(client, group, [bob.id]).get_json() == {'removed': [bob.id]}
@@ -0,0 +1,84 @@
+import logging
+import pytest
+from flask import Flask
+from sqlalchemy import select
+from instrumentation import RequestMetrics, init_instrumentation, statement_shape
+from models import db, User
+
+
+def test_statement_shape_ignores_parameter_values():
+    assert statement_shape("SELECT users.id\n  FROM users WHERE users.id = %(pk_1)s LIMIT 10") == \
+        "SELECT users.id FROM users WHERE users.id = ? LIMIT ?"
+    assert statement_shape("SELECT 1 FROM users WHERE id IN (%(id_1_1)s, %(id_1_2)s, %(id_1_3)s)") == \
+        statement_shape("SELECT 1 FROM users WHERE id IN (%(id_1_1)s)") == \
+        "SELECT ? FROM users WHERE id IN (?)"
+    assert statement_shape("SELECT * FROM users WHERE id = ?") != statement_shape("SELECT * FROM groups WHERE id = ?")
+
+
+def test_metrics_render_in_prometheus_text_format():
+    metrics = RequestMetrics((0.1, 1))
+    metrics.observe('view_group', 200, 0.05, 6, 0.01, False)
+    metrics.observe('view_group', 200, 0.5, 30, 0.2, True)
+    metrics.observe('login', 429, 2, 0, 0.0, False)
+
+    lines = metrics.render().splitlines()
+    assert '# TYPE smartsplit_request_duration_seconds histogram' in lines
+    assert 'smartsplit_request_duration_seconds_bucket{endpoint="view_group",le="0.1"} 1' in lines
+    assert 'smartsplit_request_duration_seconds_bucket{endpoint="view_group",le="1"} 2' in lines
+    assert 'smartsplit_request_duration_seconds_bucket{endpoint="view_group",le="+Inf"} 2' in lines
+    assert 'smartsplit_request_duration_seconds_count{endpoint="view_group"} 2' in lines
+    assert 'smartsplit_requests_total{endpoint="login",status="429"} 1' in lines
+    assert 'smartsplit_sql_queries_total{endpoint="view_group"} 36' in lines
+    assert 'smartsplit_n_plus_one_requests_total{endpoint="view_group"} 1' in lines
+
+
+@pytest.fixture
+def loop_app(app, database):
+    """
+    Osobna aplikacja na tej samej bazie, z endpointem wykonującym zapytanie w pętli (wzorzec N+1).
+    """
+    loop_app = Flask('loop_app')
+    loop_app.config.from_object('config.Config')
+    loop_app.config.update(SQLALCHEMY_DATABASE_URI=app.config['SQLALCHEMY_DATABASE_URI'], N_PLUS_ONE_THRESHOLD=10)
+    db.init_app(loop_app)
+    init_instrumentation(loop_app)
+
+    @loop_app.route('/users/<int:count>')
+    def load_users(count):
+        for user_id in range(count):
+            db.session.execute(select(User).where(User.id == user_id)).first()
+        return 'ok'
+
+    return loop_app
+
+
+def test_repeated_statement_is_flagged_as_n_plus_one(loop_app, caplog):
+    client = loop_app.test_client()
+
+    with caplog.at_level(logging.WARNING):
+        client.get('/users/10')
+        client.get('/users/11')
+
+    lines = loop_app.extensions['request_metrics'].render().splitlines()
+    assert 'smartsplit_sql_queries_total{endpoint="load_users"} 21' in lines
+    assert 'smartsplit_n_plus_one_requests_total{endpoint="load_users"} 1' in lines
+    assert [record.getMessage().split(':')[0] for record in caplog.records] == [
+        'Possible N+1 in GET /users/11',
+    ]
+
+
+def test_metrics_endpoint_requires_the_token(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', None)
+    assert client.get('/metrics').status_code == 404
+
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'secret')
+    response = client.get('/metrics')
+    assert response.status_code == 401
+    assert response.headers['WWW-Authenticate'] == 'Bearer'
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+
+    client.get('/login')
+    response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == 'text/plain; version=0.0.4; charset=utf-8'
+    assert 'smartsplit_requests_total{endpoint="login",status="200"}' in response.get_data(as_text=True)
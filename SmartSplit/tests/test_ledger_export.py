@@ -0,0 +1,80 @@
+import csv
+import io
+import json
+from benchmarks import measure_export_memory, seed_bench_group
+from models import Currency
+from tests.factories import login, make_users, make_group, add_expense, add_settlement
+
+
+def seed_group(database):
+    database.session.add(Currency(currency_code='EUR', exchange_rate='4.300000'))
+    alice, bob, outsider = make_users(3)
+    group = make_group([alice, bob])
+    add_expense(group, alice, {alice: '15.00', bob: '15.00'}, description='Dinner')
+    add_expense(group, bob, {alice: '2.50', bob: '2.50'}, currency='EUR', description='Coffee')
+    add_settlement(group, bob, alice, '10.00')
+    database.session.commit()
+    return group.id, alice.id, bob.id, outsider.id
+
+
+def test_csv_export_has_a_header_and_one_row_per_expense(database, client):
+    group_id, alice_id, bob_id, _ = seed_group(database)
+    login(client, alice_id)
+
+    response = client.get(f'/group/{group_id}/export/expenses.csv')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'] == f'attachment; filename=group-{group_id}-expenses.csv'
+
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [(row['description'], row['amount'], row['currency'], row['created_by_name']) for row in rows] == [
+        ('Dinner', '30.00', 'PLN', 'user0'),
+        ('Coffee', '5.00', 'EUR', 'user1'),
+    ]
+
+    response = client.get(f'/group/{group_id}/export/settlements.csv')
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [(row['payer_name'], row['receiver_name'], row['amount']) for row in rows] == [('user1', 'user0', '10.00')]
+
+
+def test_ndjson_export_includes_converted_amounts(database, client):
+    group_id, alice_id, bob_id, _ = seed_group(database)
+    login(client, alice_id)
+
+    response = client.get(f'/group/{group_id}/export/shares.ndjson?base=eur')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert sorted((row['username'], row['share'], row['currency'], row['share_eur']) for row in rows) == [
+        ('user0', '15.00', 'PLN', '3.49'),
+        ('user0', '2.50', 'EUR', '2.50'),
+        ('user1', '15.00', 'PLN', '3.49'),
+        ('user1', '2.50', 'EUR', '2.50'),
+    ]
+
+
+def test_export_rejects_unknown_currencies_kinds_and_non_members(database, client):
+    group_id, alice_id, _, outsider_id = seed_group(database)
+    login(client, alice_id)
+
+    response = client.get(f'/group/{group_id}/export/expenses.csv?base=XYZ')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Unknown base currency'}
+    assert client.get(f'/group/{group_id}/export/users.csv').status_code == 404
+    assert client.get(f'/group/{group_id}/export/expenses.xml').status_code == 404
+
+    login(client, outsider_id)
+    assert client.get(f'/group/{group_id}/export/expenses.csv').status_code == 403
+
+
+def test_export_memory_does_not_grow_with_the_group(database):
+    small_group_id, _ = seed_bench_group(500)
+    large_group_id, _ = seed_bench_group(5000)
+
+    small_lines, _, small_peak, _ = measure_export_memory('shares', small_group_id)
+    large_lines, _, large_peak, _ = measure_export_memory('shares', large_group_id)
+
+    # Dziesięć razy więcej wierszy, a szczyt pamięci ten sam (pojedyncza partia kursora)
+    assert (small_lines, large_lines) == (2001, 20001)
+    assert large_peak < small_peak * 1.5
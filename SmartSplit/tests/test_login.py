@@ -0,0 +1,131 @@
+import logging
+import pytest
+from werkzeug.security import generate_password_hash
+from models import User
+from passwords import PasswordHashingBusy
+
+PASSWORD = 'correct horse'
+
+
+@pytest.fixture
+def app_module(app):
+    # Moduł aplikacji importowany dopiero po ustawieniu bazy testowej (fikstura app)
+    import app as app_module
+    return app_module
+
+
+@pytest.fixture
+def legacy_user(database, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'login_throttle', app_module.LoginThrottle())
+    user = User(username='alice', email='alice@example.invalid',
+                password=generate_password_hash(PASSWORD, 'pbkdf2:sha256:1000', 8))
+    database.session.add(user)
+    database.session.commit()
+    return user.id
+
+
+def log_in(client, password=PASSWORD, email='alice@example.invalid', ip='127.0.0.1'):
+    return client.post('/login', data={'email': email, 'password': password}, environ_base={'REMOTE_ADDR': ip})
+
+
+@pytest.fixture
+def verify_calls(app_module, monkeypatch):
+    """
+    Lista haszowań wykonanych przy sprawdzaniu haseł (verify_password nadal działa normalnie).
+    """
+    calls = []
+    verify_password = app_module.verify_password
+
+    def recording_verify_password(password_hash, password):
+        calls.append(password)
+        return verify_password(password_hash, password)
+
+    monkeypatch.setattr(app_module, 'verify_password', recording_verify_password)
+    return calls
+
+
+def test_login_rehashes_password_hashed_with_older_policy(database, client, legacy_user):
+    response = log_in(client)
+    assert response.status_code == 302
+
+    password_hash = database.session.get(User, legacy_user).password
+    assert password_hash.startswith('pbkdf2:sha256:600000$')
+
+
+def test_failed_rehash_is_logged_and_does_not_block_login(database, client, app_module, legacy_user, monkeypatch,
+                                                          caplog):
+    def broken_hash_password(password):
+        raise TimeoutError("hashing pool did not answer")
+
+    monkeypatch.setattr(app_module, 'hash_password', broken_hash_password)
+    with caplog.at_level(logging.WARNING, logger=app_module.app.logger.name):
+        response = log_in(client)
+
+    assert response.status_code == 302
+    with client.session_transaction() as client_session:
+        assert client_session['user_id'] == legacy_user
+    assert f"Could not rehash password of user {legacy_user}" in caplog.text
+    assert database.session.get(User, legacy_user).password.startswith('pbkdf2:sha256:1000$')
+
+
+def test_account_is_throttled_before_the_password_is_checked(app, client, legacy_user, verify_calls, monkeypatch):
+    monkeypatch.setitem(app.config, 'LOGIN_ACCOUNT_MAX_FAILURES', 3)
+
+    for _ in range(3):
+        assert log_in(client, 'wrong').status_code == 200
+    assert len(verify_calls) == 3
+
+    response = log_in(client)
+    assert response.status_code == 429
+    assert 1 <= int(response.headers['Retry-After']) <= app.config['LOGIN_ACCOUNT_WINDOW'] + 1
+    assert len(verify_calls) == 3
+    with client.session_transaction() as client_session:
+        assert 'user_id' not in client_session
+
+    # Limit dotyczy konta (wielkość liter w adresie nie ma znaczenia), a nie innych adresów z tego samego IP
+    assert log_in(client, email='ALICE@example.invalid', ip='10.0.0.2').status_code == 429
+    assert log_in(client, 'wrong', email='bob@example.invalid').status_code == 200
+
+
+def test_ip_is_throttled_across_accounts(app, client, legacy_user, verify_calls, monkeypatch):
+    monkeypatch.setitem(app.config, 'LOGIN_IP_MAX_FAILURES', 3)
+
+    for index in range(3):
+        assert log_in(client, 'wrong', email=f'user{index}@example.invalid', ip='10.0.0.1').status_code == 200
+
+    response = log_in(client, ip='10.0.0.1')
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert verify_calls == []
+
+    assert log_in(client, ip='10.0.0.2').status_code == 302
+    assert verify_calls == [PASSWORD]
+
+
+def test_successful_login_resets_the_account_counter(app, client, legacy_user, monkeypatch):
+    monkeypatch.setitem(app.config, 'LOGIN_ACCOUNT_MAX_FAILURES', 3)
+
+    for _ in range(2):
+        assert log_in(client, 'wrong').status_code == 200
+    assert log_in(client).status_code == 302
+
+    # Bez wyzerowania licznika trzecia z kolejnych pomyłek byłaby już odrzucona
+    for _ in range(3):
+        assert log_in(client, 'wrong').status_code == 200
+    assert log_in(client).status_code == 429
+
+
+def test_busy_hashing_pool_answers_503(client, app_module, legacy_user, monkeypatch):
+    def busy_verify_password(password_hash, password):
+        raise PasswordHashingBusy()
+
+    monkeypatch.setattr(app_module, 'verify_password', busy_verify_password)
+    response = log_in(client)
+
+    assert response.status_code == 503
+    assert b'The server is busy' in response.data
+    with client.session_transaction() as client_session:
+        assert 'user_id' not in client_session
+
+    # Odrzucenie z powodu obciążenia nie jest liczone jako nieudana próba
+    assert app_module.login_throttle.retry_after('alice@example.invalid', '127.0.0.1') is None
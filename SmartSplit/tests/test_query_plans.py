@@ -0,0 +1,34 @@
+from sqlalchemy import text
+from models import Currency
+from query_plans import check_query_plans
+from tests.factories import make_users, make_friends, make_group, add_expense, add_settlement
+
+
+def seed_group(database):
+    database.session.add(Currency(currency_code='EUR', exchange_rate='4.300000'))
+    alice, bob, carol, dave = make_users(4)
+    make_friends(alice, [bob, carol])
+    make_friends(carol, [dave])
+    group = make_group([alice, bob, carol])
+    add_expense(group, alice, {alice: '10.00', bob: '10.00', carol: '10.00'})
+    add_expense(group, bob, {alice: '4.00', bob: '4.00'}, currency='EUR')
+    add_settlement(group, bob, alice, '5.00')
+    return group, alice
+
+
+def test_hot_queries_use_indexes(database):
+    group, alice = seed_group(database)
+    database.session.commit()
+
+    assert check_query_plans(group.id, alice.id) == []
+
+
+def test_missing_index_is_reported(database):
+    group, alice = seed_group(database)
+    group_id, alice_id = group.id, alice.id
+    database.session.execute(text("DROP INDEX settlement_group_id_date_id_idx"))
+    database.session.commit()
+
+    regressions = check_query_plans(group_id, alice_id)
+    assert regressions
+    assert all(tables == ['settlement'] for _, _, tables in regressions)
@@ -0,0 +1,60 @@
+import email_outbox
+from models import OutgoingEmail, UserGroup
+from tests.factories import login, make_users, make_group, add_expense
+
+
+def test_reminders_are_queued_once_per_debtor(database, client):
+    alice, bob, carol = make_users(3)
+    group = make_group([alice, bob, carol])
+    add_expense(group, alice, {alice: '10.00', bob: '10.00', carol: '10.00'})
+    database.session.commit()
+    group_id = group.id
+    login(client, alice.id)
+
+    response = client.post(f'/group/{group_id}/remind_debtors')
+    assert response.status_code == 202
+    assert response.get_json() == {'queued': ['user1', 'user2'], 'skipped': []}
+
+    # Ponowne wywołanie w oknie REMINDER_DEDUP_WINDOW niczego nie dodaje do kolejki
+    response = client.post(f'/group/{group_id}/remind_debtors')
+    assert response.get_json() == {'queued': [], 'skipped': ['user1', 'user2']}
+    assert database.session.query(OutgoingEmail).count() == 2
+
+
+def test_reminder_from_removed_member_is_rejected(database, client):
+    alice, bob = make_users(2)
+    group = make_group([alice, bob])
+    add_expense(group, bob, {alice: '10.00', bob: '10.00'})
+    database.session.commit()
+    group_id, bob_id = group.id, bob.id
+    login(client, bob_id)
+    assert client.post(f'/group/{group_id}/remind_debtors').status_code == 202
+
+    # Usunięcie poza tym procesem - cache członkostwa wciąż pamięta Boba jako członka
+    database.session.query(UserGroup).filter_by(user_id=bob_id, group_id=group_id).delete()
+    database.session.commit()
+
+    response = client.post(f'/group/{group_id}/remind_debtors')
+    assert response.status_code == 403
+
+
+def test_worker_is_notified_once_per_transaction(app, database, monkeypatch):
+    notified = []
+    monkeypatch.setitem(app.config, 'EMAIL_WORKER', True)
+    monkeypatch.setattr(email_outbox, '_notify_worker', notified.append)
+
+    for index in range(3):
+        email_outbox.enqueue_email(f'user{index}@example.invalid', 'Payment Reminder', '-')
+    database.session.commit()
+    assert notified == [app]
+
+    email_outbox.enqueue_email('user0@example.invalid', 'Payment Reminder', '-')
+    database.session.commit()
+    assert notified == [app, app]
+
+    # Transakcja bez wiadomości ani wycofana transakcja z wiadomością nie budzą wątku wysyłającego
+    database.session.commit()
+    email_outbox.enqueue_email('user0@example.invalid', 'Payment Reminder', '-')
+    database.session.rollback()
+    database.session.commit()
+    assert notified == [app, app]
@@ -0,0 +1,155 @@
+from decimal import Decimal
+from hypothesis import given, strategies as st
+from balance_ledger import find_balance_drift
+from models import Group, Settlement, UserGroup
+from settle_up import net_positions, simplify_debts
+from tests.factories import login, make_users, make_group, add_expense, add_settlement
+
+
+def sheet(*debts):
+    """
+    Saldo w formacie calculate_balance z długów (dłużnik, wierzyciel, waluta, kwota), wpisanych po obu stronach.
+    """
+    balance_sheet = {}
+    for debtor_id, creditor_id, currency, amount in debts:
+        balance_sheet.setdefault(debtor_id, {}).setdefault(creditor_id, {})[currency] = Decimal(amount)
+        balance_sheet.setdefault(creditor_id, {}).setdefault(debtor_id, {})[currency] = -Decimal(amount)
+    return balance_sheet
+
+
+def apply_transfers(positions, transfers):
+    remaining = {currency: dict(members) for currency, members in positions.items()}
+    for transfer in transfers:
+        cents = int(transfer['amount'].scaleb(2))
+        assert cents > 0
+        remaining[transfer['currency']][transfer['payer_id']] += cents
+        remaining[transfer['currency']][transfer['receiver_id']] -= cents
+    return remaining
+
+
+def test_net_positions_are_netted_per_currency():
+    balance_sheet = sheet((1, 2, 'PLN', '10.00'), (2, 3, 'PLN', '4.00'), (3, 1, 'PLN', '1.50'),
+                          (1, 2, 'EUR', '2.25'))
+
+    assert net_positions(balance_sheet) == {
+        'PLN': {1: -850, 2: 600, 3: 250},
+        'EUR': {1: -225, 2: 225},
+    }
+
+
+def test_simplify_debts_leaves_out_settled_members():
+    transfers = simplify_debts({'PLN': {1: -500, 2: 500, 3: 0}, 'EUR': {1: 0, 2: 0}})
+
+    assert transfers == [{'payer_id': 1, 'receiver_id': 2, 'amount': Decimal('5.00'), 'currency': 'PLN'}]
+
+
+def test_simplify_debts_collapses_a_chain_into_one_transfer():
+    # 1 jest winny 2, a 2 tyle samo 3 - wystarczy jeden przelew od 1 do 3
+    positions = net_positions(sheet((1, 2, 'PLN', '7.00'), (2, 3, 'PLN', '7.00')))
+
+    assert positions['PLN'][2] == 0
+    assert simplify_debts(positions) == [{'payer_id': 1, 'receiver_id': 3, 'amount': Decimal('7.00'),
+                                          'currency': 'PLN'}]
+
+
+@st.composite
+def balanced_positions(draw):
+    positions = {}
+    for currency in draw(st.lists(st.sampled_from(('PLN', 'EUR', 'USD')), min_size=1, max_size=3, unique=True)):
+        cents = draw(st.lists(st.integers(min_value=-10 ** 9, max_value=10 ** 9), min_size=1, max_size=40))
+        # Ostatni członek domyka sumę do zera, jak w każdym saldzie grupy
+        cents.append(-sum(cents))
+        positions[currency] = {user_id: amount for user_id, amount in enumerate(cents, start=1)}
+    return positions
+
+
+@given(positions=balanced_positions())
+def test_transfers_cancel_net_positions(positions):
+    transfers = simplify_debts(positions)
+
+    remaining = apply_transfers(positions, transfers)
+    assert all(cents == 0 for members in remaining.values() for cents in members.values())
+    for currency, members in positions.items():
+        in_debt = sum(1 for cents in members.values() if cents)
+        currency_transfers = [transfer for transfer in transfers if transfer['currency'] == currency]
+        assert len(currency_transfers) <= max(in_debt - 1, 0)
+        assert all(members[transfer['payer_id']] < 0 < members[transfer['receiver_id']]
+                   for transfer in currency_transfers)
+
+
+def test_group_page_shows_transfers_involving_former_members(database, client):
+    alice, bob, carol = make_users(3)
+    group = make_group([alice, bob, carol])
+    add_expense(group, alice, {alice: '10.00', bob: '10.00', carol: '10.00'})
+    # Członek usunięty, zanim usuwanie osób z historią było blokowane - jego saldo zostało w groupbalances
+    database.session.query(UserGroup).filter_by(user_id=carol.id, group_id=group.id).delete()
+    database.session.commit()
+    group_id = group.id
+    login(client, alice.id)
+
+    response = client.get(f'/group/{group_id}')
+    assert response.status_code == 200
+    assert 'Former member' in response.get_data(as_text=True)
+
+    transfers = client.get(f'/group/{group_id}/suggested_settlements').get_json()
+    assert {(transfer['payerName'], transfer['receiverName']) for transfer in transfers} == {('user1', 'user0'),
+                                                                                             (None, 'user0')}
+
+
+def test_settlement_requires_both_sides_to_be_members(database, client):
+    alice, bob, outsider = make_users(3)
+    group = make_group([alice, bob])
+    database.session.commit()
+    group_id, alice_id, bob_id, outsider_id = group.id, alice.id, bob.id, outsider.id
+    login(client, alice_id)
+
+    form = {'amount': '12.50', 'currency': 'PLN'}
+    assert client.post(f'/group/{group_id}/settle', data={**form, 'payer_id': outsider_id}).status_code == 400
+    assert client.post(f'/group/{group_id}/settle', data={**form, 'payer_id': 'x'}).status_code == 400
+    assert database.session.query(Settlement).count() == 0
+
+    response = client.post(f'/group/{group_id}/settle', data={**form, 'payer_id': bob_id})
+    assert response.status_code == 302
+    settlement = database.session.query(Settlement).one()
+    assert (settlement.payer_id, settlement.receiver_id, str(settlement.amount)) == (bob_id, alice_id, '12.50')
+
+
+def test_edit_settlement_validates_the_payer(database, client):
+    alice, bob, carol, outsider = make_users(4)
+    group = make_group([alice, bob, carol])
+    settlement = add_settlement(group, bob, alice, '10.00')
+    database.session.commit()
+    group_id, settlement_id = group.id, settlement.id
+    ids = {user.username: user.id for user in (alice, bob, carol, outsider)}
+    login(client, ids['user0'])
+    url = f'/group/{group_id}/settlement/edit/{settlement_id}'
+
+    form = {'amount': '12.50', 'currency': 'PLN'}
+    assert client.post(url, data={**form, 'payer_id': ids['user0']}).status_code == 302
+    assert client.post(url, data={**form, 'payer_id': ids['user3']}).status_code == 400
+    assert client.post(url, data={**form, 'payer_id': 'x'}).status_code == 400
+    database.session.expire_all()
+    settlement = database.session.get(Settlement, settlement_id)
+    assert (settlement.payer_id, settlement.receiver_id, str(settlement.amount)) == (ids['user1'], ids['user0'],
+                                                                                   '10.00')
+
+    assert client.post(url, data={**form, 'payer_id': ids['user2']}).status_code == 302
+    database.session.expire_all()
+    settlement = database.session.get(Settlement, settlement_id)
+    assert (settlement.payer_id, settlement.receiver_id, str(settlement.amount)) == (ids['user2'], ids['user0'],
+                                                                                   '12.50')
+    assert find_balance_drift(database.session.get(Group, group_id)) == []
+
+
+def test_edit_settlement_of_another_group_is_not_found(database, client):
+    alice, bob = make_users(2)
+    group = make_group([alice, bob])
+    other_group = make_group([alice, bob], name='Other')
+    settlement = add_settlement(other_group, bob, alice, '10.00')
+    database.session.commit()
+    group_id, settlement_id, alice_id, bob_id = group.id, settlement.id, alice.id, bob.id
+    login(client, alice_id)
+
+    url = f'/group/{group_id}/settlement/edit/{settlement_id}'
+    assert client.get(url).status_code == 404
+    assert client.post(url, data={'amount': '1.00', 'currency': 'PLN', 'payer_id': bob_id}).status_code == 404
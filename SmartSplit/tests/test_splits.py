@@ -0,0 +1,117 @@
+import pytest
+from hypothesis import given, strategies as st
+from werkzeug.datastructures import MultiDict
+from models import Expense, ExpenseShare
+from money import Money
+from splits import SplitError, split_expense, split_values_from_form
+from tests.factories import login, make_users, make_group, add_expense
+
+MEMBERS = list(range(1, 9))
+
+amounts = st.integers(min_value=1, max_value=10 ** 9).map(Money)
+members = st.lists(st.sampled_from(MEMBERS), min_size=1, max_size=len(MEMBERS), unique=True)
+
+
+def cents(shares):
+    return {user_id: share.cents for user_id, share in shares.items()}
+
+
+def test_equal_split_gives_leftover_cents_to_the_first_members():
+    shares = split_expense('equal', Money.parse('100.00'), [1, 2, 3])
+
+    assert cents(shares) == {1: 3334, 2: 3333, 3: 3333}
+
+
+def test_percentages_must_add_up_to_100():
+    assert cents(split_expense('percentage', Money.parse('10.00'), {1: '33.33', 2: '33.33', 3: '33.34'})) == \
+        {1: 333, 2: 333, 3: 334}
+
+    with pytest.raises(SplitError, match='add up to 100'):
+        split_expense('percentage', Money.parse('10.00'), {1: '50', 2: '49.99'})
+    with pytest.raises(SplitError, match='must be numbers'):
+        split_expense('percentage', Money.parse('10.00'), {1: 'half', 2: '50'})
+
+
+def test_custom_shares_must_add_up_to_the_amount():
+    with pytest.raises(SplitError, match='do not add up'):
+        split_expense('custom', Money.parse('10.00'), {1: '5.00', 2: '4.99'})
+    with pytest.raises(SplitError, match='must not be negative'):
+        split_expense('custom', Money.parse('10.00'), {1: '15.00', 2: '-5.00'})
+
+
+def test_itemized_split_shares_tax_and_tip_in_proportion_to_items():
+    # Pozycje: 60.00 dla 1 i 2, 40.00 tylko dla 1; 20.00 podatku i napiwku dzielone 70:30
+    items = [('60.00', [1, 2]), ('40.00', [1])]
+
+    assert cents(split_expense('itemized', Money.parse('120.00'), items)) == {1: 8400, 2: 3600}
+
+    with pytest.raises(SplitError, match='more than the total'):
+        split_expense('itemized', Money.parse('99.99'), items)
+
+
+@given(amount=amounts, member_ids=members)
+def test_equal_shares_sum_to_the_amount_and_differ_by_at_most_a_cent(amount, member_ids):
+    shares = split_expense('equal', amount, member_ids)
+
+    assert list(shares) == member_ids
+    assert sum(shares.values()) == amount
+    assert max(cents(shares).values()) - min(cents(shares).values()) <= 1
+
+
+@given(amount=amounts, weights=st.dictionaries(st.sampled_from(MEMBERS), st.integers(min_value=0, max_value=50),
+                                               min_size=1).filter(lambda weights: any(weights.values())))
+def test_weighted_shares_sum_to_the_amount(amount, weights):
+    shares = split_expense('weights', amount, weights)
+
+    assert sum(shares.values()) == amount
+    assert all(shares[user_id].cents == 0 for user_id, weight in weights.items() if weight == 0)
+
+
+@given(amount=amounts, items=st.lists(st.tuples(st.integers(min_value=1, max_value=10 ** 6), members),
+                                      min_size=1, max_size=5))
+def test_itemized_shares_sum_to_the_amount(amount, items):
+    items_total = sum(item_cents for item_cents, _ in items)
+    amount = Money(amount.cents + items_total)
+    items = [(str(Money(item_cents)), member_ids) for item_cents, member_ids in items]
+
+    assert sum(split_expense('itemized', amount, items).values()) == amount
+
+
+def test_split_values_are_read_from_the_form():
+    form = MultiDict([
+        ('members', '1'), ('members', '2'),
+        ('percentage_1', '60'), ('percentage_2', ''),
+        ('weight_1', '2'), ('weight_2', '1'),
+        ('item_amount_2', '5.00'), ('item_members_2', '2'),
+        ('item_amount_1', '10.00'), ('item_members_1', '1'), ('item_members_1', '2'),
+        ('item_amount_3', ''),
+    ])
+
+    assert split_values_from_form(form, 'equal') == [1, 2]
+    assert split_values_from_form(form, 'percentage') == {1: '60', 2: '0'}
+    assert split_values_from_form(form, 'weights') == {1: '2', 2: '1'}
+    assert split_values_from_form(form, 'itemized') == [('10.00', [1, 2]), ('5.00', [2])]
+    with pytest.raises(SplitError):
+        split_values_from_form(form, 'thirds')
+
+
+def test_expense_shares_are_limited_to_group_members(database, client):
+    alice, bob, outsider = make_users(3)
+    group = make_group([alice, bob])
+    expense = add_expense(group, alice, {alice: '5.00', bob: '5.00'})
+    database.session.commit()
+    group_id, expense_id = group.id, expense.id
+    alice_id, bob_id, outsider_id = alice.id, bob.id, outsider.id
+    login(client, alice_id)
+
+    form = {'description': 'Taxi', 'amount': '30.00', 'currency': 'PLN', 'category': 'Travel',
+            'split_type': 'equal', 'paid_by': alice_id}
+    client.post(f'/group/{group_id}/add_expense', data={**form, 'members': [alice_id, outsider_id]})
+    client.post(f'/expense/{expense_id}/edit', data={**form, 'members': [alice_id, outsider_id]})
+    assert database.session.query(Expense).count() == 1
+    assert database.session.query(ExpenseShare).filter_by(user_id=outsider_id).count() == 0
+
+    client.post(f'/group/{group_id}/add_expense', data={**form, 'members': [alice_id, bob_id]})
+    assert database.session.query(Expense).count() == 2
+    assert sorted(share.share for share in database.session.query(ExpenseShare)
+                  .join(Expense).filter(Expense.description == 'Taxi')) == [15, 15]